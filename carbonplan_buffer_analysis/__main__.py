@@ -0,0 +1,3 @@
+from carbonplan_buffer_analysis.cli import main
+
+main()
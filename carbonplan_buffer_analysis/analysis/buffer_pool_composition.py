@@ -1,21 +1,17 @@
-import json
-from pathlib import Path
-
-import fsspec
-import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
 from carbonplan_styles.colors import light
-from carbonplan_styles.mpl import set_theme
 
-set_theme(font_scale=1.25)
-mpl.rc("font", **{"family": "sans-serif", "sans-serif": ["Helvetica"]})
-plt.rcParams.update({"font.size": 14, "svg.fonttype": "none"})
+from carbonplan_buffer_analysis.analysis.figures import load_outputs, save_figure
+from carbonplan_buffer_analysis.analysis.style import set_style
 
+NAME = "buffer_pool_composition"
+INPUTS = ["buffer_contributions.json"]
+THEME = True
 
-def main():
-    with fsspec.open("gs://carbonplan-buffer-analysis/outputs/buffer_contributions.json") as f:
-        d = json.load(f)
+
+def plot(outputs: dict) -> plt.Figure:
+    d = outputs["buffer_contributions.json"]
     natural_risk_buffer = sum([v for k, v in d.items() if not k.startswith("gross")])
 
     non_natural = d["gross_buffer"] - natural_risk_buffer
@@ -125,16 +121,15 @@ def main():
     )
 
     # ax.vlines(x=-10, ymin=0, ymax=1)
-    plt.savefig(
-        Path(__file__).parents[2] / "img" / "buffer_pool_composition.pdf",
-        dpi=300,
-        bbox_inches="tight",
-    )
-    plt.savefig(
-        Path(__file__).parents[2] / "img" / "buffer_pool_composition.svg",
-        dpi=300,
-        bbox_inches="tight",
-    )
+
+    return fig
+
+
+def main():
+    set_style(theme=THEME)
+    fig = plot(load_outputs(INPUTS))
+    for fmt in ["pdf", "svg"]:
+        save_figure(fig, NAME, fmt)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,118 @@
+"""Build every report figure in one go
+
+Each figure module defines `NAME`, the output JSON files it plots (`INPUTS`), whether it uses the
+carbonplan theme (`THEME`) and a `plot(outputs) -> Figure` function. `build` loads the union of
+all inputs once, then renders each figure once, saving every format from the same worker, in a pool
+of worker processes. A figure is skipped when the hash of its inputs and source (including the
+shared style and this module) matches the one recorded the last time it was written, so refreshing
+figures after a data update only redraws what changed.
+"""
+import hashlib
+import importlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from carbonplan_buffer_analysis import storage
+
+IMG_DIR = Path(__file__).parents[2] / "img"
+OUTPUTS_DIR = "gs://carbonplan-buffer-analysis/outputs"
+FORMATS = ["pdf", "svg"]
+HASHES = ".figure-hashes.json"
+# source every figure depends on, in addition to its own module
+SHARED_SOURCES = [Path(__file__).with_name("style.py"), Path(__file__)]
+
+
+def load_outputs(inputs: list, outputs_dir: str = OUTPUTS_DIR) -> dict:
+    """Load output JSON files by file name, fetched concurrently"""
+    urlpaths = {fn: f"{outputs_dir.rstrip('/')}/{fn}" for fn in inputs}
+    outputs = storage.read_json_many(urlpaths.values())
+    return {fn: outputs[urlpath] for fn, urlpath in urlpaths.items()}
+
+
+def save_figure(fig, name: str, fmt: str, img_dir: Path = IMG_DIR) -> Path:
+    path = Path(img_dir) / f"{name}.{fmt}"
+    fig.savefig(path, dpi=300, bbox_inches="tight")
+    return path
+
+
+def get_figure_hash(module, outputs: dict) -> str:
+    """Hash of a figure's inputs and source code (its module, the style and the renderer)"""
+    h = hashlib.sha256(Path(module.__file__).read_bytes())
+    for path in SHARED_SOURCES:
+        h.update(path.read_bytes())
+    for fn in module.INPUTS:
+        h.update(json.dumps(outputs[fn], sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def render(module_name: str, formats: list, outputs: dict, img_dir: Path) -> list:
+    """Render one figure and save it in each format, in a worker process"""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    from carbonplan_buffer_analysis.analysis.style import set_style
+
+    module = importlib.import_module(module_name)
+    plt.rcdefaults()  # workers are reused across figures with different styles
+    set_style(theme=module.THEME)
+    fig = module.plot({fn: outputs[fn] for fn in module.INPUTS})
+    paths = [str(save_figure(fig, module.NAME, fmt, img_dir)) for fmt in formats]
+    plt.close(fig)
+    return paths
+
+
+def build(
+    module_names: list,
+    outputs_dir: str = OUTPUTS_DIR,
+    img_dir: Path = IMG_DIR,
+    force: bool = False,
+    jobs: int = None,
+) -> list:
+    """Render figures whose inputs or source changed since they were last written
+
+    Arguments:
+        module_names {list} -- figure modules to build
+        outputs_dir {str} -- where output JSON files are read from
+        img_dir {Path} -- where figures and the hash manifest are written
+        force {bool} -- render every figure regardless of hashes
+        jobs {int} -- worker processes, defaults to the number of CPUs
+
+    Returns:
+        list -- paths of rendered figures
+    """
+    img_dir = Path(img_dir)
+    modules = [importlib.import_module(name) for name in module_names]
+    inputs = sorted({fn for module in modules for fn in module.INPUTS})
+    outputs = load_outputs(inputs, outputs_dir)
+
+    hashes_path = img_dir / HASHES
+    hashes = json.loads(hashes_path.read_text()) if hashes_path.exists() else {}
+
+    todo = []
+    for module in modules:
+        figure_hash = get_figure_hash(module, outputs)
+        formats = [
+            fmt
+            for fmt in FORMATS
+            if force
+            or hashes.get(f"{module.NAME}.{fmt}") != figure_hash
+            or not (img_dir / f"{module.NAME}.{fmt}").exists()
+        ]
+        if formats:
+            todo.append((module, formats, figure_hash))
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [
+            pool.submit(render, module.__name__, formats, outputs, img_dir)
+            for module, formats, _ in todo
+        ]
+        paths = [path for future in futures for path in future.result()]
+
+    for module, formats, figure_hash in todo:
+        for fmt in formats:
+            hashes[f"{module.NAME}.{fmt}"] = figure_hash
+    hashes_path.write_text(json.dumps(hashes, indent=2, sort_keys=True))
+    return paths
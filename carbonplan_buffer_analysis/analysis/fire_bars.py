@@ -1,22 +1,18 @@
-import json
-from pathlib import Path
-
-import fsspec
-import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
 from carbonplan_styles.colors import light
-from carbonplan_styles.mpl import set_theme
 
-set_theme(font_scale=1.25)
-mpl.rc("font", **{"family": "sans-serif", "sans-serif": ["Helvetica"]})
-plt.rcParams.update({"font.size": 14, "svg.fonttype": "none"})
-if __name__ == "__main__":
-    with fsspec.open("gs://carbonplan-buffer-analysis/outputs/buffer_contributions.json") as f:
-        buffer_data = json.load(f)
+from carbonplan_buffer_analysis.analysis.figures import load_outputs, save_figure
+from carbonplan_buffer_analysis.analysis.style import set_style
+
+NAME = "fire-bars"
+INPUTS = ["buffer_contributions.json", "fire-summary.json"]
+THEME = True
 
-    with fsspec.open("gs://carbonplan-buffer-analysis/outputs/fire-summary.json") as f:
-        estimated_fire_loses = json.load(f)
+
+def plot(outputs: dict) -> plt.Figure:
+    buffer_data = outputs["buffer_contributions.json"]
+    estimated_fire_loses = outputs["fire-summary.json"]
 
     height = 0.45
     fig, ax = plt.subplots()
@@ -109,14 +105,15 @@ if __name__ == "__main__":
 
     ax.vlines(x=buffer_data["fire_contributions"], ymin=0, ymax=2.75, color="k")
 
-    plt.savefig(
-        Path(__file__).parents[2] / "img" / "fire-bars.pdf",
-        dpi=300,
-        bbox_inches="tight",
-    )
+    return fig
 
-    plt.savefig(
-        Path(__file__).parents[2] / "img" / "fire-bars.svg",
-        dpi=300,
-        bbox_inches="tight",
-    )
+
+def main():
+    set_style(theme=THEME)
+    fig = plot(load_outputs(INPUTS))
+    for fmt in ["pdf", "svg"]:
+        save_figure(fig, NAME, fmt)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+
+
+def set_style(theme: bool = True) -> None:
+    """Apply figure styling
+
+    Called from each figure's `main` rather than at import so that importing a figure module
+    (or the CLI) stays cheap.
+
+    Arguments:
+        theme {bool} -- also apply the carbonplan matplotlib theme
+    """
+    if theme:
+        from carbonplan_styles.mpl import set_theme
+
+        set_theme(font_scale=1.25)
+    mpl.rc("font", **{"family": "sans-serif", "sans-serif": ["Helvetica"]})
+    plt.rcParams.update({"font.size": 14, "svg.fonttype": "none"})
@@ -1,24 +1,18 @@
-import json
-from pathlib import Path
-
-import fsspec
-import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
 from carbonplan_styles.colors import light
 
-# set_theme(font_scale=1.25)
-mpl.rc("font", **{"family": "sans-serif", "sans-serif": ["Helvetica"]})
-plt.rcParams.update({"font.size": 14, "svg.fonttype": "none"})
+from carbonplan_buffer_analysis.analysis.figures import load_outputs, save_figure
+from carbonplan_buffer_analysis.analysis.style import set_style
+
+NAME = "tanoak-bars"
+INPUTS = ["buffer_contributions.json", "tanoak-summary.json"]
+THEME = False
 
-if __name__ == "__main__":
-    with fsspec.open("gs://carbonplan-buffer-analysis/outputs/buffer_contributions.json") as f:
-        buffer_data = json.load(f)
 
-    with fsspec.open("gs://carbonplan-buffer-analysis/outputs/fire-summary.json") as f:
-        estimated_fire_loses = json.load(f)
-    with fsspec.open("gs://carbonplan-buffer-analysis/outputs/tanoak-summary.json") as f:
-        estimated_tanoak_loses = json.load(f)
+def plot(outputs: dict) -> plt.Figure:
+    buffer_data = outputs["buffer_contributions.json"]
+    estimated_tanoak_loses = outputs["tanoak-summary.json"]
 
     height = 0.45
     fig, ax = plt.subplots()
@@ -92,7 +86,7 @@ if __name__ == "__main__":
     ax.annotate(text="Scenario A", xy=(0.4, 0.47), xycoords="axes fraction")
     ax.annotate(
         text=f"{estimated_tanoak_loses['tmean']['minimum'] / 1_000_000:.1f}$\,$M ({estimated_tanoak_loses['tmean']['minimum']/ buffer_data['pest_contributions'] * 100:.0f}%)",  # noqa
-        xy=(0.4 + 0.225, 0.47),
+        xy=(0.4 + million_pad, 0.47),
         color=light["secondary"],
         xycoords="axes fraction",
     )
@@ -100,7 +94,7 @@ if __name__ == "__main__":
     ax.annotate(text="Scenario B", xy=(0.42, 0.29), xycoords="axes fraction")
     ax.annotate(
         text=f"{estimated_tanoak_loses['bay']['minimum'] / 1_000_000:.1f}$\,$M ({estimated_tanoak_loses['bay']['minimum']/ buffer_data['pest_contributions'] * 100:.0f}%)",  # noqa
-        xy=(0.42 + 0.225, 0.29),
+        xy=(0.42 + million_pad, 0.29),
         color=light["secondary"],
         xycoords="axes fraction",
     )
@@ -111,7 +105,7 @@ if __name__ == "__main__":
     # ax.annotate(text="Scenario C", xy=(0.57, fourth_bar_y_coord), xycoords="axes fraction")
     ax.annotate(
         text=f"{estimated_tanoak_loses['total']['maximum'] / 1_000_000:.1f}$\,$M ({estimated_tanoak_loses['total']['maximum']/ buffer_data['pest_contributions'] * 100:.0f}%)",  # noqa
-        xy=(0.5 + 0.225, fourth_bar_y_coord),
+        xy=(0.5 + million_pad, fourth_bar_y_coord),
         color=light["secondary"],
         xycoords="axes fraction",
     )
@@ -133,13 +127,15 @@ if __name__ == "__main__":
         color="k",
     )
 
-    plt.savefig(
-        Path(__file__).parents[2] / "img" / "tanoak-bars.pdf",
-        dpi=300,
-        bbox_inches="tight",
-    )
-    plt.savefig(
-        Path(__file__).parents[2] / "img" / "tanoak-bars.svg",
-        dpi=300,
-        bbox_inches="tight",
-    )
+    return fig
+
+
+def main():
+    set_style(theme=THEME)
+    fig = plot(load_outputs(INPUTS))
+    for fmt in ["pdf", "svg"]:
+        save_figure(fig, NAME, fmt)
+
+
+if __name__ == "__main__":
+    main()
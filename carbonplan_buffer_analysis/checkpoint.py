@@ -0,0 +1,83 @@
+"""Checkpoint and resume for long-running per-project loops
+
+A `Manifest` is an append-only JSON lines file in the local cache recording completed units of
+work, identified by (task, opr_id, parameters), along with their (JSON serializable) results. Each
+unit is written and fsync'd as soon as it finishes, so if a registry-wide run dies partway through
+(e.g. on a preemptible machine), rerunning it skips everything already done:
+
+    manifest = Manifest("tanoak-proximity")
+    for opr_id in opr_ids:
+        if not manifest.is_done("distance", opr_id):
+            manifest.record("distance", opr_id, result=get_distance(opr_id))
+    distances = manifest.results("distance")
+    manifest.clear()  # the next run starts fresh
+
+Delete the manifest (or call `clear`) to force a full rerun.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+from carbonplan_buffer_analysis import utils
+
+CHECKPOINT_DIR = utils.LOCAL_CACHE / "checkpoints"
+
+
+class Manifest:
+    def __init__(self, name: str, directory: Path = None):
+        self.path = Path(directory or CHECKPOINT_DIR) / f"{name}.jsonl"
+        self._records = {}
+        self._partial_line = False
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    self._partial_line = not line.endswith("\n")
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # partially written last line of a killed run
+                    self._records[record["key"]] = record
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @staticmethod
+    def key(task: str, opr_id: str, params: dict = None) -> str:
+        payload = json.dumps([task, opr_id, params or {}], sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def is_done(self, task: str, opr_id: str, params: dict = None) -> bool:
+        return self.key(task, opr_id, params) in self._records
+
+    def get(self, task: str, opr_id: str, params: dict = None) -> Any:
+        return self._records[self.key(task, opr_id, params)]["result"]
+
+    def record(self, task: str, opr_id: str, params: dict = None, result: Any = None) -> None:
+        """Mark a unit of work as complete, durably"""
+        record = {
+            "key": self.key(task, opr_id, params),
+            "task": task,
+            "opr_id": opr_id,
+            "params": params or {},
+            "result": result,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            if self._partial_line:
+                f.write("\n")
+                self._partial_line = False
+            f.write(json.dumps(record, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._records[record["key"]] = record
+
+    def results(self, task: str) -> dict:
+        """Results of completed units of a task, by opr_id"""
+        return {r["opr_id"]: r["result"] for r in self._records.values() if r["task"] == task}
+
+    def clear(self) -> None:
+        self._records = {}
+        if self.path.exists():
+            self.path.unlink()
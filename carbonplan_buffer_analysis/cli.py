@@ -0,0 +1,179 @@
+"""Command line entry point: `carbonplan-buffer-analysis <command>`
+
+Every flow, figure and script gets its own subcommand. Heavy dependencies (prefect, geopandas,
+rioxarray, xarray, matplotlib, carbonplan_forest_offsets) are only imported by the subcommand that
+needs them, so `--help` and quick commands like `summary` start in well under a second.
+"""
+import argparse
+import contextlib
+import importlib
+import os
+
+FLOWS_MODULE = "carbonplan_buffer_analysis.prefect.flows"
+ANALYSIS_MODULE = "carbonplan_buffer_analysis.analysis"
+OUTPUTS_DIR = "gs://carbonplan-buffer-analysis/outputs"
+CLUSTER_ENV = "BUFFER_ANALYSIS_CLUSTER"  # see cluster.py, not imported here to keep startup fast
+
+FLOWS = {
+    "buffer-contributions": f"{FLOWS_MODULE}.calculate_buffer_contributions",
+    "buffer-timeseries": f"{FLOWS_MODULE}.calculate_buffer_timeseries",
+    "fire-reversals": f"{FLOWS_MODULE}.calculate_fire_reversals",
+    "ravg-summaries": f"{FLOWS_MODULE}.calculate_ravg_summaries",
+    "tanoak-basal-area": f"{FLOWS_MODULE}.calculate_tanoak_basal_area",
+    "tanoak-tmean": f"{FLOWS_MODULE}.calculate_tanoak_tmean",
+    "tanoak-zonal": f"{FLOWS_MODULE}.calculate_tanoak_zonal",
+    "project-climate": f"{FLOWS_MODULE}.calculate_project_climate",
+    "summarize-fire": f"{FLOWS_MODULE}.summarize_fire",
+    "summarize-tanoak": f"{FLOWS_MODULE}.summarize_tanoak",
+    "pest-exposure": f"{FLOWS_MODULE}.calculate_pest_exposure",
+    "prefire-biomass": f"{FLOWS_MODULE}.calculate_prefire_biomass",
+    "wood-product-factors": f"{FLOWS_MODULE}.calculate_wood_product_factors",
+    "fia-biomass": f"{FLOWS_MODULE}.calculate_fia_biomass",
+    "burn-probability": f"{FLOWS_MODULE}.calculate_burn_probability",
+    "fire-intersections": f"{FLOWS_MODULE}.calculate_fire_intersections",
+    "buffer-solvency": f"{FLOWS_MODULE}.simulate_buffer_solvency",
+    "sod-distance": f"{FLOWS_MODULE}.calculate_sod_distance",
+    "buffer-sensitivity": f"{FLOWS_MODULE}.calculate_buffer_sensitivity",
+}
+FIGURES = {
+    "buffer-pool-composition": f"{ANALYSIS_MODULE}.buffer_pool_composition",
+    "fire-bars": f"{ANALYSIS_MODULE}.fire_bars",
+    "tanoak-bars": f"{ANALYSIS_MODULE}.tanoak_bars",
+}
+SCRIPTS = {
+    "tanoak-proximity": f"{ANALYSIS_MODULE}.tanoak_proximity",
+}
+SUMMARY_OUTPUTS = ["buffer_contributions.json", "fire-summary.json", "tanoak-summary.json"]
+
+
+def get_cluster(args: argparse.Namespace):
+    """Local dask cluster context, if requested (dask.distributed is only imported if so)"""
+    enabled = args.cluster or os.environ.get(CLUSTER_ENV, "").lower() in ("1", "true")
+    if not enabled:
+        return contextlib.nullcontext()
+
+    from carbonplan_buffer_analysis import cluster
+
+    return cluster.local_cluster(
+        args.command, True, args.workers, args.memory_limit, report_dir=args.profile
+    )
+
+
+def run_module(args: argparse.Namespace) -> None:
+    """Import a flow/figure/script module and run it, profiling if requested"""
+    from carbonplan_buffer_analysis import profiling
+
+    module = importlib.import_module(args.module)
+    with profiling.profile_run(args.command, args.profile, args.trace), get_cluster(args):
+        if hasattr(module, "main"):
+            module.main()
+        else:
+            profiling.run_flow(module.flow)
+
+
+def flatten(d: dict, prefix: str = "") -> dict:
+    flat = {}
+    for k, v in d.items():
+        if isinstance(v, dict):
+            flat.update(flatten(v, prefix=f"{prefix}{k}."))
+        else:
+            flat[f"{prefix}{k}"] = v
+    return flat
+
+
+def summarize_outputs(args: argparse.Namespace) -> None:
+    """Print already computed output summaries"""
+    from carbonplan_buffer_analysis import storage
+
+    urlpaths = [f"{args.outputs_dir.rstrip('/')}/{fn}" for fn in SUMMARY_OUTPUTS]
+    outputs = storage.read_json_many(urlpaths)
+    for fn, urlpath in zip(SUMMARY_OUTPUTS, urlpaths):
+        d = outputs[urlpath]
+        print(fn)
+        for k, v in flatten(d).items():
+            print(f"  {k:<24}{v:>16,.0f}")
+
+
+def build_figures(args: argparse.Namespace) -> None:
+    """Render every figure from shared inputs, skipping unchanged ones"""
+    from carbonplan_buffer_analysis import profiling
+    from carbonplan_buffer_analysis.analysis import figures
+
+    with profiling.profile_run("figures", args.profile, args.trace):
+        paths = figures.build(
+            list(FIGURES.values()), args.outputs_dir, force=args.force, jobs=args.jobs
+        )
+    for path in paths:
+        print(path)
+
+
+def sync_store(args: argparse.Namespace) -> None:
+    """Pull intermediates and outputs into the local query store"""
+    from carbonplan_buffer_analysis import store
+
+    for table, rows in store.sync(args.tables or None).items():
+        print(f"  {table:<24}{rows:>10,} rows")
+
+
+def query_store(args: argparse.Namespace) -> None:
+    from carbonplan_buffer_analysis import store
+
+    print(store.query(args.sql).to_string())
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="carbonplan-buffer-analysis",
+        description="analysis of the California forest carbon offsets protocol buffer pool",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="write per-task timing/memory/io reports to DIR (local or gs://)",
+    )
+    parser.add_argument(
+        "--trace", action="store_true", default=None, help="also write a Chrome trace file"
+    )
+    parser.add_argument(
+        "--cluster",
+        action="store_true",
+        default=None,
+        help="run dask computations on a local dask.distributed cluster",
+    )
+    parser.add_argument("--workers", type=int, help="cluster worker processes")
+    parser.add_argument("--memory-limit", help="cluster memory limit per worker (e.g. 8GB)")
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
+    subparsers.required = True
+
+    for kind, commands in [("flow", FLOWS), ("figure", FIGURES), ("script", SCRIPTS)]:
+        for command, module in commands.items():
+            subparser = subparsers.add_parser(command, help=f"run the {command} {kind}")
+            subparser.set_defaults(func=run_module, module=module)
+
+    figures = subparsers.add_parser("figures", help="build every figure, in parallel")
+    figures.add_argument("--outputs-dir", default=OUTPUTS_DIR)
+    figures.add_argument("--force", action="store_true", help="rebuild unchanged figures too")
+    figures.add_argument("--jobs", type=int, help="worker processes (default: number of CPUs)")
+    figures.set_defaults(func=build_figures)
+
+    sync = subparsers.add_parser("store-sync", help="load outputs into the local query store")
+    sync.add_argument("tables", nargs="*", help="tables to sync (default: all)")
+    sync.set_defaults(func=sync_store)
+
+    query = subparsers.add_parser("query", help="run SQL against the local query store")
+    query.add_argument("sql")
+    query.set_defaults(func=query_store)
+
+    summary = subparsers.add_parser("summary", help="print computed output summaries")
+    summary.add_argument("--outputs-dir", default=OUTPUTS_DIR)
+    summary.set_defaults(func=summarize_outputs)
+    return parser
+
+
+def main(argv: list = None) -> None:
+    args = get_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Opt-in local dask.distributed cluster for the raster flows
+
+By default, dask backed (chunked) arrays in the flows are computed with dask's threaded scheduler
+in the flow's own process. With a local cluster active, the same computations run on a pool of
+worker processes instead, using every core, with a memory cap per worker. Workers start spilling
+chunks to local disk well before they reach the cap, and pause (then restart) rather than taking
+the machine down.
+
+Set BUFFER_ANALYSIS_CLUSTER=1 (or pass `--cluster` to the command line) to run any flow on a
+local cluster. BUFFER_ANALYSIS_WORKERS and BUFFER_ANALYSIS_MEMORY_LIMIT (per worker, e.g. "8GB")
+size it. The dashboard (task stream, worker memory) is served at the printed link while the flow
+runs, and when profiling is on the task stream is also saved to `<flow>-dask-report.html`
+alongside the profiling report.
+"""
+import contextlib
+import os
+import shutil
+import sys
+from typing import Optional
+
+import dask
+import fsspec
+from dask.distributed import Client, LocalCluster, performance_report
+
+from carbonplan_buffer_analysis import profiling, utils
+
+CLUSTER_ENV = "BUFFER_ANALYSIS_CLUSTER"
+WORKERS_ENV = "BUFFER_ANALYSIS_WORKERS"
+MEMORY_LIMIT_ENV = "BUFFER_ANALYSIS_MEMORY_LIMIT"
+THREADS_PER_WORKER = 2  # GDAL reads release the GIL, a couple of threads keep a worker busy
+SPILL_DIR = utils.LOCAL_CACHE / "dask-worker-space"
+# fractions of each worker's memory limit
+MEMORY_THRESHOLDS = {"target": 0.6, "spill": 0.7, "pause": 0.8, "terminate": 0.95}
+
+_client: Optional[Client] = None
+
+
+def get_client() -> Optional[Client]:
+    return _client
+
+
+def get_cluster_options(workers: int = None, memory_limit: str = None) -> dict:
+    """LocalCluster arguments, from arguments, then the environment, then defaults
+
+    Returns:
+        dict -- `n_workers` (default: one per THREADS_PER_WORKER cores), `threads_per_worker`,
+            `memory_limit` (default: system memory split evenly between workers) and
+            `local_directory` for spilled chunks
+    """
+    workers = workers or os.environ.get(WORKERS_ENV)
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) // THREADS_PER_WORKER)
+    return {
+        "n_workers": int(workers),
+        "threads_per_worker": THREADS_PER_WORKER,
+        "memory_limit": memory_limit or os.environ.get(MEMORY_LIMIT_ENV) or "auto",
+        "local_directory": str(SPILL_DIR),
+    }
+
+
+@contextlib.contextmanager
+def local_cluster(
+    name: str,
+    enabled: bool = None,
+    workers: int = None,
+    memory_limit: str = None,
+    report_dir: str = None,
+):
+    """Run dask computations in the block on a local cluster
+
+    Arguments:
+        name {str} -- run name, used to name the task stream report
+        enabled {bool} -- defaults to BUFFER_ANALYSIS_CLUSTER; if false, this does nothing
+        workers {int} -- number of worker processes
+        memory_limit {str} -- memory limit per worker, e.g. "8GB"
+        report_dir {str} -- where to write `{name}-dask-report.html`. Defaults to the
+            BUFFER_ANALYSIS_PROFILE environment variable; if neither is set, no report is written
+    """
+    global _client
+
+    if enabled is None:
+        enabled = os.environ.get(CLUSTER_ENV, "").lower() in ("1", "true")
+    if not enabled or _client is not None:
+        # disabled, or nested inside an already active cluster
+        yield _client
+        return
+
+    options = get_cluster_options(workers, memory_limit)
+    report_dir = report_dir or os.environ.get(profiling.PROFILE_DIR_ENV)
+    memory = {f"distributed.worker.memory.{k}": v for k, v in MEMORY_THRESHOLDS.items()}
+    SPILL_DIR.mkdir(parents=True, exist_ok=True)
+
+    with dask.config.set(memory), LocalCluster(**options) as cluster, Client(cluster) as client:
+        print(f"dask dashboard: {client.dashboard_link}", file=sys.stderr)
+        _client = client
+        try:
+            if report_dir:
+                local = SPILL_DIR / f"{name}-dask-report.html"
+                with performance_report(filename=str(local)):
+                    yield client
+                with open(local, "rb") as src, fsspec.open(
+                    f"{report_dir.rstrip('/')}/{name}-dask-report.html", "wb"
+                ) as dst:
+                    shutil.copyfileobj(src, dst)
+            else:
+                yield client
+        finally:
+            _client = None
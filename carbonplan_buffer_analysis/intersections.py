@@ -0,0 +1,44 @@
+"""Precomputed project x fire intersections
+
+The calculate-fire-intersections flow intersects every project geometry with every NIFC/MTBS fire
+perimeter once and stores the non-empty pairs as a long (COO style sparse) table:
+
+    opr_id            -- project id
+    fire_id           -- `{source}-{position}` of the perimeter in its source file
+    name, ignite_at   -- fire name and ignition date
+    acres             -- area of the intersection
+    fraction          -- fraction of the project burned by the fire
+
+"Which fires burned which projects" questions then become lookups in this table rather than
+repeated clips.
+"""
+import datetime
+from typing import Union
+
+import pandas as pd
+
+from carbonplan_buffer_analysis import profiling
+
+INTERSECTIONS = "gs://carbonplan-buffer-analysis/intermediates/project-fire-intersections.parquet"
+
+
+def load_intersections(path: str = INTERSECTIONS) -> pd.DataFrame:
+    with profiling.open_file(path) as f:
+        return pd.read_parquet(f)
+
+
+def get_project_fires(
+    intersections: pd.DataFrame,
+    opr_id: str,
+    after: Union[str, datetime.datetime, None] = None,
+) -> pd.DataFrame:
+    """Fires that intersect a project, optionally only those ignited after a date"""
+    fires = intersections[intersections["opr_id"] == opr_id]
+    if after is not None:
+        fires = fires[fires["ignite_at"] > pd.Timestamp(after)]
+    return fires
+
+
+def get_fire_projects(intersections: pd.DataFrame, name: str) -> pd.DataFrame:
+    """Projects burned by fires with a given name (case insensitive)"""
+    return intersections[intersections["name"].str.lower() == name.lower()]
@@ -0,0 +1,155 @@
+"""Table-driven pest and pathogen exposure
+
+A pest scenario is a set of host species, a range of host mortality and, optionally, a set of
+co-host species that must be listed in a project's documentation for the project to count as
+exposed (e.g., California bay laurel, the main sporulating host of _P. ramorum_). Co-host listing
+comes from the species lists in the project database, except for projects in a scenario's
+`co_host_listed`, which were checked by hand against the full project documentation and take
+precedence (a species named in the documentation isn't always in the inventory species list).
+
+All scenarios are evaluated for all projects in one vectorized pass over the normalized project
+tables from `project_tables.flatten_project_db`.
+"""
+from typing import Dict
+
+import pandas as pd
+
+from carbonplan_buffer_analysis import project_tables
+
+BAY_LAUREL_SPECIES_CODE = 981
+
+# whether California bay laurel is listed in the documentation of tanoak projects, checked by
+# hand. Shared with `summarize_tanoak`, and overrides the project database's species lists where
+# they disagree (e.g., CAR1104, ACR189 and CAR1368).
+BAY_LAUREL_LISTED = {
+    "ACR262": True,
+    "CAR1190": True,
+    "CAR1180": True,
+    "ACR200": True,
+    "ACR182": True,
+    "CAR1104": False,
+    "CAR1191": True,
+    "ACR189": False,
+    "CAR1102": True,
+    "CAR993": True,
+    "ACR378": True,
+    "ACR377": True,
+    "CAR1174": True,
+    "ACR282": True,
+    "CAR1103": True,
+    "CAR1313": True,
+    "CAR1329": True,
+    "CAR1330": True,
+    "CAR1339": True,
+    "CAR1368": False,
+}
+
+PEST_SCENARIOS = {
+    "sudden-oak-death": {
+        "hosts": [project_tables.TANOAK_SPECIES_CODE],
+        "mortality": {"minimum": 0.5, "maximum": 0.8},
+        "co_hosts": [],
+    },
+    "sudden-oak-death-bay": {
+        "hosts": [project_tables.TANOAK_SPECIES_CODE],
+        "mortality": {"minimum": 0.5, "maximum": 0.8},
+        "co_hosts": [BAY_LAUREL_SPECIES_CODE],
+        "co_host_listed": BAY_LAUREL_LISTED,
+    },
+}
+
+
+def get_scenario_tables(scenarios: Dict[str, dict]) -> Dict[str, pd.DataFrame]:
+    """Split scenario definitions into host, co-host, co-host listing and mortality tables"""
+
+    def species_table(key):
+        return pd.DataFrame(
+            [(name, code) for name, scenario in scenarios.items() for code in scenario[key]],
+            columns=["group", "code"],
+        )
+
+    co_host_listed = pd.DataFrame(
+        [
+            (name, opr_id, listed)
+            for name, scenario in scenarios.items()
+            for opr_id, listed in scenario.get("co_host_listed", {}).items()
+        ],
+        columns=["group", "opr_id", "has_co_host"],
+    )
+    mortality = pd.DataFrame({name: s["mortality"] for name, s in scenarios.items()}).T
+    return {
+        "hosts": species_table("hosts"),
+        "co_hosts": species_table("co_hosts"),
+        "co_host_listed": co_host_listed,
+        "mortality": mortality.rename_axis("scenario"),
+    }
+
+
+def cap_losses(biomass: pd.Series, max_loses: pd.Series, mortality: dict) -> pd.DataFrame:
+    """Apply a mortality range to exposed biomass, capping losses at project issuance
+
+    Arguments:
+        biomass {pd.Series} -- exposed biomass (tCO2) per opr_id
+        max_loses {pd.Series} -- credits issued per opr_id; projects without issuance can't lose
+            credits, so their losses are capped at zero
+        mortality {dict} -- e.g., {"minimum": 0.5, "maximum": 0.8}
+
+    Returns:
+        pd.DataFrame -- losses per opr_id (rows) and mortality bound (columns)
+    """
+    cap = max_loses.reindex(biomass.index).fillna(0)
+    losses = pd.DataFrame({k: biomass * v for k, v in mortality.items()}, index=biomass.index)
+    return losses.clip(upper=cap, axis=0)
+
+
+def calculate_exposure(
+    tables: Dict[str, pd.DataFrame],
+    max_loses: pd.Series,
+    scenarios: Dict[str, dict] = None,
+) -> pd.DataFrame:
+    """Per project exposed biomass and capped losses for every pest scenario
+
+    Arguments:
+        tables {dict} -- output of `project_tables.flatten_project_db`
+        max_loses {pd.Series} -- credits issued per opr_id
+        scenarios {dict} -- scenario definitions, defaults to PEST_SCENARIOS
+
+    Returns:
+        pd.DataFrame -- indexed by (scenario, opr_id), only including exposed projects, with
+            `host_fraction`, `exposed_biomass` and one loss column per mortality bound
+    """
+    scenarios = scenarios or PEST_SCENARIOS
+    scenario_tables = get_scenario_tables(scenarios)
+
+    fractions = project_tables.get_grouped_species_fractions(tables, scenario_tables["hosts"])
+    exposure = fractions.rename_axis(columns="scenario").stack().rename("host_fraction")
+    exposure = exposure.reorder_levels(["scenario", "opr_id"]).to_frame()
+
+    # co-host filter: scenarios without co-hosts keep every project. Hand-checked listings
+    # override the project database.
+    co_hosts = scenario_tables["co_hosts"]
+    listed_in_db = (
+        tables["species"]
+        .merge(co_hosts, on="code")[["group", "opr_id"]]
+        .drop_duplicates()
+        .assign(has_co_host=True)
+        .set_index(["group", "opr_id"])["has_co_host"]
+    )
+    checked = scenario_tables["co_host_listed"].set_index(["group", "opr_id"])["has_co_host"]
+    listed = checked.combine_first(listed_in_db).rename_axis(["scenario", "opr_id"])
+    needs_co_host = exposure.index.get_level_values("scenario").isin(
+        pd.concat([co_hosts["group"], scenario_tables["co_host_listed"]["group"]])
+    )
+    has_co_host = listed.reindex(exposure.index, fill_value=False).astype(bool).to_numpy()
+    exposure = exposure[(exposure["host_fraction"] > 0) & (~needs_co_host | has_co_host)].copy()
+
+    opr_ids = exposure.index.get_level_values("opr_id")
+    ifm_1 = tables["projects"]["ifm_1"].reindex(opr_ids).to_numpy()
+    exposure["exposed_biomass"] = exposure["host_fraction"] * ifm_1
+
+    mortality = scenario_tables["mortality"].reindex(exposure.index.get_level_values("scenario"))
+    cap = max_loses.reindex(opr_ids).fillna(0).to_numpy()
+    for bound in mortality.columns:
+        losses = exposure["exposed_biomass"] * mortality[bound].to_numpy()
+        exposure[bound] = losses.clip(upper=cap)
+    return exposure
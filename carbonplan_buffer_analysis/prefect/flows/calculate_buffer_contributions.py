@@ -1,62 +1,78 @@
-import json
-
-import fsspec
 import pandas as pd
 import prefect
 from carbonplan_forest_offsets.load.issuance import load_issuance_table
 
+from carbonplan_buffer_analysis import profiling, project_tables, storage
+
+ISSUANCE_CUTOFF = pd.Timestamp(2022, 1, 5)  # Q1 2022 compliance instrument report
+# same for all projects and all protocols!
+PEST_BUFFER_RATE = 0.03
+OTHER_DISTURB_BUFFER_RATE = 0.03
+CONTRIBUTION_COLUMNS = [
+    "gross_buffer",
+    "fire_contributions",
+    "pest_contributions",
+    "other_contributions",
+]
+
 
 @prefect.task
-def load_project_fire_risks() -> dict:
+def load_project_fire_risks() -> pd.Series:
     """Load per-project buffer contributions
 
     Returns:
-        dict -- key-value mapping of project OPR ID to buffer contribution
+        pd.Series -- fire buffer contribution (fraction of issuance) by opr_id
     """
-    with fsspec.open("gs://carbonplan-buffer-analysis/inputs/project-fire-risks.json") as f:
-        d = json.load(f)
-    return d
+    d = storage.read_json("gs://carbonplan-buffer-analysis/inputs/project-fire-risks.json")
+    return project_tables.make_project_table(fire_risk=d)["fire_risk"]
 
 
 @prefect.task
-def get_issuance_table() -> pd.DataFrame:
-    """Most recent subset to Q1 compliance instrument report"""
+def get_issuance_table(cutoff: pd.Timestamp = ISSUANCE_CUTOFF) -> pd.DataFrame:
+    """Most recent subset to Q1 compliance instrument report
+
+    Arguments:
+        cutoff {pd.Timestamp} -- last issuance date to include, None for every issuance
+    """
     df = load_issuance_table(most_recent=True, forest_only=False)
 
-    df = df[df["issued_at"] <= pd.Timestamp(2022, 1, 5)].copy()
-    return df
+    if cutoff is not None:
+        df = df[df["issued_at"] <= cutoff]
+    return df.copy()
 
 
 @prefect.task
-def get_project_issuance(issuance_df: pd.DataFrame) -> dict:
-    """Load and subset ARB issuance table
+def get_project_issuance(issuance_df: pd.DataFrame) -> pd.Series:
+    """Total issuance to forest projects
 
     Returns:
-        pd.DataFrame -- subset dataframe that just includes forest projects
+        pd.Series -- allocated ARBOCs by opr_id
     """
 
     subset = issuance_df[issuance_df["project_type"] == "forest"]
 
     subset = subset[pd.notna(subset["allocation"])]  # drops verified reversals
-    total_issuance = subset.groupby("opr_id")["allocation"].sum().to_dict()
-    return total_issuance
+    total_issuance = subset.groupby("opr_id")["allocation"].sum()
+    return project_tables.make_project_table(issuance=total_issuance)["issuance"]
 
 
 @prefect.task
-def calculate_fire_buffer(project_issuance: dict, fire_risks: dict) -> float:
+def calculate_fire_buffer(project_issuance: pd.Series, fire_risks: pd.Series) -> float:
     """Calculates the number of ARBOCs placed into the buffer pool for fire related risks
 
     Arguments:
-        project_issuance {dict} -- key-value of OPR-ID to total issuance
-        fire_risks {dict} -- key-value of OPR-ID to fire buffer pool contribution
+        project_issuance {pd.Series} -- total issuance by opr_id
+        fire_risks {pd.Series} -- fire buffer pool contribution by opr_id
 
     Returns:
         float -- fire ARBOCs (rounded to two decimal places)
     """
-    buffer_contribs = sum(
-        [issuance * fire_risks[opr_id] for opr_id, issuance in project_issuance.items()]
-    )
-    return round(buffer_contribs)
+    projects = project_tables.make_project_table(issuance=project_issuance, fire_risk=fire_risks)
+    projects = projects[projects["issuance"].notna()]
+    missing = projects.index[projects["fire_risk"].isna()]
+    if len(missing):
+        raise KeyError(f"no fire risk for {list(missing)}")
+    return round((projects["issuance"] * projects["fire_risk"]).sum())
 
 
 @prefect.task
@@ -65,13 +81,78 @@ def calculate_gross_buffer(issuance_df: pd.DataFrame) -> float:
 
 
 @prefect.task
-def calculate_pest_buffer(project_issuance: dict) -> float:
-    return round(sum(project_issuance.values()) * 0.03)  # same for all projects and all protocols!
+def calculate_pest_buffer(project_issuance: pd.Series) -> float:
+    return round(project_issuance.sum() * PEST_BUFFER_RATE)
 
 
 @prefect.task
-def calculate_other_disturb_buffer(project_issuance: dict) -> float:
-    return round(sum(project_issuance.values()) * 0.03)  # same for all projects and all protocols!
+def calculate_other_disturb_buffer(project_issuance: pd.Series) -> float:
+    return round(project_issuance.sum() * OTHER_DISTURB_BUFFER_RATE)
+
+
+def get_contributions_timeseries(issuance_df: pd.DataFrame, fire_risks: pd.Series) -> pd.DataFrame:
+    """Cumulative buffer contributions as of every issuance date
+
+    Each issuance contributes to the buffer in the same way as the point estimates above: gross
+    buffer from every project type, fire/pest/other from forest project allocations. Contributions
+    are summed per issuance date and accumulated in a single date-sorted pass.
+
+    Returns:
+        pd.DataFrame -- cumulative CONTRIBUTION_COLUMNS (unrounded), indexed by issued_at
+
+    Raises:
+        KeyError -- like `calculate_fire_buffer`, if a forest project has no fire risk
+    """
+    forest = issuance_df["project_type"].eq("forest") & issuance_df["allocation"].notna()
+    allocation = issuance_df["allocation"].where(forest, 0).astype(float)
+    fire_risk = issuance_df["opr_id"].map(fire_risks)
+    missing = issuance_df.loc[forest & fire_risk.isna(), "opr_id"].unique()
+    if len(missing):
+        raise KeyError(f"no fire risk for {list(missing)}")
+    fire_risk = fire_risk.where(forest, 0)
+
+    contributions = pd.DataFrame(
+        {
+            "issued_at": issuance_df["issued_at"],
+            "gross_buffer": issuance_df["buffer_pool"].fillna(0),
+            "fire_contributions": allocation * fire_risk,
+            "pest_contributions": allocation * PEST_BUFFER_RATE,
+            "other_contributions": allocation * OTHER_DISTURB_BUFFER_RATE,
+        }
+    )
+    return contributions.groupby("issued_at")[CONTRIBUTION_COLUMNS].sum().sort_index().cumsum()
+
+
+def get_contributions_as_of(timeseries: pd.DataFrame, dates) -> pd.DataFrame:
+    """Cumulative contributions as of arbitrary dates (zero before the first issuance)
+
+    Arguments:
+        timeseries {pd.DataFrame} -- output of `get_contributions_timeseries`
+        dates {array-like} -- dates to look up, need not be issuance dates or sorted
+
+    Returns:
+        pd.DataFrame -- contributions indexed by dates
+    """
+    dates = pd.DatetimeIndex(dates)
+    positions = timeseries.index.searchsorted(dates, side="right") - 1
+    values = timeseries.to_numpy()[positions]
+    values[positions < 0] = 0
+    return pd.DataFrame(values, index=dates, columns=timeseries.columns)
+
+
+@prefect.task
+def calculate_contributions_timeseries(
+    issuance_df: pd.DataFrame, fire_risks: pd.Series
+) -> pd.DataFrame:
+    return get_contributions_timeseries(issuance_df, fire_risks)
+
+
+@prefect.task
+def save_contributions_timeseries(timeseries: pd.DataFrame) -> None:
+    with profiling.open_file(
+        "gs://carbonplan-buffer-analysis/outputs/buffer_contributions_timeseries.csv", "w"
+    ) as f:
+        timeseries.round().to_csv(f)
 
 
 @prefect.task()
@@ -93,8 +174,7 @@ def summarize_buffer_contributions(
         "gross_buffer": gross_buffer,
         "other_contributions": other_contributions,
     }
-    with fsspec.open("gs://carbonplan-buffer-analysis/outputs/buffer_contributions.json", "w") as f:
-        json.dump(d, f)
+    storage.write_json("gs://carbonplan-buffer-analysis/outputs/buffer_contributions.json", d)
 
 
 with prefect.Flow("calculate-fire-buffer") as flow:
@@ -110,3 +190,6 @@ with prefect.Flow("calculate-fire-buffer") as flow:
     summarize_buffer_contributions(
         gross_buffer, pest_contributions, other_contributions, fire_contributions
     )
+
+if __name__ == "__main__":
+    profiling.run_flow(flow)
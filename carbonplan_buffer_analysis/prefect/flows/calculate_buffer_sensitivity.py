@@ -0,0 +1,210 @@
+import functools
+
+import numpy as np
+import pandas as pd
+import prefect
+from carbonplan_forest_offsets.load.project_db import load_project_data
+
+from carbonplan_buffer_analysis import profiling, sensitivity, storage
+from carbonplan_buffer_analysis.prefect.flows import summarize_fire, summarize_tanoak
+from carbonplan_buffer_analysis.prefect.flows.calculate_buffer_contributions import (
+    OTHER_DISTURB_BUFFER_RATE,
+    PEST_BUFFER_RATE,
+    calculate_fire_buffer,
+    get_issuance_table,
+    get_project_issuance,
+    load_project_fire_risks,
+)
+from carbonplan_buffer_analysis.prefect.flows.calculate_fire_reversals import (
+    EVENTS,
+    load_ravg_summary,
+)
+from carbonplan_buffer_analysis.prefect.tasks import project_reversals, ravg
+
+BUFFER_RATE_SPREAD = 0.01  # buffer rates are varied +/- this around the protocol's rates
+
+
+def get_parameter_space(frac_merch: pd.Series, frac_merch_quantiles: dict) -> tuple:
+    """Ranges of every sampled parameter, and values of those that don't vary
+
+    Returns:
+        tuple -- (bounds, fixed) dicts by parameter name
+    """
+    bounds, fixed = {}, {}
+    for ba7_class, (low, high) in ravg.SEVERITY_TO_MORTALITY_RANGE.items():
+        if low == high:
+            fixed[f"mortality_{ba7_class}"] = low
+        else:
+            bounds[f"mortality_{ba7_class}"] = (low, high)
+
+    # frac_merch_override blends each project's own frac_merch (0, low salvage) with the registry
+    # quantile used above low salvage (1). If they're the same, there is nothing to vary.
+    override = frac_merch_quantiles[project_reversals.SALVAGE_FRAC_MERCH_QUANTILE["high"]]
+    if np.allclose(frac_merch, override):
+        fixed["frac_merch_override"] = 0.0
+    else:
+        bounds["frac_merch_override"] = (0.0, 1.0)
+
+    tanoak_mortality = summarize_tanoak.TANOAK_BIOMASS_LOSS
+    bounds.update(
+        {
+            "salvage_fraction": (
+                project_reversals.SALVAGE_FRACTIONS["low"],
+                project_reversals.SALVAGE_FRACTIONS["high"],
+            ),
+            "ifm3_fraction": (0.0, 1.0),  # include_ifm3, as a continuous fraction of ifm-3
+            "tanoak_mortality": (tanoak_mortality["minimum"], tanoak_mortality["maximum"]),
+            "pest_buffer_rate": (
+                PEST_BUFFER_RATE - BUFFER_RATE_SPREAD,
+                PEST_BUFFER_RATE + BUFFER_RATE_SPREAD,
+            ),
+            "other_buffer_rate": (
+                OTHER_DISTURB_BUFFER_RATE - BUFFER_RATE_SPREAD,
+                OTHER_DISTURB_BUFFER_RATE + BUFFER_RATE_SPREAD,
+            ),
+        }
+    )
+    return bounds, fixed
+
+
+@prefect.task
+def load_fire_events(max_loses: pd.Series) -> pd.DataFrame:
+    """Everything `calculate_fire_reversals` uses, for every event, except the parameters
+
+    Returns:
+        pd.DataFrame -- per event onsite carbon (ifm1, ifm3), burned fraction of the project,
+            project frac_merch, wood product storage fraction, issuance cap and the fraction of
+            burned area in each RAVG severity class (`share_{class}` columns)
+    """
+    records = []
+    for event in EVENTS:
+        opr_id = event["opr_id"]
+        ravg_summary = load_ravg_summary.run(event["fire_name"])
+        bounds = project_reversals.get_project_bounds.run(opr_id)
+        fires = project_reversals.load_fire_perimeters.run(bounds)
+        project_fires = project_reversals.get_project_fires.run(opr_id, fires)
+        burned_area = project_reversals.calculate_project_burned_area.run(
+            project_fires, ravg_summary, event["is_proxy"], event["year"]
+        )
+        prefire_biomass = project_reversals.load_prefire_biomass.run(opr_id)
+        storage_factors = project_reversals.load_woodproduct_storage_factors.run(opr_id)
+
+        counts = {int(float(k)): v for k, v in ravg_summary["counts"].items()}
+        total = sum(counts.values())
+        records.append(
+            {
+                "opr_id": opr_id,
+                "ifm1": prefire_biomass["ifm-1"],
+                "ifm3": prefire_biomass["ifm-3"],
+                "frac_burned": burned_area / load_project_data(opr_id)["acreage"],
+                "frac_merch": storage_factors["frac_merch"],
+                "storage_frac": storage_factors["lf_frac"] + storage_factors["inuse_frac"],
+                "max_loss": max_loses.get(opr_id, np.nan),
+                **{
+                    f"share_{c}": counts.get(c, 0) / total for c in ravg.SEVERITY_TO_MORTALITY_RANGE
+                },
+            }
+        )
+    return pd.DataFrame(records).set_index("opr_id")
+
+
+@prefect.task
+def get_model_inputs(
+    fire_events: pd.DataFrame,
+    frac_merch_quantiles: dict,
+    tanoak_biomass: pd.Series,
+    max_loses: pd.Series,
+    project_issuance: pd.Series,
+    fire_contributions: float,
+) -> dict:
+    """Fixed inputs of `sensitivity.calculate_shortfall`, as arrays"""
+    tanoak_biomass = tanoak_biomass.dropna()
+    classes = list(ravg.SEVERITY_TO_MORTALITY_RANGE)
+    override = frac_merch_quantiles[project_reversals.SALVAGE_FRAC_MERCH_QUANTILE["high"]]
+    return {
+        "severity_classes": classes,
+        "severity_shares": fire_events[[f"share_{c}" for c in classes]].to_numpy(),
+        "ifm1": fire_events["ifm1"].to_numpy(),
+        "ifm3": fire_events["ifm3"].to_numpy(),
+        "frac_burned": fire_events["frac_burned"].to_numpy(),
+        "frac_merch": fire_events["frac_merch"].to_numpy(),
+        "frac_merch_registry": override,
+        "storage_frac": fire_events["storage_frac"].to_numpy(),
+        # like summarize_fire, losses of projects without issuance aren't capped
+        "fire_max_loss": fire_events["max_loss"].astype(float).fillna(np.inf).to_numpy(),
+        "known_reversals": summarize_fire.get_known_reversals(),
+        "tanoak_biomass": tanoak_biomass.to_numpy(),
+        # projects without issuance can't lose credits
+        "tanoak_max_loss": max_loses.reindex(tanoak_biomass.index).fillna(0).to_numpy(),
+        "issuance": project_issuance.sum(),
+        "fire_contributions": fire_contributions,
+    }
+
+
+@prefect.task
+def calculate_sensitivity(
+    inputs: dict, fire_events: pd.DataFrame, frac_merch_quantiles: dict, n_samples: int, seed: int
+) -> dict:
+    bounds, fixed = get_parameter_space(fire_events["frac_merch"], frac_merch_quantiles)
+    model = functools.partial(sensitivity.calculate_shortfall, inputs=inputs)
+    with profiling.span("sobol_analysis"):
+        result = sensitivity.analyze(model, bounds, fixed, n=n_samples, seed=seed)
+    profiling.record_pixels(result["n_evaluations"])
+    result["bounds"] = bounds
+    return result
+
+
+@prefect.task
+def save_sensitivity(result: dict, seed: int) -> None:
+    with profiling.open_file(
+        "gs://carbonplan-buffer-analysis/intermediates/buffer-sensitivity.csv", "w"
+    ) as f:
+        result["indices"].to_csv(f)
+
+    indices = result["indices"].round(4)
+    outputs = (
+        result["outputs"]
+        .round(0)
+        .assign(probability_positive=result["outputs"]["probability_positive"].round(4))
+    )
+    d = {
+        output: {
+            "shortfall": outputs.loc[output].to_dict(),
+            "indices": indices.loc[output].to_dict(orient="index"),
+        }
+        for output in outputs.index
+    }
+    d["parameters"] = {k: list(v) for k, v in result["bounds"].items()}
+    d.update({"n_evaluations": result["n_evaluations"], "seed": seed})
+    storage.write_json(
+        "gs://carbonplan-buffer-analysis/outputs/buffer-sensitivity.json", d, indent=2
+    )
+
+
+with prefect.Flow("calculate-buffer-sensitivity") as flow:
+    n_samples = prefect.Parameter("n_samples", default=sensitivity.N_SAMPLES)
+    seed = prefect.Parameter("seed", default=0)
+
+    issuance_df = get_issuance_table()
+    project_issuance = get_project_issuance(issuance_df)
+    max_loses = summarize_fire.get_max_loses(issuance_df)
+    fire_contributions = calculate_fire_buffer(project_issuance, load_project_fire_risks())
+
+    fire_events = load_fire_events(max_loses)
+    frac_merch_quantiles = project_reversals.load_frac_merch_quantiles()
+    tanoak_biomass = summarize_tanoak.get_tanoak_biomass(summarize_tanoak.load_tanoak_basal_area())
+
+    inputs = get_model_inputs(
+        fire_events,
+        frac_merch_quantiles,
+        tanoak_biomass,
+        max_loses,
+        project_issuance,
+        fire_contributions,
+    )
+    result = calculate_sensitivity(inputs, fire_events, frac_merch_quantiles, n_samples, seed)
+    save_sensitivity(result, seed)
+
+
+if __name__ == "__main__":
+    profiling.run_flow(flow)
@@ -0,0 +1,19 @@
+import prefect
+
+from carbonplan_buffer_analysis import profiling
+from carbonplan_buffer_analysis.prefect.flows.calculate_buffer_contributions import (
+    calculate_contributions_timeseries,
+    get_issuance_table,
+    load_project_fire_risks,
+    save_contributions_timeseries,
+)
+
+with prefect.Flow("calculate-buffer-timeseries") as flow:
+    fire_risks = load_project_fire_risks()
+    issuance_df = get_issuance_table(cutoff=None)  # every issuance, not just up to the cutoff
+
+    timeseries = calculate_contributions_timeseries(issuance_df, fire_risks)
+    save_contributions_timeseries(timeseries)
+
+if __name__ == "__main__":
+    profiling.run_flow(flow)
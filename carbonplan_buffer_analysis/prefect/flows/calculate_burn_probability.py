@@ -0,0 +1,151 @@
+import shutil
+
+import geopandas
+import numpy as np
+import pandas as pd
+import prefect
+import rasterio
+from carbonplan_forest_offsets.data import cat
+from rasterio.windows import Window
+from shapely.geometry import box
+
+from carbonplan_buffer_analysis import profiling, storage, utils, zonal
+from carbonplan_buffer_analysis.prefect.flows.calculate_buffer_contributions import (
+    load_project_fire_risks,
+)
+from carbonplan_buffer_analysis.prefect.tasks import project_reversals
+
+BURN_GRID_RESOLUTION = 250  # m, MTBS only maps large fires (>1,000 acres in the west)
+BURN_BLOCK_ROWS = 512
+BURN_COUNT_RASTER = "gs://carbonplan-buffer-analysis/intermediates/mtbs-burn-count.tif"
+
+
+@prefect.task
+def load_registry_geometries() -> geopandas.GeoDataFrame:
+    opr_ids = [project["opr_id"] for project in cat.project_db_json.read()]
+    return utils.load_project_geometries(opr_ids, project_reversals.CRS)
+
+
+@prefect.task
+def load_fire_archive(projects: geopandas.GeoDataFrame) -> geopandas.GeoDataFrame:
+    """Every MTBS wildfire perimeter (not just those after project start dates) near projects"""
+    fires = project_reversals.load_mtbs_fires(bbox=tuple(projects.total_bounds))
+    return fires.assign(year=fires["ignite_at"].dt.year)[["year", "geometry"]]
+
+
+def get_burn_block(fires: geopandas.GeoDataFrame, grid: zonal.Grid, window: Window) -> np.ndarray:
+    """Number of years burned and most recent year burned, for one window of the grid
+
+    Fires are rasterized one year at a time, so overlapping perimeters from the same year only
+    count once.
+    """
+    count = np.zeros((int(window.height), int(window.width)), dtype="int16")
+    last_year = np.zeros_like(count)
+
+    candidates = fires.iloc[fires.sindex.query(box(*grid.window_bounds(window)))]
+    for year, year_fires in candidates.groupby("year"):
+        burned = zonal.rasterize_mask(year_fires.geometry, grid, window)
+        count += burned
+        last_year[burned] = year
+    return np.stack([count, last_year])
+
+
+@prefect.task
+def calculate_burn_probability(
+    projects: geopandas.GeoDataFrame, fires: geopandas.GeoDataFrame, resolution: float
+) -> pd.DataFrame:
+    """Empirical annual burn probability per project from the full MTBS archive
+
+    Burn count and most recent burn year are rasterized onto a common grid covering every project
+    and written to a tiled GeoTIFF one block of rows at a time. Each block is reduced by project
+    (zonal mean burn count) as it is written, so the full grid is never held in memory.
+
+    Returns:
+        pd.DataFrame -- per opr_id pixel count, fraction ever burned, mean burn count and annual
+            burn probability (mean burn count / years in the archive)
+    """
+    grid = zonal.Grid.from_bounds(projects.total_bounds, resolution, project_reversals.CRS)
+    n_years = fires["year"].max() - fires["year"].min() + 1
+    n_projects = len(projects)
+    burn_counts = np.zeros(n_projects + 1)
+    burned_pixels = np.zeros(n_projects + 1)
+    pixels = np.zeros(n_projects + 1)
+
+    path = utils.LOCAL_CACHE / "mtbs-burn-count.tif"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp.tif")
+    profile = dict(
+        driver="GTiff",
+        height=grid.height,
+        width=grid.width,
+        count=2,
+        dtype="int16",
+        crs=grid.crs,
+        transform=grid.transform,
+        tiled=True,
+        blockxsize=256,
+        blockysize=256,
+        compress="deflate",
+    )
+    with rasterio.open(tmp, "w", **profile) as dst:
+        dst.set_band_description(1, "burn_count")
+        dst.set_band_description(2, "last_burn_year")
+        for window in grid.windows(BURN_BLOCK_ROWS):
+            with profiling.span("burn_block"):
+                block = get_burn_block(fires, grid, window)
+                dst.write(block, window=window)
+
+                labels = zonal.rasterize_labels(projects.geometry, grid, window)
+                sums, counts = zonal.zonal_sums(labels, block[0], n_projects)
+                burn_counts += sums
+                pixels += counts
+                burned_pixels += zonal.zonal_sums(labels, block[0] > 0, n_projects)[0]
+                profiling.record_pixels(block[0].size)
+    tmp.rename(path)
+
+    with open(path, "rb") as src, profiling.open_file(BURN_COUNT_RASTER, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+
+    with np.errstate(invalid="ignore"):
+        mean_burn_count = burn_counts[1:] / pixels[1:]
+        burned_fraction = burned_pixels[1:] / pixels[1:]
+    return pd.DataFrame(
+        {
+            "pixels": pixels[1:].astype(int),
+            "burned_fraction": burned_fraction,
+            "mean_burn_count": mean_burn_count,
+            "burn_probability": mean_burn_count / n_years,
+        },
+        index=projects.index,
+    )
+
+
+@prefect.task
+def save_burn_probability(burn_probability: pd.DataFrame, fire_risks: pd.Series) -> None:
+    """Write burn probabilities, alongside static fire risk ratings for comparison"""
+    burn_probability = burn_probability.assign(fire_risk=burn_probability.index.map(fire_risks))
+    with profiling.open_file(
+        "gs://carbonplan-buffer-analysis/intermediates/burn-probability.csv", "w"
+    ) as f:
+        burn_probability.to_csv(f)
+
+    storage.write_json(
+        "gs://carbonplan-buffer-analysis/outputs/burn-probability.json",
+        burn_probability["burn_probability"].dropna().round(6).to_dict(),
+        indent=2,
+    )
+
+
+with prefect.Flow("calculate-burn-probability") as flow:
+    resolution = prefect.Parameter("resolution", default=BURN_GRID_RESOLUTION)
+
+    projects = load_registry_geometries()
+    fires = load_fire_archive(projects)
+    fire_risks = load_project_fire_risks()
+
+    burn_probability = calculate_burn_probability(projects, fires, resolution)
+    save_burn_probability(burn_probability, fire_risks)
+
+
+if __name__ == "__main__":
+    profiling.run_flow(flow)
@@ -0,0 +1,155 @@
+import hashlib
+import json
+
+import fsspec
+import pandas as pd
+import prefect
+from prefect.executors import LocalDaskExecutor
+
+from carbonplan_buffer_analysis import profiling, utils
+
+FIA_DATAMART = "https://apps.fs.usda.gov/fia/datamart/CSV"
+FIA_PARQUET = "gs://carbonplan-buffer-analysis/intermediates/fia"
+RFIA_OUTPUTS = "gs://carbonplan-buffer-analysis/rfia"
+
+FIA_COLUMNS = {
+    "PLOT": {
+        "CN": str,
+        "STATECD": "int16",
+        "UNITCD": "int16",
+        "COUNTYCD": "int16",
+        "PLOT": "int32",
+        "MEASYEAR": "int16",
+    },
+    "TREE": {
+        "PLT_CN": str,
+        "CONDID": "int8",
+        "STATUSCD": "int8",
+        "SPCD": "int16",
+        "DIA": "float32",
+        "TPA_UNADJ": "float32",
+        "DRYBIO_AG": "float32",
+    },
+    "COND": {
+        "PLT_CN": str,
+        "CONDID": "int8",
+        "COND_STATUS_CD": "int8",
+    },
+}
+LIVE_TREE = 1
+FOREST_CONDITION = 1
+BASAL_AREA_FACTOR = 0.005454154  # square feet from diameter in inches
+LBS_PER_TON = 2000
+
+
+def load_fia_table(state: str, table: str) -> pd.DataFrame:
+    """Load a raw FIA table for a single state, caching it as typed parquet
+
+    Only the columns needed downstream are read from the (large) DataMart CSVs. The cache is
+    keyed on the CSV's etag / modification time and the columns read, so a republished table or
+    a change to `FIA_COLUMNS` is picked up rather than served from a stale parquet.
+    """
+    csv_path = f"{FIA_DATAMART}/{state}_{table}.csv"
+    columns = FIA_COLUMNS[table]
+    key = json.dumps([utils.get_version(csv_path), list(columns)], sort_keys=True)
+    key = hashlib.sha256(key.encode()).hexdigest()[:16]
+    parquet_path = f"{FIA_PARQUET}/{state}_{table}-{key}.parquet"
+    fs, path = fsspec.core.url_to_fs(parquet_path)
+    if fs.exists(path):
+        with profiling.open_file(parquet_path) as f:
+            return pd.read_parquet(f)
+
+    with profiling.open_file(csv_path, "r") as f:
+        df = pd.read_csv(f, usecols=list(columns), dtype=columns)
+
+    with profiling.open_file(parquet_path, "wb") as f:
+        df.to_parquet(f, index=False)
+    return df
+
+
+def summarize_plots(plots: pd.DataFrame, trees: pd.DataFrame, conds: pd.DataFrame) -> dict:
+    """Plot and plot x species live tree biomass, trees per acre and basal area per acre
+
+    Mirrors rFIA's `biomass(byPlot = TRUE)` and `tpa(byPlot = TRUE)`, with and without
+    `bySpecies = TRUE`, for the default `landType = "forest"`: only trees on forested conditions
+    are counted. Biomass is aboveground dry biomass in short tons per acre, basal area is in
+    square feet per acre.
+
+    Returns:
+        dict -- `plot` and `plot_species` DataFrames indexed by (pltID, YEAR[, SPCD])
+    """
+    trees = trees[(trees["STATUSCD"] == LIVE_TREE) & trees["TPA_UNADJ"].notna()]
+    forest = conds.loc[conds["COND_STATUS_CD"] == FOREST_CONDITION, ["PLT_CN", "CONDID"]]
+    trees = trees.merge(forest, on=["PLT_CN", "CONDID"])
+
+    plots = plots.assign(
+        pltID=(
+            plots["UNITCD"].astype(str)
+            + "_"
+            + plots["STATECD"].astype(str)
+            + "_"
+            + plots["COUNTYCD"].astype(str)
+            + "_"
+            + plots["PLOT"].astype(str)
+        ),
+        YEAR=plots["MEASYEAR"],
+    )[["CN", "pltID", "YEAR"]]
+
+    trees = trees.merge(plots, left_on="PLT_CN", right_on="CN")
+    metrics = pd.DataFrame(
+        {
+            "pltID": trees["pltID"],
+            "YEAR": trees["YEAR"],
+            "SPCD": trees["SPCD"],
+            "BIO_ACRE": trees["DRYBIO_AG"].fillna(0) * trees["TPA_UNADJ"] / LBS_PER_TON,
+            "TPA": trees["TPA_UNADJ"],
+            "BAA": BASAL_AREA_FACTOR * trees["DIA"] ** 2 * trees["TPA_UNADJ"],
+        }
+    )
+    return {
+        "plot": metrics.groupby(["pltID", "YEAR"])[["BIO_ACRE", "TPA", "BAA"]].sum(),
+        "plot_species": metrics.groupby(["pltID", "YEAR", "SPCD"])[
+            ["BIO_ACRE", "TPA", "BAA"]
+        ].sum(),
+    }
+
+
+@prefect.task
+def summarize_state(state: str) -> dict:
+    plots = load_fia_table(state, "PLOT")
+    trees = load_fia_table(state, "TREE")
+    conds = load_fia_table(state, "COND")
+    return summarize_plots(plots, trees, conds)
+
+
+@prefect.task
+def save_fia_summaries(summaries: list) -> None:
+    """Write rFIA-style plot summaries consumed by tanoak-baa-biomass-figure.ipynb"""
+    plot = pd.concat([summary["plot"] for summary in summaries])
+    plot_species = pd.concat([summary["plot_species"] for summary in summaries])
+
+    outputs = {
+        "plot_biomass.csv": plot[["BIO_ACRE"]],
+        "plot_species_biomass.csv": plot_species[["BIO_ACRE"]],
+        "plot_tpa.csv": plot[["TPA", "BAA"]],
+        "plot_species_tpa.csv": plot_species[["TPA", "BAA"]],
+    }
+    for fn, df in outputs.items():
+        with profiling.open_file(f"{RFIA_OUTPUTS}/{fn}", "w") as f:
+            df.to_csv(f)
+
+
+with prefect.Flow("calculate-fia-biomass") as flow:
+    states = prefect.Parameter("states", default=["CA"])
+
+    summaries = summarize_state.map(states)
+    save_fia_summaries(summaries)
+
+
+def main():
+    """Summarize states in parallel worker processes"""
+    profiling.run_flow(flow, executor=LocalDaskExecutor(scheduler="processes"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import geopandas
+import pandas as pd
+import prefect
+
+from carbonplan_buffer_analysis import intersections, profiling, screening
+from carbonplan_buffer_analysis.prefect.flows.calculate_burn_probability import (
+    load_registry_geometries,
+)
+from carbonplan_buffer_analysis.prefect.tasks import project_reversals
+
+
+@prefect.task
+def load_fire_perimeters(projects: geopandas.GeoDataFrame) -> geopandas.GeoDataFrame:
+    """NIFC and MTBS perimeters near projects, with ids that are stable for a given source file"""
+    bbox = tuple(projects.to_crs(project_reversals.CRS).total_bounds)
+    sources = {
+        "nifc": project_reversals.load_nifc_fires(bbox),
+        "mtbs": project_reversals.load_mtbs_fires(bbox),
+    }
+    return pd.concat(
+        [
+            fires.assign(fire_id=f"{source}-" + fires.index.astype(str))
+            for source, fires in sources.items()
+        ],
+        ignore_index=True,
+    )
+
+
+def get_intersections(
+    projects: geopandas.GeoDataFrame,
+    fires: geopandas.GeoDataFrame,
+    screen_threshold: float = 0.0,
+) -> pd.DataFrame:
+    """Area and project fraction of every non-empty project x fire intersection
+
+    Candidate pairs come from a coarse raster screen (see `screening`), which never drops a real
+    intersection. Candidates whose approximate overlap is at least `screen_threshold` (as a
+    fraction of project area) get an exact vector intersection; the rest keep the approximate
+    area and are flagged `exact=False`. Candidates with no approximate overlap at all (sliver
+    overlaps and boundary touches, which share no cell centers) are always exact, so a small
+    real overlap isn't dropped as empty. With the default of 0 every candidate is exact.
+    """
+    projects = projects.to_crs(fires.crs)
+    pairs = screening.screen_pairs(projects.geometry, fires.geometry)
+    escalate = ~(pairs["approx_fraction"] < screen_threshold).to_numpy()  # NaN escalates
+    escalate |= (pairs["approx_area"] == 0).to_numpy()
+
+    project_geometries = projects.geometry.values[pairs["project"].to_numpy()]
+    fire_geometries = fires.geometry.values[pairs["fire"].to_numpy()]
+    area = pairs["approx_area"].to_numpy(dtype=float)
+    with profiling.span("exact_intersections"):
+        area[escalate] = fire_geometries[escalate].intersection(project_geometries[escalate]).area
+
+    matched = fires.iloc[pairs["fire"].to_numpy()]
+    df = pd.DataFrame(
+        {
+            "opr_id": projects.index.to_numpy()[pairs["project"].to_numpy()],
+            "fire_id": matched["fire_id"].to_numpy(),
+            "name": matched["name"].to_numpy(),
+            "ignite_at": matched["ignite_at"].to_numpy(),
+            "acres": area / project_reversals.M2_TO_ACRE,
+            "fraction": area / project_geometries.area,
+            "exact": escalate,
+        }
+    )
+    return df[df["acres"] > 0].sort_values(["opr_id", "ignite_at"]).reset_index(drop=True)
+
+
+@prefect.task
+def calculate_intersections(
+    projects: geopandas.GeoDataFrame, fires: geopandas.GeoDataFrame, screen_threshold: float
+) -> pd.DataFrame:
+    return get_intersections(projects, fires, screen_threshold)
+
+
+@prefect.task
+def save_intersections(df: pd.DataFrame) -> None:
+    with profiling.open_file(intersections.INTERSECTIONS, "wb") as f:
+        df.to_parquet(f, index=False)
+
+
+with prefect.Flow("calculate-fire-intersections") as flow:
+    screen_threshold = prefect.Parameter("screen_threshold", default=0.0)
+
+    projects = load_registry_geometries()
+    fires = load_fire_perimeters(projects)
+
+    df = calculate_intersections(projects, fires, screen_threshold)
+    save_intersections(df)
+
+if __name__ == "__main__":
+    profiling.run_flow(flow)
@@ -1,16 +1,23 @@
-import json
 from itertools import product
 
-import fsspec
 import prefect
 
+from carbonplan_buffer_analysis import checkpoint, profiling, storage
 from carbonplan_buffer_analysis.prefect.tasks import project_reversals
 
+EVENTS = [
+    {"opr_id": "ACR260", "fire_name": "lionshead", "is_proxy": False, "year": 2020},
+    {"opr_id": "ACR273", "fire_name": "bootleg", "is_proxy": False, "year": 2021},
+    {"opr_id": "ACR255", "fire_name": "north-star", "is_proxy": True, "year": 2021},
+    {"opr_id": "CAR1102", "fire_name": "ranch", "is_proxy": True, "year": 2020},
+]
+
 
 @prefect.task
 def load_ravg_summary(fire_name):
-    with fsspec.open(f"gs://carbonplan-buffer-analysis/intermediates/ravg/{fire_name}.json") as f:
-        ravg_summary = json.load(f)
+    ravg_summary = storage.read_json(
+        f"gs://carbonplan-buffer-analysis/intermediates/ravg/{fire_name}.json"
+    )
     return ravg_summary
 
 
@@ -23,8 +30,10 @@ with prefect.Flow("project-fire-reversals") as flow:
     fire_name = prefect.Parameter("fire_name")
     is_proxy = prefect.Parameter("is_proxy")
     year = prefect.Parameter("year")
+    loss_mode = prefect.Parameter("loss_mode", default="area")
 
-    fires = project_reversals.load_fire_perimeters()
+    bounds = project_reversals.get_project_bounds(opr_id)
+    fires = project_reversals.load_fire_perimeters(bounds)
     project_fires = project_reversals.get_project_fires(opr_id, fires)
 
     ravg_summary = load_ravg_summary(fire_name)
@@ -37,35 +46,64 @@ with prefect.Flow("project-fire-reversals") as flow:
 
     prefire_biomass = project_reversals.load_prefire_biomass(opr_id)
     storage_factors = project_reversals.load_woodproduct_storage_factors(opr_id)
+    frac_merch_quantiles = project_reversals.load_frac_merch_quantiles(salvage_level)
 
     biomass_loss = project_reversals.calculate_biomass_loss(
-        opr_id, ravg_summary, burned_area, prefire_biomass, severity_level, include_ifm3
+        opr_id,
+        ravg_summary,
+        burned_area,
+        prefire_biomass,
+        severity_level,
+        include_ifm3,
+        loss_mode,
+        is_proxy,
     )
     salvaged_wp = project_reversals.calculate_salvaged_wood_products(
-        biomass_loss, storage_factors, salvage_level
+        biomass_loss, storage_factors, salvage_level, frac_merch_quantiles
     )
 
     project_reversals.write_estimate(
-        opr_id, biomass_loss, salvaged_wp, severity_level, salvage_level, include_ifm3
+        opr_id, biomass_loss, salvaged_wp, severity_level, salvage_level, include_ifm3, loss_mode
     )
 
-if __name__ == "__main__":
+
+def main(loss_mode: str = "area"):
+    """Run every fire/severity/salvage scenario"""
     severity_levels = ["low", "high"]
     salvage_levels = ["low", "high"]
     ifm3_flags = [True, False]
-    events = [
-        {"opr_id": "ACR260", "fire_name": "lionshead", "is_proxy": False, "year": 2020},
-        {"opr_id": "ACR273", "fire_name": "bootleg", "is_proxy": False, "year": 2021},
-        {"opr_id": "ACR255", "fire_name": "north-star", "is_proxy": True, "year": 2021},
-        {"opr_id": "CAR1102", "fire_name": "ranch", "is_proxy": True, "year": 2020},
-    ]
-    for severity_level, salvage_level, ifm3_flag, event in product(
-        severity_levels, salvage_levels, ifm3_flags, events
-    ):
-
-        flow.run(
-            severity_level=severity_level,
-            salvage_level=salvage_level,
-            include_ifm3=ifm3_flag,
-            **event,
-        )
+    # scenarios that already wrote their estimate are skipped if a previous run died partway
+    manifest = checkpoint.Manifest(f"fire-reversals-{loss_mode}")
+    failed = 0
+    # one report covering every scenario, with a span per scenario, rather than each scenario's
+    # run overwriting the last one's report
+    with profiling.profile_run(f"{flow.name}-{loss_mode}"):
+        for severity_level, salvage_level, ifm3_flag, event in product(
+            severity_levels, salvage_levels, ifm3_flags, EVENTS
+        ):
+            params = {
+                "severity_level": severity_level,
+                "salvage_level": salvage_level,
+                "include_ifm3": ifm3_flag,
+                "loss_mode": loss_mode,
+                **event,
+            }
+            if manifest.is_done(flow.name, event["opr_id"], params):
+                continue
+
+            scenario = f"{event['opr_id']}-{severity_level}-{salvage_level}-ifm3={ifm3_flag}"
+            with profiling.span(scenario):
+                state = profiling.run_flow(flow, **params)
+            if state.is_successful():
+                manifest.record(flow.name, event["opr_id"], params)
+            else:
+                failed += 1
+
+    if failed:
+        print(f"{failed} scenarios failed, rerun to retry them")
+    else:
+        manifest.clear()
+
+
+if __name__ == "__main__":
+    main()
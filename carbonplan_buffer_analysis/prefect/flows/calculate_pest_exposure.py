@@ -0,0 +1,66 @@
+import pandas as pd
+import prefect
+from carbonplan_forest_offsets.data import cat
+
+from carbonplan_buffer_analysis import pests, profiling, project_tables, storage
+from carbonplan_buffer_analysis.prefect.flows.calculate_buffer_contributions import (
+    get_issuance_table,
+)
+from carbonplan_buffer_analysis.prefect.flows.summarize_fire import get_max_loses
+
+
+@prefect.task
+def load_project_tables() -> dict:
+    """Flatten the project database into columnar tables"""
+    return project_tables.flatten_project_db(cat.project_db_json.read())
+
+
+@prefect.task
+def load_pest_scenarios(scenarios_path: str = None) -> dict:
+    """Load pest scenario definitions, defaulting to pests.PEST_SCENARIOS
+
+    Arguments:
+        scenarios_path {str} -- optional json of {name: {hosts, mortality, co_hosts}}, each
+            optionally with hand-checked `co_host_listed` {opr_id: bool}
+    """
+    if scenarios_path is None:
+        return pests.PEST_SCENARIOS
+    return storage.read_json(scenarios_path)
+
+
+@prefect.task
+def calculate_pest_exposure(tables: dict, max_loses: pd.Series, scenarios: dict) -> pd.DataFrame:
+    return pests.calculate_exposure(tables, max_loses, scenarios)
+
+
+@prefect.task
+def save_pest_exposure(exposure: pd.DataFrame) -> None:
+    """Write per project exposure table and per scenario totals"""
+    with profiling.open_file(
+        "gs://carbonplan-buffer-analysis/intermediates/pest-exposure.csv", "w"
+    ) as f:
+        exposure.to_csv(f)
+
+    totals = exposure.drop(columns="host_fraction").groupby("scenario").sum()
+    totals["n_projects"] = exposure.groupby("scenario").size()
+    storage.write_json(
+        "gs://carbonplan-buffer-analysis/outputs/pest-exposure.json",
+        totals.to_dict(orient="index"),
+        indent=2,
+    )
+
+
+with prefect.Flow("calculate-pest-exposure") as flow:
+    scenarios_path = prefect.Parameter("scenarios_path", default=None)
+
+    issuance = get_issuance_table()
+    max_loses = get_max_loses(issuance)
+
+    tables = load_project_tables()
+    scenarios = load_pest_scenarios(scenarios_path)
+
+    exposure = calculate_pest_exposure(tables, max_loses, scenarios)
+    save_pest_exposure(exposure)
+
+if __name__ == "__main__":
+    profiling.run_flow(flow)
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+import prefect
+
+from carbonplan_buffer_analysis import profiling, storage
+
+POOLS = ["ifm-1", "ifm-3"]  # pools every project needs, see project_reversals.load_prefire_biomass
+
+
+@prefect.task
+def load_opdr_carbon_pools() -> pd.DataFrame:
+    """Load OPDR carbon pool time series for all projects
+
+    Returns:
+        pd.DataFrame -- long format table with opr_id, year, pool (e.g., ifm-1) and value (tCO2)
+    """
+    with profiling.open_file(
+        "gs://carbonplan-buffer-analysis/inputs/opdr_carbon_pools.csv", "r"
+    ) as f:
+        pools = pd.read_csv(
+            f,
+            dtype={"opr_id": str, "year": int, "pool": "category", "value": float},
+        )
+    return pools
+
+
+@prefect.task
+def load_event_years(event_years_path: str) -> pd.Series:
+    """Load year each project's carbon pools should be projected to
+
+    Returns:
+        pd.Series -- event year per opr_id
+    """
+    with profiling.open_file(event_years_path, "r") as f:
+        event_years = pd.read_csv(f, dtype={"opr_id": str, "event_year": int})
+    return event_years.set_index("opr_id")["event_year"]
+
+
+def project_pools_forward(pools: pd.DataFrame, event_years: pd.Series) -> pd.DataFrame:
+    """Project every project's carbon pools forward to its event year
+
+    Vectorized version of the per-project approach from `notebooks/pre-fire-biomass.ipynb`:
+    calculate the median annual growth of each pool, then apply that growth n times, where n is
+    the difference between the event year and the year of the last OPDR. Pools with a single
+    reported year are held constant, as is a pool that grew from zero (infinite growth). Use an
+    event year equal to the last OPDR year to keep the last reported values.
+
+    Arguments:
+        pools {pd.DataFrame} -- long format opr_id, year, pool, value table
+        event_years {pd.Series} -- event year per opr_id
+
+    Returns:
+        pd.DataFrame -- projected tCO2 per opr_id (rows) and pool (columns)
+
+    Raises:
+        KeyError -- if a project with an event year has no OPDR rows, or is missing one of POOLS
+    """
+    missing = event_years.index.difference(pools["opr_id"].unique())
+    if len(missing):
+        raise KeyError(f"no OPDR carbon pools for {list(missing)}")
+
+    keys = ["opr_id", "pool"]
+    pools = pools[pools["opr_id"].isin(event_years.index)].sort_values([*keys, "year"])
+    growth = pools.groupby(keys, observed=True)["value"].pct_change()
+    pools = pools.assign(growth=growth.replace([np.inf, -np.inf], np.nan))
+
+    latest = pools.groupby(keys, observed=True).agg(
+        year=("year", "last"), value=("value", "last"), growth=("growth", "median")
+    )
+    nyears = latest.index.get_level_values("opr_id").map(event_years) - latest["year"]
+    projected = ((1 + latest["growth"].fillna(0)) ** nyears * latest["value"]).unstack("pool")
+
+    projected.columns = projected.columns.astype(str)  # pool is categorical
+    incomplete = projected.index[projected.reindex(columns=POOLS).isna().any(axis=1)]
+    if len(incomplete):
+        raise KeyError(f"missing OPDR carbon pools {POOLS} for {list(incomplete)}")
+    return projected.round().astype(int)
+
+
+@prefect.task
+def calculate_prefire_carbon_stocks(pools: pd.DataFrame, event_years: pd.Series) -> dict:
+    projected = project_pools_forward(pools, event_years)
+    projected.index = projected.index.str.lower()  # match adjusted_prefire_carbon_stocks.json
+    return {
+        opr_id: {pool: int(value) for pool, value in row.items()}
+        for opr_id, row in projected.iterrows()
+    }
+
+
+@prefect.task
+def save_prefire_carbon_stocks(carbon_stocks: dict) -> None:
+    storage.write_json(
+        "gs://carbonplan-buffer-analysis/intermediates/prefire_carbon_stocks.json",
+        carbon_stocks,
+        indent=2,
+    )
+
+
+with prefect.Flow("calculate-prefire-biomass") as flow:
+    event_years_path = prefect.Parameter(
+        "event_years_path",
+        default="gs://carbonplan-buffer-analysis/inputs/prefire_event_years.csv",
+    )
+
+    pools = load_opdr_carbon_pools()
+    event_years = load_event_years(event_years_path)
+
+    carbon_stocks = calculate_prefire_carbon_stocks(pools, event_years)
+    save_prefire_carbon_stocks(carbon_stocks)
+
+if __name__ == "__main__":
+    profiling.run_flow(flow)
@@ -0,0 +1,123 @@
+import geopandas
+import numpy as np
+import pandas as pd
+import prefect
+import rasterio
+import xarray
+from carbonplan_forest_offsets.data import cat
+from rasterio.enums import Resampling
+from rasterio.vrt import WarpedVRT
+
+from carbonplan_buffer_analysis import profiling, storage, utils, zonal
+from carbonplan_buffer_analysis.prefect.flows.calculate_tanoak_tmean import open_tmean
+from carbonplan_buffer_analysis.prefect.flows.calculate_tanoak_zonal import LEMMA_TANOAK
+
+PROJECT_CLIMATE = "gs://carbonplan-buffer-analysis/intermediates/project-climate.csv"
+CLIMATE_BLOCK_ROWS = 32
+COVERAGE_SUPERSAMPLE = 10  # coverage fractions to within 1% of a (4 km) PRISM cell
+
+
+@prefect.task
+def load_native_tmean() -> xarray.Dataset:
+    return open_tmean()
+
+
+def get_tmean_grid(tmean: xarray.Dataset) -> zonal.Grid:
+    da = tmean["tmean"].squeeze()
+    return zonal.Grid(
+        transform=da.rio.transform(), height=da.rio.height, width=da.rio.width, crs=da.rio.crs
+    )
+
+
+@prefect.task
+def load_climate_projects(tmean: xarray.Dataset) -> geopandas.GeoDataFrame:
+    """Every registry project, plus manually added tanoak projects, on the PRISM CRS"""
+    opr_ids = [project["opr_id"] for project in cat.project_db_json.read()]
+    tanoak_basal_area = storage.read_json(
+        "gs://carbonplan-buffer-analysis/intermediates/tanoak_basal_area.json"
+    )
+    opr_ids += [opr_id for opr_id in tanoak_basal_area if opr_id not in opr_ids]
+    return utils.load_project_geometries(opr_ids, get_tmean_grid(tmean).crs)
+
+
+@prefect.task
+def load_tanoak_cover(tmean: xarray.Dataset) -> np.ndarray:
+    """Mean LEMMA tanoak basal area within each PRISM cell
+
+    The 30 m raster is averaged onto the PRISM grid through a warped VRT, so it is read
+    window by window rather than reprojected in memory.
+    """
+    storage.configure_gdal()
+    grid = get_tmean_grid(tmean)
+    with rasterio.open(LEMMA_TANOAK) as src, WarpedVRT(
+        src,
+        crs=grid.crs,
+        transform=grid.transform,
+        width=grid.width,
+        height=grid.height,
+        resampling=Resampling.average,
+    ) as vrt:
+        return vrt.read(1, masked=True).astype("float64").filled(0)
+
+
+@prefect.task
+def calculate_project_climate(
+    projects: geopandas.GeoDataFrame, tmean: xarray.Dataset, tanoak_cover: np.ndarray
+) -> pd.DataFrame:
+    """Area weighted mean tmean per project, with and without tanoak weighting
+
+    Returns:
+        pd.DataFrame -- `tmean` (weighted by the fraction of each PRISM cell in the project) and
+            `tmean_tanoak` (additionally weighted by tanoak basal area, nan without tanoak), by
+            opr_id
+    """
+    grid = get_tmean_grid(tmean)
+    values = tmean["tmean"].squeeze().values.astype("float64")
+    n_projects = len(projects)
+    sums, weights, tanoak_sums, tanoak_weights = (np.zeros(n_projects + 1) for _ in range(4))
+
+    for window in grid.intersecting_windows(projects.geometry, CLIMATE_BLOCK_ROWS):
+        rows = slice(window.row_off, window.row_off + window.height)
+        block_sums, block_weights = zonal.coverage_sums(
+            projects.geometry, grid, window, values[rows], supersample=COVERAGE_SUPERSAMPLE
+        )
+        sums += block_sums
+        weights += block_weights
+
+        block_sums, block_weights = zonal.coverage_sums(
+            projects.geometry,
+            grid,
+            window,
+            values[rows],
+            weights=tanoak_cover[rows],
+            supersample=COVERAGE_SUPERSAMPLE,
+        )
+        tanoak_sums += block_sums
+        tanoak_weights += block_weights
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pd.DataFrame(
+            {
+                "tmean": sums[1:] / weights[1:],
+                "tmean_tanoak": tanoak_sums[1:] / tanoak_weights[1:],
+            },
+            index=projects.index,
+        )
+
+
+@prefect.task
+def save_project_climate(climate: pd.DataFrame) -> None:
+    with profiling.open_file(PROJECT_CLIMATE, "w") as f:
+        climate.to_csv(f)
+
+
+with prefect.Flow("calculate-project-climate") as flow:
+    tmean = load_native_tmean()
+    projects = load_climate_projects(tmean)
+    tanoak_cover = load_tanoak_cover(tmean)
+
+    climate = calculate_project_climate(projects, tmean, tanoak_cover)
+    save_project_climate(climate)
+
+if __name__ == "__main__":
+    profiling.run_flow(flow)
@@ -1,35 +1,47 @@
-import json
-
-import fsspec
 import prefect
+from prefect.tasks.control_flow import merge
 
+from carbonplan_buffer_analysis import cluster, profiling, storage
 from carbonplan_buffer_analysis.prefect.tasks import ravg
 
 
 @prefect.task
 def save_ravg_summary(fire_name, ravg_summary):
-    with fsspec.open(
-        f"gs://carbonplan-buffer-analysis/intermediates/ravg/{fire_name}.json", "w"
-    ) as f:
-        json.dump(ravg_summary, f)
+    storage.write_json(
+        f"gs://carbonplan-buffer-analysis/intermediates/ravg/{fire_name}.json", ravg_summary
+    )
 
 
 with prefect.Flow("summarize-ravg") as flow:
 
     fire_name = prefect.Parameter("fire_name")
     opr_id = prefect.Parameter("opr_id")
+    # biomass weighted losses are only meaningful when the RAVG pixels come from the project
+    # itself, so proxy events skip them
+    include_pixel_loss = prefect.Parameter("pixel_loss", default=False)
 
     ravg_data = ravg.load_ravg(fire_name)
-    subset_ravg = ravg.get_ravg_subset(ravg_data, opr_id)
+    aligned_stack = ravg.get_aligned_stack(ravg_data, fire_name, opr_id)
+    subset_ravg = ravg.get_ravg_subset(ravg_data, opr_id, aligned_stack)
     counts = ravg.get_ravg_counts(subset_ravg)
-    ravg_summary = ravg.get_mortality_summary(counts)
+    with prefect.case(include_pixel_loss, True):
+        project_pixel_loss = ravg.get_pixel_loss(subset_ravg, opr_id)
+    pixel_loss = merge(project_pixel_loss)  # None if skipped
+    ravg_summary = ravg.get_mortality_summary(counts, pixel_loss)
     save_ravg_summary(fire_name, ravg_summary)
 
+
+def main():
+    """Summarize RAVG data for each burned project (on one local cluster, if enabled)"""
+    with cluster.local_cluster(flow.name):
+        for params in [
+            {"opr_id": "ACR255", "fire_name": "north-star"},
+            {"opr_id": "CAR1174", "fire_name": "ranch"},
+            {"opr_id": "ACR260", "fire_name": "lionshead", "pixel_loss": True},
+            {"opr_id": "ACR273", "fire_name": "bootleg", "pixel_loss": True},
+        ]:
+            profiling.run_flow(flow, **params)
+
+
 if __name__ == "__main__":
-    for params in [
-        {"opr_id": "ACR255", "fire_name": "north-star"},
-        {"opr_id": "CAR1174", "fire_name": "ranch"},
-        {"opr_id": "ACR260", "fire_name": "lionshead"},
-        {"opr_id": "ACR273", "fire_name": "bootleg"},
-    ]:
-        flow.run(**params)
+    main()
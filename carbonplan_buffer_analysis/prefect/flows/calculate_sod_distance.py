@@ -0,0 +1,74 @@
+import geopandas
+import pandas as pd
+import prefect
+import rasterio
+from rasterio.warp import transform_bounds
+
+from carbonplan_buffer_analysis import profiling, proximity, storage, utils, zonal
+from carbonplan_buffer_analysis.prefect.flows.calculate_burn_probability import (
+    load_registry_geometries,
+)
+from carbonplan_buffer_analysis.prefect.flows.calculate_tanoak_zonal import LEMMA_TANOAK
+
+
+@prefect.task
+def load_positive_detections() -> geopandas.GeoSeries:
+    sod_blitz = utils.load_sod_blitz()
+    return sod_blitz[sod_blitz["is_positive"]].geometry.to_crs(proximity.SOD_DISTANCE_CRS)
+
+
+@prefect.task
+def get_distance_grid(
+    detections: geopandas.GeoSeries, projects: geopandas.GeoDataFrame, resolution: float
+) -> zonal.Grid:
+    """Grid covering the tanoak range (LEMMA extent), every project and every detection"""
+    storage.configure_gdal()
+    with rasterio.open(LEMMA_TANOAK) as src:
+        bounds = [transform_bounds(src.crs, proximity.SOD_DISTANCE_CRS, *src.bounds)]
+    bounds.append(tuple(projects.to_crs(proximity.SOD_DISTANCE_CRS).total_bounds))
+    bounds.append(tuple(detections.total_bounds))
+    minx, miny, maxx, maxy = zip(*bounds)
+    return zonal.Grid.from_bounds(
+        (min(minx), min(miny), max(maxx), max(maxy)), resolution, proximity.SOD_DISTANCE_CRS
+    )
+
+
+@prefect.task
+def build_distance_raster(detections: geopandas.GeoSeries, grid: zonal.Grid) -> str:
+    """Distance to the nearest positive detection, rebuilt only if detections or grid changed"""
+    source_hash = proximity.get_source_hash(detections, grid)
+    if not proximity.is_current(proximity.SOD_DISTANCE_RASTER, source_hash):
+        with profiling.span("distance_transform"):
+            distance = proximity.distance_transform(detections, grid)
+        proximity.write_distance_raster(distance, grid, proximity.SOD_DISTANCE_RASTER, source_hash)
+    return proximity.SOD_DISTANCE_RASTER
+
+
+@prefect.task
+def calculate_project_distances(projects: geopandas.GeoDataFrame, path: str) -> pd.DataFrame:
+    """Minimum, mean and tanoak basal area weighted distance (km) per project"""
+    return proximity.get_distance_stats(projects.geometry, path, weights_path=LEMMA_TANOAK)
+
+
+@prefect.task
+def save_project_distances(distances: pd.DataFrame) -> None:
+    with profiling.open_file(
+        "gs://carbonplan-buffer-analysis/intermediates/sod-distance.csv", "w"
+    ) as f:
+        distances.to_csv(f)
+
+
+with prefect.Flow("calculate-sod-distance") as flow:
+    resolution = prefect.Parameter("resolution", default=proximity.SOD_DISTANCE_RESOLUTION)
+
+    detections = load_positive_detections()
+    projects = load_registry_geometries()
+    grid = get_distance_grid(detections, projects, resolution)
+
+    path = build_distance_raster(detections, grid)
+    distances = calculate_project_distances(projects, path)
+    save_project_distances(distances)
+
+
+if __name__ == "__main__":
+    profiling.run_flow(flow)
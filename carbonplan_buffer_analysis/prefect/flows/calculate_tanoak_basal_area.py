@@ -1,30 +1,14 @@
-import json
-
-import fsspec
 import prefect
 from carbonplan_forest_offsets.data import cat
 
+from carbonplan_buffer_analysis import profiling, project_tables, storage
+
 
-def get_fraction_tanoak(project: dict) -> tuple:
+def get_fraction_tanoak(project: dict) -> float:
     """Generate project level tanoak summaries"""
-    store = []
-    if len(project["assessment_areas"]) == 0:
-        return 0
-
-    for assessment_area in project["assessment_areas"]:
-        tanoak = [x for x in assessment_area["species"] if x["code"] == 631]
-
-        # can be high/low site class -- collapse
-        if len(tanoak) > 0:
-            tanoak_fraction = sum([x["fraction"] for x in tanoak])
-            if assessment_area["code"] == 999:
-                acreage = project["acreage"]
-            else:
-                acreage = assessment_area["acreage"]
-            store.append((tanoak_fraction, acreage / project["acreage"]))
-        else:
-            return 0
-    return round(sum([assess_area[0] * assess_area[1] for assess_area in store]), 3)
+    tables = project_tables.flatten_project_db([project])
+    fractions = project_tables.get_species_fractions(tables, project_tables.TANOAK_SPECIES_CODE)
+    return fractions[project["opr_id"]]
 
 
 def load_recent_projects():
@@ -42,17 +26,6 @@ def load_recent_projects():
     }
 
 
-def summarize_project(project):
-    fraction = get_fraction_tanoak(project)
-    return (
-        project["opr_id"],
-        {
-            "tanoak": fraction,
-            "ifm-1": project["rp_1"]["ifm_1"],
-        },
-    )
-
-
 def load_ea_projects():
     """Load manually assembled list of early action projects
 
@@ -94,9 +67,15 @@ def load_ea_projects():
 @prefect.task
 def summarize_projects() -> dict:
     retro_json = cat.project_db_json.read()
-    summaries = [summarize_project(project) for project in retro_json]
-
-    tanoak_projects = {opr_id: summary for opr_id, summary in summaries if summary["tanoak"] > 0}
+    tables = project_tables.flatten_project_db(retro_json)
+    fractions = project_tables.get_species_fractions(tables, project_tables.TANOAK_SPECIES_CODE)
+
+    tanoak = fractions[fractions > 0]
+    ifm_1 = tables["projects"].loc[tanoak.index, "ifm_1"]
+    tanoak_projects = {
+        opr_id: {"tanoak": fraction, "ifm-1": biomass}
+        for opr_id, fraction, biomass in zip(tanoak.index, tanoak.tolist(), ifm_1.tolist())
+    }
 
     recent_projects = load_recent_projects()
 
@@ -112,12 +91,16 @@ def save_tanoak_projects(tanoak_projects):
 
     Motivated by difficulties with prefect Results
     """
-    with fsspec.open(
-        "gs://carbonplan-buffer-analysis/intermediates/tanoak_basal_area.json", "w"
-    ) as f:
-        json.dump(tanoak_projects, f, indent=2)
+    storage.write_json(
+        "gs://carbonplan-buffer-analysis/intermediates/tanoak_basal_area.json",
+        tanoak_projects,
+        indent=2,
+    )
 
 
 with prefect.Flow("tanoak-summaries") as flow:
     tanoak_projects = summarize_projects()
     save_tanoak_projects(tanoak_projects)
+
+if __name__ == "__main__":
+    profiling.run_flow(flow)
@@ -1,65 +1,126 @@
-import json
-
-import fsspec
+import dask
+import numpy as np
 import prefect
+import rasterio
 import rioxarray  # noqa
 import xarray
+from rasterio.enums import Resampling
+from rasterio.vrt import WarpedVRT
+from rasterio.warp import calculate_default_transform, reproject
+from rasterio.windows import Window
 
+from carbonplan_buffer_analysis import cluster, profiling, storage, zonal
+from carbonplan_buffer_analysis.prefect.flows.calculate_tanoak_zonal import LEMMA_TANOAK
+
+TANOAK_BLOCK_ROWS = 256  # full width rows of a 30 m grid spanning CA/OR/WA
+TMEAN_CRS = "epsg:4326"
+PRISM_TMEAN = "https://carbonplan-forests.s3.us-west-2.amazonaws.com/offsets/archive/inputs/prism/conus_tmean.nc"  # noqa
 
-@prefect.task
-def load_tmean():
 
-    with fsspec.open(
-        "https://carbonplan-forests.s3.us-west-2.amazonaws.com/offsets/archive/inputs/prism/conus_tmean.nc"  # noqa
-    ) as f:
-        ds = xarray.open_dataset(f)
+def open_tmean() -> xarray.Dataset:
+    """PRISM tmean on its native grid"""
+    with storage.open_large(PRISM_TMEAN) as f:
+        ds = xarray.open_dataset(f).load()
 
-    ds = ds.rename({"__xarray_dataarray_variable__": "tmean"})
+    return ds.rename({"__xarray_dataarray_variable__": "tmean"})
 
-    ds = ds.rio.reproject("epsg:4326")
+
+@prefect.task
+def load_tmean():
+    ds = open_tmean()
+    ds = ds.rio.reproject(TMEAN_CRS)
     return ds
 
 
 @prefect.task
-def load_tanoak_lemma():
-    """Load 30m resolution tanoak data, sourced from Lemma"""
-    tanoak = xarray.open_rasterio("gs://carbonplan-buffer-analysis/inputs/lide3_ba_2017.tif")
-    tanoak = tanoak.rio.reproject("epsg:4326")
-    return tanoak
+def load_tanoak_grid() -> zonal.Grid:
+    """Grid of the 30m tanoak data (sourced from Lemma), reprojected to EPSG:4326
+
+    Same grid as `rio.reproject("epsg:4326")` of the full raster, without reading it.
+    """
+    storage.configure_gdal()
+    with rasterio.open(LEMMA_TANOAK) as src:
+        transform, width, height = calculate_default_transform(
+            src.crs, TMEAN_CRS, src.width, src.height, *src.bounds
+        )
+    return zonal.Grid(transform=transform, height=height, width=width, crs=TMEAN_CRS)
+
+
+def sample_tanoak_tmean(tmean: xarray.DataArray, grid: zonal.Grid, window: Window) -> np.ndarray:
+    """tmean of every tanoak (basal area > 0) pixel in one window of the tanoak grid
+
+    Both rasters are resampled (nearest) onto the window, as `reproject_match` would for the
+    full grid. tmean should already be float32, so blocks don't each make their own copy.
+    """
+    storage.configure_gdal()  # set on the worker, when running on a cluster
+    shape = (int(window.height), int(window.width))
+    transform = grid.window_transform(window)
+    with rasterio.open(LEMMA_TANOAK) as src, WarpedVRT(
+        src,
+        crs=grid.crs,
+        transform=grid.transform,
+        width=grid.width,
+        height=grid.height,
+        resampling=Resampling.nearest,
+    ) as vrt:
+        tanoak = vrt.read(1, window=window)
+
+    tmean_block = np.full(shape, np.nan, dtype="float32")
+    reproject(
+        tmean.values,
+        tmean_block,
+        src_transform=tmean.rio.transform(),
+        src_crs=tmean.rio.crs,
+        src_nodata=np.nan,
+        dst_transform=transform,
+        dst_crs=grid.crs,
+        dst_nodata=np.nan,
+        resampling=Resampling.nearest,
+    )
+    values = tmean_block[tanoak > 0]
+    return values[~np.isnan(values)]
 
 
 @prefect.task
-def reproject_tmean(tmean, tanoak):
-    """Align tmean and tanoak biomass data
+def reproject_tmean(tmean: xarray.Dataset, grid: zonal.Grid) -> np.ndarray:
+    """tmean across the tanoak range, one delayed task per block of tanoak grid rows
 
-    This doesn't currently use chunking and requires a big machine
+    Memory use is bounded by the block size, and blocks run in parallel on dask's scheduler (or
+    a local cluster, see `cluster.py`) rather than requiring one big machine.
     """
-    tanoak_tmean = tmean.rio.reproject_match(tanoak)
-    tanoak_tmean = tanoak_tmean.where(
-        tanoak > 0
-    )  # casting brings tmean into memory -- use a big machine!
-    return tanoak_tmean
+    profiling.record_pixels(grid.height * grid.width)
+    # cast once, then shared by (not copied into) every block's task
+    tmean = dask.delayed(tmean["tmean"].squeeze(drop=True).astype("float32"))
+    blocks = [
+        dask.delayed(sample_tanoak_tmean)(tmean, grid, window)
+        for window in grid.windows(TANOAK_BLOCK_ROWS)
+    ]
+    with profiling.span("tanoak_tmean_blocks"):
+        return np.concatenate(dask.compute(*blocks))
 
 
 @prefect.task
-def summarize_tanoak_tmean(tanoak_tmean):
+def summarize_tanoak_tmean(tanoak_tmean: np.ndarray):
     """calculate IQR and median tmean across tanoak range"""
     breaks = [0.25, 0.5, 0.75]
-    return {k: v for k, v in zip(breaks, tanoak_tmean["tmean"].quantile(breaks).values)}
+    return {k: float(v) for k, v in zip(breaks, np.quantile(tanoak_tmean, breaks))}
 
 
 @prefect.task
 def save_tanoak_tmean(data):
-    with fsspec.open(
-        "gs://carbonplan-buffer-analysis/intermediates/tanoak-tmean-quantiles.json", "w"
-    ) as f:
-        json.dump(data, f, indent=2)
+    storage.write_json(
+        "gs://carbonplan-buffer-analysis/intermediates/tanoak-tmean-quantiles.json", data, indent=2
+    )
 
 
 with prefect.Flow("tanoak-climate-tmean") as flow:
     tmean = load_tmean()
-    tanoak = load_tanoak_lemma()
+    grid = load_tanoak_grid()
 
-    tanoak_tmean = reproject_tmean(tmean, tanoak)
+    tanoak_tmean = reproject_tmean(tmean, grid)
     summary = summarize_tanoak_tmean(tanoak_tmean)
     save_tanoak_tmean(summary)
+
+if __name__ == "__main__":
+    with cluster.local_cluster(flow.name):
+        profiling.run_flow(flow)
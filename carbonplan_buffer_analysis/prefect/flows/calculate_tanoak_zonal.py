@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import prefect
+import rasterio
+from carbonplan_forest_offsets.data import cat
+
+from carbonplan_buffer_analysis import profiling, project_tables, storage, utils, zonal
+
+LEMMA_TANOAK = "gs://carbonplan-buffer-analysis/inputs/lide3_ba_2017.tif"
+LEMMA_BLOCK_ROWS = 256  # 30 m rows span all of CA/OR/WA, keep blocks small
+
+
+@prefect.task
+def load_registry() -> dict:
+    """Registry project records, both as tables and as geometries"""
+    storage.configure_gdal()
+    projects = cat.project_db_json.read()
+    tables = project_tables.flatten_project_db(projects)
+    with rasterio.open(LEMMA_TANOAK) as src:
+        crs = src.crs.to_wkt()
+    geometries = utils.load_project_geometries(tables["projects"].index.tolist(), crs)
+    return {"tables": tables, "geometries": geometries}
+
+
+def summarize_zones(
+    sums: np.ndarray, tanoak_pixels: np.ndarray, pixels: np.ndarray, pixel_area: float
+) -> pd.DataFrame:
+    """Per label basal area statistics from accumulated zonal sums (background label dropped)"""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pd.DataFrame(
+            {
+                "pixels": pixels[1:].astype(int),
+                "tanoak_fraction": tanoak_pixels[1:] / pixels[1:],
+                "ba_mean": sums[1:] / pixels[1:],
+                "ba_total": sums[1:] * pixel_area,
+            }
+        )
+
+
+@prefect.task
+def calculate_tanoak_zonal_stats(registry: dict) -> pd.DataFrame:
+    """Tanoak basal area inside every project polygon, from the 30 m LEMMA raster
+
+    Projects are rasterized once onto the LEMMA grid (no reprojection of the raster) and basal
+    area is reduced by project one block of rows at a time, only reading blocks that intersect a
+    project. `ba_mean` is in the raster's units per pixel area and `ba_total` integrates it over
+    pixel area; `tanoak_fraction` is the fraction of project pixels with any tanoak.
+
+    Returns:
+        pd.DataFrame -- zonal statistics by opr_id, with the documented tanoak fraction (from
+            project species tables) alongside for comparison
+    """
+    geometries = registry["geometries"].geometry
+    n_projects = len(geometries)
+    sums, tanoak_pixels, pixels = (np.zeros(n_projects + 1) for _ in range(3))
+
+    with rasterio.open(LEMMA_TANOAK) as src:
+        grid = zonal.Grid.from_raster(src)
+        for window in grid.intersecting_windows(geometries, LEMMA_BLOCK_ROWS):
+            with profiling.span("lemma_block"):
+                ba = src.read(1, window=window, masked=True).astype("float32").filled(np.nan)
+                labels = zonal.rasterize_labels(geometries, grid, window)
+
+                block_sums, block_pixels = zonal.zonal_sums(labels, ba, n_projects)
+                sums += block_sums
+                pixels += block_pixels
+                tanoak = np.where(np.isnan(ba), np.nan, ba > 0)
+                tanoak_pixels += zonal.zonal_sums(labels, tanoak, n_projects)[0]
+                profiling.record_pixels(ba.size)
+
+    stats = summarize_zones(sums, tanoak_pixels, pixels, abs(grid.transform.a * grid.transform.e))
+    stats.index = geometries.index
+    stats["documented_fraction"] = project_tables.get_species_fractions(
+        registry["tables"], project_tables.TANOAK_SPECIES_CODE
+    )
+    return stats
+
+
+@prefect.task
+def save_tanoak_zonal_stats(stats: pd.DataFrame) -> None:
+    with profiling.open_file(
+        "gs://carbonplan-buffer-analysis/intermediates/tanoak-lemma-zonal.csv", "w"
+    ) as f:
+        stats.to_csv(f)
+
+
+with prefect.Flow("tanoak-lemma-zonal") as flow:
+    registry = load_registry()
+    stats = calculate_tanoak_zonal_stats(registry)
+    save_tanoak_zonal_stats(stats)
+
+if __name__ == "__main__":
+    profiling.run_flow(flow)
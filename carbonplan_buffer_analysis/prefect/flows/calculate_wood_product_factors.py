@@ -0,0 +1,84 @@
+import pandas as pd
+import prefect
+
+from carbonplan_buffer_analysis import profiling, storage
+
+FRAC_MERCH_QUANTILES = [0.5, 0.75, 0.9, 1.0]
+
+
+@prefect.task
+def load_baseline_wood_products() -> pd.DataFrame:
+    """Load baseline wood product inputs transcribed from project documentation
+
+    Returns:
+        pd.DataFrame -- one row per project with dtm (delivered to mill), in_use and landfill
+            (tCO2 stored in 100-year wood products), and harvested_live/harvested_merch (tCO2)
+    """
+    with profiling.open_file(
+        "gs://carbonplan-buffer-analysis/inputs/baseline_wood_products.csv", "r"
+    ) as f:
+        df = pd.read_csv(
+            f,
+            dtype={
+                "opr_id": str,
+                "dtm": float,
+                "in_use": float,
+                "landfill": float,
+                "harvested_live": float,
+                "harvested_merch": float,
+            },
+        )
+    return df.set_index("opr_id")
+
+
+def calculate_storage_factors(baseline: pd.DataFrame) -> pd.DataFrame:
+    """Landfill, in-use and merchantable fractions for every project
+
+    Vectorized version of `BaselineWoodProducts.get_summary` from
+    `notebooks/salvaged-wood-products.ipynb`.
+    """
+    return pd.DataFrame(
+        {
+            "lf_frac": baseline["landfill"] / baseline["dtm"],
+            "inuse_frac": baseline["in_use"] / baseline["dtm"],
+            "frac_merch": baseline["harvested_merch"] / baseline["harvested_live"],
+        }
+    ).round(4)
+
+
+@prefect.task
+def get_storage_factors(baseline: pd.DataFrame) -> pd.DataFrame:
+    return calculate_storage_factors(baseline)
+
+
+@prefect.task
+def get_frac_merch_quantiles(storage_factors: pd.DataFrame) -> dict:
+    """Registry level quantiles of merchantable fraction, used by high salvage scenarios"""
+    quantiles = storage_factors["frac_merch"].quantile(FRAC_MERCH_QUANTILES)
+    return {str(q): round(v, 4) for q, v in quantiles.items()}
+
+
+@prefect.task
+def save_storage_factors(storage_factors: pd.DataFrame, frac_merch_quantiles: dict) -> None:
+    records = storage_factors.rename(index=str.lower).to_dict(orient="index")
+    storage.write_json(
+        "gs://carbonplan-buffer-analysis/intermediates/wood_product_storage_factors.json",
+        records,
+        indent=2,
+    )
+
+    storage.write_json(
+        "gs://carbonplan-buffer-analysis/intermediates/frac_merch_quantiles.json",
+        frac_merch_quantiles,
+        indent=2,
+    )
+
+
+with prefect.Flow("calculate-wood-product-factors") as flow:
+    baseline = load_baseline_wood_products()
+    storage_factors = get_storage_factors(baseline)
+    frac_merch_quantiles = get_frac_merch_quantiles(storage_factors)
+    save_storage_factors(storage_factors, frac_merch_quantiles)
+
+if __name__ == "__main__":
+    profiling.run_flow(flow)
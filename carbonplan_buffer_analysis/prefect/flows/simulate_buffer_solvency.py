@@ -0,0 +1,76 @@
+import pandas as pd
+import prefect
+
+from carbonplan_buffer_analysis import profiling, project_tables, solvency, storage
+from carbonplan_buffer_analysis.prefect.flows.calculate_buffer_contributions import (
+    calculate_gross_buffer,
+    get_issuance_table,
+    get_project_issuance,
+)
+
+
+@prefect.task
+def load_burn_probability() -> dict:
+    """Annual burn probability per project, from the calculate-burn-probability flow"""
+    return storage.read_json("gs://carbonplan-buffer-analysis/outputs/burn-probability.json")
+
+
+@prefect.task
+def simulate_solvency(
+    project_issuance: pd.Series,
+    burn_probability: dict,
+    gross_buffer: float,
+    n_years: int,
+    n_trajectories: int,
+    seed: int,
+) -> dict:
+    """Simulate buffer pool depletion from fire losses
+
+    Projects without an empirical burn probability get the registry median.
+    """
+    projects = project_tables.make_project_table(
+        issuance=project_issuance, burn_probability=burn_probability
+    )
+    projects = projects[projects["issuance"].notna()]
+    credits = projects["issuance"]
+    probabilities = projects["burn_probability"].fillna(projects["burn_probability"].median())
+
+    simulation = solvency.simulate_pool(
+        credits.to_numpy(),
+        probabilities.to_numpy(),
+        gross_buffer,
+        n_years=n_years,
+        n_trajectories=n_trajectories,
+        seed=seed,
+    )
+    profiling.record_pixels(n_trajectories * n_years * len(credits))
+    summary = solvency.summarize_simulation(simulation)
+    summary.update({"n_years": n_years, "n_trajectories": n_trajectories, "seed": seed})
+    return summary
+
+
+@prefect.task
+def save_solvency_summary(summary: dict) -> None:
+    storage.write_json(
+        "gs://carbonplan-buffer-analysis/outputs/buffer-solvency.json", summary, indent=2
+    )
+
+
+with prefect.Flow("simulate-buffer-solvency") as flow:
+    n_years = prefect.Parameter("n_years", default=100)
+    n_trajectories = prefect.Parameter("n_trajectories", default=10_000)
+    seed = prefect.Parameter("seed", default=0)
+
+    issuance_df = get_issuance_table()
+    project_issuance = get_project_issuance(issuance_df)
+    gross_buffer = calculate_gross_buffer(issuance_df)
+    burn_probability = load_burn_probability()
+
+    summary = simulate_solvency(
+        project_issuance, burn_probability, gross_buffer, n_years, n_trajectories, seed
+    )
+    save_solvency_summary(summary)
+
+
+if __name__ == "__main__":
+    profiling.run_flow(flow)
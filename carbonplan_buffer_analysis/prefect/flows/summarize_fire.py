@@ -1,9 +1,7 @@
-import json
-
-import fsspec
 import pandas as pd
 import prefect
 
+from carbonplan_buffer_analysis import profiling, project_tables, storage
 from carbonplan_buffer_analysis.prefect.flows.calculate_buffer_contributions import (
     get_issuance_table,
 )
@@ -20,21 +18,18 @@ def get_known_reversals() -> float:
 
 @prefect.task
 def load_reversal_summaries():
-    fs = fsspec.filesystem("gs")
-    fnames = fs.glob("carbonplan-buffer-analysis/outputs/reversals/*")
-    store = []
-    for fname in fnames:
-        with fsspec.open(f"gs://{fname}") as f:
-            data = json.load(f)
-            store.append(data)
-    reversals = pd.DataFrame(store)
+    records = storage.read_json_glob("gs://carbonplan-buffer-analysis/outputs/reversals/*")
+    reversals = pd.DataFrame(list(records.values()))
+    reversals["opr_id"] = reversals["opr_id"].astype("category")
+    reversals["includes_ifm_3"] = project_tables.to_bool(reversals["includes_ifm_3"])
     return reversals
 
 
 @prefect.task
-def get_max_loses(issuance: pd.DataFrame) -> dict:
+def get_max_loses(issuance: pd.DataFrame) -> pd.Series:
     """sum of allocated arbocs on a per project basis, as of analysis cutoff date"""
-    return issuance.groupby("opr_id").allocation.sum().to_dict()
+    max_loss = issuance.groupby("opr_id").allocation.sum()
+    return project_tables.make_project_table(max_loss=max_loss)["max_loss"]
 
 
 @prefect.task
@@ -44,7 +39,7 @@ def summarize_committed_loses(reversals, max_loses):
     Losses cannot exceed credit issuance
     """
     reversals.loc[:, "estimated_loss"] = reversals["biomass_loss"] - reversals["salvage_wp"]
-    reversals["max_loss"] = reversals["opr_id"].map(max_loses)
+    reversals["max_loss"] = reversals["opr_id"].map(max_loses).astype(float)
     reversals.loc[
         reversals["max_loss"] < reversals["estimated_loss"], "estimated_loss"
     ] = reversals["max_loss"]
@@ -63,8 +58,7 @@ def summarize_reversals(committed_summary):
         "minimum": committed_summary.min() + known_reversals,
         "maximum": committed_summary.max() + known_reversals,
     }
-    with fsspec.open("gs://carbonplan-buffer-analysis/outputs/fire-summary.json", "w") as f:
-        json.dump(d, f)
+    storage.write_json("gs://carbonplan-buffer-analysis/outputs/fire-summary.json", d)
 
 
 with prefect.Flow("summarize-fire-reversals") as flow:
@@ -74,3 +68,6 @@ with prefect.Flow("summarize-fire-reversals") as flow:
 
     committed_summary = summarize_committed_loses(reversals, max_loses)
     summarize_reversals(committed_summary)
+
+if __name__ == "__main__":
+    profiling.run_flow(flow)
@@ -1,125 +1,113 @@
-import json
-
-import fsspec
 import pandas as pd
 import prefect
-import xarray
 
-from carbonplan_buffer_analysis import utils
+from carbonplan_buffer_analysis import pests, profiling, project_tables, storage
 from carbonplan_buffer_analysis.prefect.flows.calculate_buffer_contributions import (
     get_issuance_table,
 )
-from carbonplan_buffer_analysis.prefect.flows.calculate_tanoak_tmean import load_tmean
+from carbonplan_buffer_analysis.prefect.flows.calculate_project_climate import PROJECT_CLIMATE
 
-TANOAK_BIOMASS_LOSS = {"minimum": 0.5, "maximum": 0.8}
+TANOAK_BIOMASS_LOSS = pests.PEST_SCENARIOS["sudden-oak-death"]["mortality"]
+TMEAN_COLUMNS = ["tmean", "tmean_tanoak"]  # see calculate_project_climate
 
 
 def load_bay_presence_absence() -> dict:
     """manually assembled k:v of if tanoak projects have California bay laurel
-    listed in project documentation
+    listed in project documentation, shared with the pest exposure scenarios
     """
-    bay_listed = {
-        "ACR262": True,
-        "CAR1190": True,
-        "CAR1180": True,
-        "ACR200": True,
-        "ACR182": True,
-        "CAR1104": False,
-        "CAR1191": True,
-        "ACR189": False,
-        "CAR1102": True,
-        "CAR993": True,
-        "ACR378": True,
-        "ACR377": True,
-        "CAR1174": True,
-        "ACR282": True,
-        "CAR1103": True,
-        "CAR1313": True,
-        "CAR1329": True,
-        "CAR1330": True,
-        "CAR1339": True,
-        "CAR1368": False,
-    }
-    return bay_listed
+    return pests.BAY_LAUREL_LISTED
 
 
 @prefect.task
 def load_tanoak_basal_area():
-    with fsspec.open("gs://carbonplan-buffer-analysis/intermediates/tanoak_basal_area.json") as f:
-        basal_area = json.load(f)
+    basal_area = storage.read_json(
+        "gs://carbonplan-buffer-analysis/intermediates/tanoak_basal_area.json"
+    )
 
     return basal_area
 
 
 @prefect.task
-def get_tanoak_biomass(d: dict) -> float:
-    """input tanoak records, output total biomass"""
-    return {k: v["tanoak"] * v["ifm-1"] for k, v in d.items()}
-
-
-def get_project_centroid(gdf):
-    c = gdf.to_crs("epsg:5070").centroid.to_crs("epsg:4326").item().coords.xy
-    return (c[0][0], c[1][0])
+def get_tanoak_biomass(d: dict) -> pd.Series:
+    """input tanoak records, output total biomass by opr_id"""
+    biomass = {k: v["tanoak"] * v["ifm-1"] for k, v in d.items()}
+    return project_tables.make_project_table(biomass=biomass)["biomass"]
 
 
 @prefect.task
-def load_project_tmeans(tanoak_biomass: dict, tmean: xarray.Dataset):
-    """get per project tmean data"""
-    project_tmean = {}
-    for opr_id in tanoak_biomass.keys():
-        geom = utils.load_project_geometry(opr_id)
-        x, y = get_project_centroid(geom)
-        project_tmean[opr_id] = tmean["tmean"].sel(x=x, y=y, method="nearest").values[0]
-    return project_tmean
+def load_project_tmeans(tanoak_biomass: pd.Series, column: str = "tmean") -> pd.Series:
+    """get per project tmean data, from the calculate-project-climate flow
 
+    Arguments:
+        tanoak_biomass {pd.Series} -- tanoak biomass by opr_id, tmean is loaded for each project
+        column {str} -- `tmean` (area weighted) or `tmean_tanoak` (also weighted by tanoak basal
+            area). Projects without LEMMA tanoak have no `tmean_tanoak` and use `tmean` instead
 
-def estimate_biomass_loss(biomass, max_loss):
-    return {k: min(max_loss, v * biomass) for k, v in TANOAK_BIOMASS_LOSS.items()}
+    Returns:
+        pd.Series -- tmean by opr_id, named `tmean` whichever column it came from
+    """
+    if column not in TMEAN_COLUMNS:
+        raise ValueError(f"tmean column must be one of {TMEAN_COLUMNS}, got {column}")
+    with profiling.open_file(PROJECT_CLIMATE, "r") as f:
+        climate = pd.read_csv(f, index_col="opr_id")
+    climate.index = climate.index.astype(str)
+
+    opr_ids = tanoak_biomass.index.astype(str)
+    missing = opr_ids.difference(climate.index)
+    if len(missing):
+        raise KeyError(f"no project climate for {list(missing)}")
+    climate = climate.reindex(opr_ids)
+    return climate[column].fillna(climate["tmean"]).rename("tmean")
 
 
 @prefect.task
-def get_max_loses(issuance: pd.DataFrame) -> dict:
+def get_max_loses(issuance: pd.DataFrame) -> pd.Series:
     """sum of allocated arbocs on a per project basis, as of analysis cutoff date"""
-    return issuance.groupby("opr_id").allocation.sum().to_dict()
+    max_loss = issuance.groupby("opr_id").allocation.sum()
+    return project_tables.make_project_table(max_loss=max_loss)["max_loss"]
 
 
 @prefect.task
-def subset_tmean(tanoak_biomass, project_tmeans):
-    median_temp = load_tanoak_median_temp()
-
-    subset = {
-        opr_id: biomass
-        for opr_id, biomass in tanoak_biomass.items()
-        if project_tmeans[opr_id] < median_temp
-    }
-    return subset
+def get_tanoak_projects(
+    tanoak_biomass: pd.Series, project_tmeans: pd.Series, max_loses: pd.Series
+) -> pd.DataFrame:
+    """Tanoak biomass, climate, bay presence and issuance of every tanoak project"""
+    projects = project_tables.make_project_table(
+        biomass=tanoak_biomass,
+        tmean=project_tmeans,
+        has_bay=load_bay_presence_absence(),
+        max_loss=max_loses,
+    )
+    return projects[projects["biomass"].notna()]
 
 
 @prefect.task
-def subest_bay(tanoak_biomass):
-    has_bay = load_bay_presence_absence()
-    subset = {opr_id: biomass for opr_id, biomass in tanoak_biomass.items() if has_bay[opr_id]}
-    return subset
+def subset_tmean(tanoak_projects: pd.DataFrame) -> pd.DataFrame:
+    """projects cooler than the median tmean of the tanoak range (tmean_column of the flow)"""
+    median_temp = load_tanoak_median_temp()
+    return tanoak_projects[tanoak_projects["tmean"] < median_temp]
 
 
 @prefect.task
-def summarize_tanoak_exposure(tanoak_biomass, max_loses):
-    def clean_to_write(data: dict):
-        return pd.DataFrame(data).sum(axis=1).to_dict()
+def subest_bay(tanoak_projects: pd.DataFrame) -> pd.DataFrame:
+    if tanoak_projects["has_bay"].isna().any():
+        missing = tanoak_projects.index[tanoak_projects["has_bay"].isna()]
+        raise KeyError(f"no bay laurel presence/absence for {list(missing)}")
+    return tanoak_projects[tanoak_projects["has_bay"].astype(bool)]
 
-    loses = {
-        opr_id: estimate_biomass_loss(biomass, max_loses[opr_id])
-        for opr_id, biomass in tanoak_biomass.items()
-    }
-    to_write = clean_to_write(loses)
-    return to_write
+
+@prefect.task
+def summarize_tanoak_exposure(tanoak_projects: pd.DataFrame) -> dict:
+    loses = pests.cap_losses(
+        tanoak_projects["biomass"], tanoak_projects["max_loss"], TANOAK_BIOMASS_LOSS
+    )
+    return loses.sum().to_dict()
 
 
 def load_tanoak_median_temp():
-    with fsspec.open(
+    return storage.read_json(
         "gs://carbonplan-buffer-analysis/intermediates/tanoak-tmean-quantiles.json"
-    ) as f:
-        return json.load(f)["0.5"]
+    )["0.5"]
 
 
 @prefect.task
@@ -129,26 +117,30 @@ def summarize_exposure(total_exposure, bay_expsoure, tmean_exposure):
         "tmean": tmean_exposure,
         "total": total_exposure,
     }
-    with fsspec.open("gs://carbonplan-buffer-analysis/outputs/tanoak-summary.json", "w") as f:
-        json.dump(d, f)
+    storage.write_json("gs://carbonplan-buffer-analysis/outputs/tanoak-summary.json", d)
 
 
 with prefect.Flow("summarize-tanoak-potential-reversals") as flow:
+    # compare projects' area weighted tmean to the tanoak median, or tmean over their tanoak
+    tmean_column = prefect.Parameter("tmean_column", default="tmean")
+
     issuance = get_issuance_table()
     max_loses = get_max_loses(issuance)
 
     tanoak_basal_area = load_tanoak_basal_area()
     tanoak_biomass = get_tanoak_biomass(tanoak_basal_area)
+    project_tmeans = load_project_tmeans(tanoak_biomass, tmean_column)
+    tanoak_projects = get_tanoak_projects(tanoak_biomass, project_tmeans, max_loses)
 
-    total_exposure = summarize_tanoak_exposure(tanoak_biomass, max_loses)
+    total_exposure = summarize_tanoak_exposure(tanoak_projects)
 
-    bay_subset = subest_bay(tanoak_biomass)
-    bay_exposure = summarize_tanoak_exposure(bay_subset, max_loses)
+    bay_subset = subest_bay(tanoak_projects)
+    bay_exposure = summarize_tanoak_exposure(bay_subset)
 
-    tmean = load_tmean()
-    project_tmeans = load_project_tmeans(tanoak_biomass, tmean)
-
-    tmean_subset = subset_tmean(tanoak_biomass, project_tmeans)
-    tmean_exposure = summarize_tanoak_exposure(tmean_subset, max_loses)
+    tmean_subset = subset_tmean(tanoak_projects)
+    tmean_exposure = summarize_tanoak_exposure(tmean_subset)
 
     summarize_exposure(total_exposure, bay_exposure, tmean_exposure)
+
+if __name__ == "__main__":
+    profiling.run_flow(flow)
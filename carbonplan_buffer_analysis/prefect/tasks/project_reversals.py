@@ -1,58 +1,113 @@
 import datetime
-import json
 
 import fsspec
 import geopandas
 import numpy as np
 import pandas as pd
 import prefect
+import pyogrio
 from carbonplan_forest_offsets.load.geometry import load_project_geometry
 from carbonplan_forest_offsets.load.project_db import load_project_data
+from prefect.engine.cache_validators import all_inputs
+from rasterio.warp import transform_bounds
+
+from carbonplan_buffer_analysis import profiling, storage, utils
 
 CRS = "+proj=aea +lat_0=23 +lon_0=-96 +lat_1=29.5 +lat_2=45.5 +x_0=0 +y_0=0 +ellps=WGS84 +towgs84=0,0,0,0,0,0,0 +units=m +no_defs +type=crs"  # noqa
 M2_TO_ACRE = 4046.86
 SALVAGE_FRACTIONS = {"low": 0.1, "mid": 0.2, "high": 0.3}
+PREFIRE_BIOMASS_SOURCES = [
+    # hand-checked stocks from notebooks/pre-fire-biomass.ipynb take precedence
+    "gs://carbonplan-buffer-analysis/inputs/adjusted_prefire_carbon_stocks.json",
+    # registry wide projections from the calculate-prefire-biomass flow
+    "gs://carbonplan-buffer-analysis/intermediates/prefire_carbon_stocks.json",
+]
+WOOD_PRODUCT_SOURCES = [
+    # hand-checked factors from notebooks/salvaged-wood-products.ipynb take precedence
+    "gs://carbonplan-buffer-analysis/inputs/wood_product_storage_factors.json",
+    # registry wide factors from the calculate-wood-product-factors flow
+    "gs://carbonplan-buffer-analysis/intermediates/wood_product_storage_factors.json",
+]
+# registry quantile of frac_merch used in place of the project's own value, by salvage level
+SALVAGE_FRAC_MERCH_QUANTILE = {"mid": "1.0", "high": "1.0"}
+FRAC_MERCH_QUANTILES_PATH = (
+    "gs://carbonplan-buffer-analysis/intermediates/frac_merch_quantiles.json"
+)
+# frac_merch used above low salvage before registry quantiles, the max of the four original
+# projects (notebooks/salvaged-wood-products.ipynb). Used if the quantiles haven't been computed.
+FALLBACK_FRAC_MERCH = 0.645
+NIFC_PERIMETERS = "gs://carbonplan-buffer-analysis/inputs/nifc_perimeters_2020_2021.geojson"
+NIFC_YEARS = [2020, 2021]
+MTBS_PERIMETERS = "gs://carbonplan-buffer-analysis/inputs/mtbs_perimeters_2019.json"
+
+
+def read_perimeters(
+    urlpath: str, bbox: tuple = None, where: str = None, columns: list = None
+) -> geopandas.GeoDataFrame:
+    """Read a perimeter file, filtering features as they are parsed
 
+    Arguments:
+        urlpath {str} -- perimeter file (GeoJSON or anything else GDAL reads)
+        bbox {tuple} -- (minx, miny, maxx, maxy) in CRS, only features intersecting it are read
+        where {str} -- OGR SQL attribute filter
+        columns {list} -- attribute columns to read
 
-def load_nifc_fires():
+    Returns:
+        geopandas.GeoDataFrame -- features in the file's CRS, indexed by feature id (so ids don't
+            depend on the filters)
+    """
+    path = str(utils.get_local_copy(urlpath))
+    if bbox is not None:
+        file_crs = pyogrio.read_info(path)["crs"]
+        bbox = transform_bounds(CRS, file_crs, *bbox)
+    return pyogrio.read_dataframe(path, bbox=bbox, where=where, columns=columns, fid_as_index=True)
+
+
+def load_nifc_fires(bbox: tuple = None, years: list = NIFC_YEARS, urlpath: str = NIFC_PERIMETERS):
     """load nifc data for 2020/2021 fire season
 
     NB this is a bit of an undocumented NIFC feature -- the data supposedly only cover 2021
     but there are definitely 2020 fires included at the endpoint.
     This might not be true in the future.
 
+    Pass the full history file as `urlpath` (and the years of interest) to load other seasons,
+    the bbox and year filters are applied as features are read.
+
     https://data-nifc.opendata.arcgis.com/datasets/
     nifc::wfigs-wildland-fire-perimeters-full-history/about
     """
-    with fsspec.open(
-        'gs://carbonplan-buffer-analysis/inputs/nifc_perimeters_2020_2021.geojson'
-    ) as f:
-        fires = geopandas.read_file(f)
+    discovered = "irwin_FireDiscoveryDateTime"
+    fires = read_perimeters(
+        urlpath,
+        bbox=bbox,
+        where=f"{discovered} >= '{min(years)}-01-01' AND {discovered} < '{max(years) + 1}-01-01'",
+        columns=["poly_IncidentName", "poly_Acres_AutoCalc", discovered],
+    )
 
     nifc_colnames = {"poly_IncidentName": "name", "poly_Acres_AutoCalc": "acres"}
     fires = fires.rename(columns=nifc_colnames)
 
-    fires = fires[fires["irwin_FireDiscoveryDateTime"].str[:4].isin(["2020", "2021"])]
+    fires = fires[fires[discovered].astype(str).str[:4].isin([str(year) for year in years])]
 
     fires["ignite_at"] = (
-        fires["irwin_FireDiscoveryDateTime"]
-        .apply(pd.Timestamp)
-        .apply(lambda x: pd.Timestamp(x.date()))
+        fires[discovered].apply(pd.Timestamp).apply(lambda x: pd.Timestamp(x.date()))
     )
 
     return fires.to_crs(CRS)[["name", "acres", "ignite_at", "geometry"]]
 
 
-def load_mtbs_fires():
+def load_mtbs_fires(bbox: tuple = None, urlpath: str = MTBS_PERIMETERS):
     """
     load mtbs data
 
     Originally from: https://www.mtbs.gov/direct-download
     """
-    with fsspec.open("gs://carbonplan-buffer-analysis/inputs/mtbs_perimeters_2019.json") as f:
-        fires = geopandas.read_file(f)
-
-    fires = fires[fires["Incid_Type"] == "Wildfire"]
+    fires = read_perimeters(
+        urlpath,
+        bbox=bbox,
+        where="Incid_Type = 'Wildfire'",
+        columns=["Incid_Name", "BurnBndAc", "Ig_Date"],
+    )
 
     mtbs_colnames = {"Incid_Name": "name", "BurnBndAc": "acres"}
     fires = fires.rename(columns=mtbs_colnames)
@@ -62,22 +117,33 @@ def load_mtbs_fires():
     return fires.to_crs(CRS)[["name", "acres", "ignite_at", "geometry"]]
 
 
-def load_fires():
+def load_fires(bbox: tuple = None):
     print("loading nifc data")
-    nifc = load_nifc_fires()
+    with profiling.span("load_nifc_fires"):
+        nifc = load_nifc_fires(bbox)
     print("loading mtbs data")
-    mtbs = load_mtbs_fires()
+    with profiling.span("load_mtbs_fires"):
+        mtbs = load_mtbs_fires(bbox)
     return pd.concat([nifc, mtbs])
 
 
-@prefect.task(cache_for=datetime.timedelta(hours=1))
-def load_fire_perimeters() -> geopandas.GeoDataFrame:
+@prefect.task
+def get_project_bounds(opr_id: str) -> tuple:
+    """Project bounding box in CRS"""
+    return tuple(load_project_geometry(opr_id).to_crs(CRS).total_bounds)
+
+
+@prefect.task(cache_for=datetime.timedelta(hours=1), cache_validator=all_inputs)
+def load_fire_perimeters(bbox: tuple = None) -> geopandas.GeoDataFrame:
     """Load MTBS and NIFC fire perimeteres
 
+    Arguments:
+        bbox {tuple} -- only load fires intersecting (minx, miny, maxx, maxy), in CRS
+
     Returns:
         geopandas.GeoDataFrame -- shapes and ignition dates
     """
-    return load_fires()
+    return load_fires(bbox)
 
 
 @prefect.task
@@ -90,22 +156,42 @@ def load_prefire_biomass(opr_id: str) -> dict:
     Returns:
         dict -- carbon stocks broken down by various pools (i.e., ifm-1 - standing live)
     """
-    with fsspec.open(
-        "gs://carbonplan-buffer-analysis/inputs/adjusted_prefire_carbon_stocks.json",
-        "r",
-    ) as f:
-        d = json.load(f)
-        return d[opr_id.lower()]
+    for source in PREFIRE_BIOMASS_SOURCES:
+        d = storage.read_json(source)
+        if opr_id.lower() in d:
+            return d[opr_id.lower()]
+    raise KeyError(f"no prefire carbon stocks for {opr_id}")
 
 
 @prefect.task
 def load_woodproduct_storage_factors(opr_id: str) -> dict:
-    with fsspec.open(
-        "gs://carbonplan-buffer-analysis/inputs/wood_product_storage_factors.json",
-        "r",
-    ) as f:
-        d = json.load(f)
-        return d[opr_id.lower()]
+    for source in WOOD_PRODUCT_SOURCES:
+        d = storage.read_json(source)
+        if opr_id.lower() in d:
+            return d[opr_id.lower()]
+    raise KeyError(f"no wood product storage factors for {opr_id}")
+
+
+@prefect.task
+def load_frac_merch_quantiles(salvage_level: str = None) -> dict:
+    """Registry level quantiles of merchantable fraction
+
+    Falls back to FALLBACK_FRAC_MERCH for every quantile in SALVAGE_FRAC_MERCH_QUANTILE if the
+    calculate-wood-product-factors flow hasn't written the quantiles.
+
+    Arguments:
+        salvage_level {str} -- if given, quantiles are only loaded if this salvage level uses
+            them (see SALVAGE_FRAC_MERCH_QUANTILE)
+
+    Returns:
+        dict -- quantile (as str, e.g. "1.0") to frac_merch, empty if not needed
+    """
+    if salvage_level is not None and salvage_level not in SALVAGE_FRAC_MERCH_QUANTILE:
+        return {}
+    try:
+        return storage.read_json(FRAC_MERCH_QUANTILES_PATH)
+    except FileNotFoundError:
+        return {q: FALLBACK_FRAC_MERCH for q in SALVAGE_FRAC_MERCH_QUANTILE.values()}
 
 
 @prefect.task
@@ -118,9 +204,16 @@ def get_project_fires(opr_id: str, fires: geopandas.GeoDataFrame) -> geopandas.G
     project_data = load_project_data(opr_id)
     start_dt = datetime.datetime.strptime(project_data["rp_1"]["start_date"], "%Y-%m-%d")
 
-    eligible_fires = fires[(fires["ignite_at"] > start_dt)].copy()
-    project_fires = geopandas.sjoin(eligible_fires, geom.to_crs(fires.crs))
-    intersect_fires = geopandas.clip(project_fires, geom.to_crs(fires.crs))
+    eligible_fires = fires[(fires["ignite_at"] > start_dt)]
+    geom = geom.to_crs(fires.crs)
+
+    # only fires whose bounds intersect the project go through the exact sjoin/clip. The raster
+    # screen pays off in registry wide sweeps, but for one project an index lookup is cheaper.
+    candidates = eligible_fires.sindex.query(geom.unary_union)
+    eligible_fires = eligible_fires.iloc[np.sort(candidates)].copy()
+
+    project_fires = geopandas.sjoin(eligible_fires, geom)
+    intersect_fires = geopandas.clip(project_fires, geom)
 
     intersect_fires["acres"] = intersect_fires.area / M2_TO_ACRE
 
@@ -161,9 +254,17 @@ def calculate_biomass_loss(
     prefire_biomass: dict,
     severity_level: str,
     include_ifm3: bool = False,
+    loss_mode: str = "area",
+    is_proxy: bool = False,
 ) -> float:
     """Calculates tons of CO2 lost from specific fire event
 
+    In `area` mode, onsite carbon is assumed to be uniform across the project, so losses are the
+    burned fraction of the project times the area weighted mortality. In `pixel` mode, losses are
+    the biomass weighted mortality of each burned pixel (`pixel_loss` in the RAVG summary),
+    rescaled to reported onsite carbon. Proxy events (and summaries computed before pixel losses
+    were added) always use `area` mode, since their RAVG pixels don't come from the project.
+
     Arguments:
         opr_id {str} -- project id
         ravg_data {dict} -- acres by severity class summary of ravg fire event
@@ -171,6 +272,8 @@ def calculate_biomass_loss(
         prefire_biomass {dict} -- Tons of CO2 at risk
         severity_level {str} -- ravg_data estimates has low and high estiamtes of mortality
         include_ifm3 {bool} -- include CWD (ifm3) in loss estimates
+        loss_mode {str} -- `area` or `pixel`
+        is_proxy {bool} -- ravg_data comes from a proxy fire rather than the project
     Returns:
         float -- number of tons burned
     """
@@ -182,6 +285,9 @@ def calculate_biomass_loss(
     else:
         onsite_carbon = prefire_biomass["ifm-1"]
 
+    if loss_mode == "pixel" and not is_proxy and "pixel_loss" in ravg_data:
+        return onsite_carbon * ravg_data["pixel_loss"][severity_level]
+
     project_area = load_project_data(opr_id)["acreage"]
 
     frac_burned = burned_area / project_area
@@ -192,7 +298,7 @@ def calculate_biomass_loss(
 
 @prefect.task
 def calculate_salvaged_wood_products(
-    biomass_loss: float, storage_factors: dict, salvage_level: str
+    biomass_loss: float, storage_factors: dict, salvage_level: str, frac_merch_quantiles: dict
 ) -> float:
     """Calculate tCO2 locked up in wood proucts
 
@@ -202,14 +308,20 @@ def calculate_salvaged_wood_products(
         biomass_loss {float} -- total biomass lost in fire
         storage_factors {dict} -- project-specific storage factors for landfill and in-use products
         salvage_level {str} -- fraction of lost biomass that is salavges [low, mid, high]
+        frac_merch_quantiles {dict} -- registry level frac_merch quantiles. Above low salvage,
+            frac_merch is taken from the registry (SALVAGE_FRAC_MERCH_QUANTILE) rather than the
+            project itself. The "1.0" quantile is the registry maximum, so mid/high salvage
+            results change whenever the wood product factors are recomputed and a project with
+            a higher frac_merch has joined the registry; they aren't comparable to results from
+            an earlier registry (or to the original 0.645, FALLBACK_FRAC_MERCH) without rerunning
 
     Returns:
         float -- tCO2 stored in wood products
     """
     salvage_fraction = SALVAGE_FRACTIONS.get(salvage_level)
     frac_merch = storage_factors["frac_merch"]
-    if salvage_level != "low":
-        frac_merch = 0.645  # if not low, assume max observed across 4 projects
+    if salvage_level in SALVAGE_FRAC_MERCH_QUANTILE:
+        frac_merch = frac_merch_quantiles[SALVAGE_FRAC_MERCH_QUANTILE[salvage_level]]
     return (
         biomass_loss  # noqa
         * salvage_fraction  # noqa
@@ -226,8 +338,11 @@ def write_estimate(
     severity_level: str,
     salvage_level: str,
     ifm_3: bool,
+    loss_mode: str = "area",
 ) -> None:
-    fn = f"gs://carbonplan-buffer-analysis/outputs/reversals/{opr_id}_severity-{severity_level}_salvage-{salvage_level}_ifm3-{str(ifm_3).lower()}.json"  # noqa
+    # area mode estimates are the ones summarized by summarize_fire
+    reversals_dir = "reversals" if loss_mode == "area" else f"reversals-{loss_mode}"
+    fn = f"gs://carbonplan-buffer-analysis/outputs/{reversals_dir}/{opr_id}_severity-{severity_level}_salvage-{salvage_level}_ifm3-{str(ifm_3).lower()}.json"  # noqa
 
     record = {
         "opr_id": opr_id,
@@ -235,7 +350,7 @@ def write_estimate(
         "salvage_wp": salvaged_wp,
         "severity": severity_level,
         "salvage": salvage_level,
-        "includes_ifm_3": str(ifm_3).lower(),
+        "includes_ifm_3": bool(ifm_3),
+        "loss_mode": loss_mode,
     }
-    with fsspec.open(fn, "w") as f:
-        json.dump(record, f, indent=2)
+    storage.write_json(fn, record, indent=2)
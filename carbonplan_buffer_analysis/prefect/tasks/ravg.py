@@ -1,11 +1,17 @@
-import fsspec
+import hashlib
+import json
+from typing import Optional
+
+import dask
 import geopandas
-import pandas as pd
+import numpy as np
 import prefect
 import rioxarray  # noqa
 import xarray as xr
 from carbonplan_forest_offsets.load.geometry import load_project_geometry
 
+from carbonplan_buffer_analysis import profiling, proximity, storage, utils
+
 CRS = "+proj=aea +lat_0=23 +lon_0=-96 +lat_1=29.5 +lat_2=45.5 +x_0=0 +y_0=0 +ellps=WGS84 +towgs84=0,0,0,0,0,0,0 +units=m +no_defs +type=crs"  # noqa
 RAVG_RESOLUTION = 30
 M2_TO_ACRE = 4046.86
@@ -19,11 +25,38 @@ SEVERITY_TO_MORTALITY = {
     7: (0.9, 1),
     9: (0, 0),
 }
+# plausible range of mortality by severity class, for sensitivity analysis. SEVERITY_TO_MORTALITY
+# collapses classes 2-5 to their lower bounds
+SEVERITY_TO_MORTALITY_RANGE = {
+    1: (0, 0),
+    2: (0, 0.1),
+    3: (0.1, 0.25),
+    4: (0.25, 0.5),
+    5: (0.5, 0.75),
+    6: (0.75, 0.9),
+    7: (0.9, 1),
+    9: (0, 0),
+}
+# projects where burned area is limited to listed lands of a given NLCD class
+LISTED_LANDS = {
+    "ACR255": {
+        "geometry": "gs://carbonplan-buffer-analysis/inputs/ACR255-listing.json",
+        "nlcd_class": 42,  # evergreen forest -- eligible conifers
+    }
+}
+ALIGNED_STACK_DIR = utils.LOCAL_CACHE / "aligned"
+# aboveground biomass density on the RAVG (CONUS albers, 30 m) grid. only the spatial distribution
+# of biomass within a project matters, totals are rescaled to reported ifm-1
+BIOMASS_RASTER = "gs://carbonplan-buffer-analysis/inputs/biomass_2020.tif"
+CHUNKS = {"x": 2048, "y": 2048}
+RAVG_RASTER = "gs://carbonplan-buffer-analysis/inputs/ravg/{fire_name}.tif"
+NLCD_RASTER = "gs://carbonplan-buffer-analysis/inputs/nlcd_2013.tif"
 
 
 def load_project_nlcd(shp: geopandas.GeoDataFrame) -> xr.DataArray:
     """load nlcd data and clip by shp"""
-    nlcd = xr.open_rasterio("gs://carbonplan-buffer-analysis/inputs/nlcd_2013.tif")
+    storage.configure_gdal()
+    nlcd = xr.open_rasterio(NLCD_RASTER, chunks=CHUNKS)
     nlcd = nlcd.rio.set_nodata(0)
 
     bounds = shp.to_crs(nlcd.crs).bounds.to_dict(orient="records")[0]
@@ -40,24 +73,91 @@ def load_project_nlcd(shp: geopandas.GeoDataFrame) -> xr.DataArray:
 @prefect.task
 def load_ravg(fire_name: str) -> xr.DataArray:
     """Load per fire ravg data"""
-    da = xr.open_rasterio(f"gs://carbonplan-buffer-analysis/inputs/ravg/{fire_name}.tif")
+    storage.configure_gdal()
+    da = xr.open_rasterio(RAVG_RASTER.format(fire_name=fire_name), chunks=CHUNKS)
     da = da.rio.set_nodata(0)  # RAVG tifs dont assign nodataval which causes rioxarray to error
+    da.attrs["fire_name"] = fire_name
     return da
 
 
+def load_listing(opr_id: str) -> geopandas.GeoDataFrame:
+    with profiling.open_file(LISTED_LANDS[opr_id]["geometry"]) as f:
+        return geopandas.read_file(f)
+
+
+def get_source_hash(fire_name: str, opr_id: str) -> str:
+    """Hash of the versions of the RAVG, NLCD and listing inputs an aligned stack is built from"""
+    sources = [
+        RAVG_RASTER.format(fire_name=fire_name),
+        NLCD_RASTER,
+        LISTED_LANDS[opr_id]["geometry"],
+    ]
+    versions = [[source, utils.get_version(source)] for source in sources]
+    return hashlib.sha256(json.dumps(versions, sort_keys=True).encode()).hexdigest()
+
+
 @prefect.task
-def get_ravg_subset(ravg: xr.DataArray, opr_id: str) -> xr.DataArray:
+def get_aligned_stack(ravg: xr.DataArray, fire_name: str, opr_id: str) -> Optional[str]:
+    """Path to a two band (RAVG, NLCD) raster on the RAVG grid for projects with listed lands
+
+    Reprojecting NLCD onto the RAVG grid is the most expensive step for these projects and is
+    identical every run, so the aligned stack is written once to a tiled, compressed GeoTIFF in
+    the local cache and reused until one of its inputs changes.
+
+    Returns:
+        Optional[str] -- path to the stack, or None if the project has no listed lands
+    """
+    if opr_id not in LISTED_LANDS:
+        return None
+
+    path = ALIGNED_STACK_DIR / f"{fire_name}_{opr_id}.tif"
+    source_hash = get_source_hash(fire_name, opr_id)
+    if proximity.is_current(str(path), source_hash):
+        return str(path)
+
+    shp = load_listing(opr_id)
+    ravg_clipped = ravg.rio.clip(shp.to_crs(ravg.crs).geometry)
+    listed_nlcd = load_project_nlcd(shp)
+    with profiling.span("reproject_nlcd"):
+        matched = listed_nlcd.rio.reproject_match(ravg_clipped)
+
+    stack = xr.concat(
+        [ravg_clipped, matched.astype(ravg_clipped.dtype)],
+        dim="band",
+        coords="minimal",
+        compat="override",
+    )
+    stack["band"] = [1, 2]
+    stack = stack.rio.write_crs(ravg_clipped.rio.crs).rio.write_nodata(0)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp.tif")
+    stack.rio.to_raster(
+        tmp,
+        tags={proximity.SOURCE_HASH_TAG: source_hash},
+        tiled=True,
+        blockxsize=256,
+        blockysize=256,
+        compress="deflate",
+    )
+    tmp.replace(path)  # never leave a partially written stack behind
+    return str(path)
+
+
+@prefect.task
+def get_ravg_subset(
+    ravg: xr.DataArray, opr_id: str, aligned_stack: Optional[str] = None
+) -> xr.DataArray:
     """Trim ravg data to only intersection with project geometry"""
-    if opr_id == "ACR255":
+    if opr_id in LISTED_LANDS:
         # in this case, project may have excluded burned lands
-        # load listed shape and mask the ravg data by eligible conifers as opposed to shp file
-        with fsspec.open("gs://carbonplan-buffer-analysis/inputs/ACR255-listing.json") as f:
-            shp = geopandas.read_file(f)
-        ravg_clipped = ravg.rio.clip(shp.to_crs(ravg.crs).geometry)
+        # mask the ravg data by eligible conifers (NLCD) as opposed to shp file
+        if aligned_stack is None:
+            aligned_stack = get_aligned_stack.run(ravg, ravg.attrs["fire_name"], opr_id)
+        stack = xr.open_rasterio(aligned_stack, chunks=CHUNKS)  # windowed reads, no reprojection
+        nlcd_class = LISTED_LANDS[opr_id]["nlcd_class"]
 
-        listed_nlcd = load_project_nlcd(shp)
-        matched = listed_nlcd.rio.reproject_match(ravg_clipped)
-        listed_ravg = ravg_clipped.where(matched == 42)
+        listed_ravg = stack.sel(band=[1]).where(stack.sel(band=2) == nlcd_class)
         return listed_ravg.where(listed_ravg > 0)
     else:
         shp = load_project_geometry(opr_id)
@@ -75,15 +175,30 @@ def get_ravg_subset(ravg: xr.DataArray, opr_id: str) -> xr.DataArray:
         return project_pixels.where(project_pixels > 0)
 
 
+def count_classes(severity: np.ndarray) -> np.ndarray:
+    """Pixels per RAVG severity class (by index) in a block, ignoring nodata and classes above 7"""
+    classes = np.nan_to_num(severity, nan=0).astype("uint8").ravel()
+    return np.bincount(classes[(classes > 0) & (classes <= 7)], minlength=8)
+
+
 @prefect.task
 def get_ravg_counts(ravg_subset: xr.DataArray) -> dict:
-    counts = pd.Series(ravg_subset.where(ravg_subset <= 7).values.ravel()).value_counts().to_dict()
-    acre_counts = {k: v * (RAVG_RESOLUTION ** 2) / M2_TO_ACRE for k, v in counts.items()}
+    """Burned acres per severity class
+
+    Counted chunk by chunk, so a large fire is never loaded into memory all at once (and chunks
+    are counted in parallel, on a local cluster if one is running).
+    """
+    profiling.record_pixels(ravg_subset.size)
+    blocks = ravg_subset.chunk(CHUNKS).data.to_delayed().ravel()
+    counts = sum(dask.compute(*[dask.delayed(count_classes)(block) for block in blocks]))
+    acre_counts = {
+        float(k): v * (RAVG_RESOLUTION ** 2) / M2_TO_ACRE for k, v in enumerate(counts) if v > 0
+    }
     return acre_counts
 
 
 @prefect.task
-def get_mortality_summary(acre_counts: dict) -> dict:
+def get_mortality_summary(acre_counts: dict, pixel_loss: Optional[dict] = None) -> dict:
 
     total_burned = sum(acre_counts.values())
 
@@ -100,4 +215,69 @@ def get_mortality_summary(acre_counts: dict) -> dict:
             for ba7_class in acre_counts.keys()
         ]
     )
-    return {"low": low, "high": high, "counts": acre_counts}
+    summary = {"low": low, "high": high, "counts": acre_counts}
+    if pixel_loss is not None:
+        summary["pixel_loss"] = pixel_loss
+    return summary
+
+
+def get_mortality_lut(bound: int) -> np.ndarray:
+    """Lookup table from RAVG severity class to mortality, for the low (0) or high (1) bound
+
+    Unlisted classes (including nodata, mapped to 0) have no mortality.
+    """
+    lut = np.zeros(256, dtype="float32")
+    for ba7_class, mortality in SEVERITY_TO_MORTALITY.items():
+        lut[ba7_class] = mortality[bound]
+    return lut
+
+
+def apply_mortality(severity: np.ndarray, biomass: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    """Biomass lost per pixel, for a block of severity classes and biomass densities"""
+    classes = np.nan_to_num(severity, nan=0).astype("uint8")
+    return np.nan_to_num(biomass, nan=0) * lut[classes]
+
+
+def load_biomass(shp: geopandas.GeoDataFrame) -> xr.DataArray:
+    """Lazily load the biomass raster, clipped to a project geometry"""
+    storage.configure_gdal()
+    biomass = xr.open_rasterio(BIOMASS_RASTER, chunks=CHUNKS).squeeze("band", drop=True)
+    biomass = biomass.rio.set_nodata(0)
+
+    bounds = shp.to_crs(biomass.rio.crs).bounds.to_dict(orient="records")[0]
+    subset = biomass.sel(
+        y=slice(bounds["maxy"], bounds["miny"]), x=slice(bounds["minx"], bounds["maxx"])
+    )
+    return subset.rio.clip(shp.to_crs(biomass.rio.crs).geometry)
+
+
+@prefect.task
+def get_pixel_loss(ravg_subset: xr.DataArray, opr_id: str) -> dict:
+    """Fraction of project biomass lost, weighting each pixel's mortality by its biomass
+
+    Unlike the area weighted summary, this accounts for where high severity pixels landed within
+    the project. Biomass is aligned to the (clipped) RAVG subset and losses are summed
+    block-by-block, so memory use is bounded by the chunk size rather than the fire size.
+
+    Returns:
+        dict -- `low` and `high` fraction of total project biomass lost
+    """
+    biomass = load_biomass(load_project_geometry(opr_id))
+    total = float(biomass.sum())
+
+    severity = ravg_subset.squeeze("band", drop=True).chunk(CHUNKS)
+    aligned = biomass.reindex_like(severity, method="nearest", tolerance=RAVG_RESOLUTION / 2)
+    profiling.record_pixels(severity.size)
+
+    pixel_loss = {}
+    for bound, level in enumerate(["low", "high"]):
+        lost = xr.apply_ufunc(
+            apply_mortality,
+            severity,
+            aligned,
+            kwargs={"lut": get_mortality_lut(bound)},
+            dask="parallelized",
+            output_dtypes=["float32"],
+        ).sum()
+        pixel_loss[level] = float(lost) / total if total > 0 else 0.0
+    return pixel_loss
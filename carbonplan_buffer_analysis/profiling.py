@@ -0,0 +1,306 @@
+"""Per-task instrumentation for the prefect flows
+
+Records wall time, CPU time, peak RSS, bytes moved through fsspec and raster pixels processed for
+every task in a flow run, and writes a JSON/CSV run report plus an optional Chrome trace
+(chrome://tracing or https://ui.perfetto.dev).
+
+Instrumentation is off unless a report is active, so the hooks below are cheap no-ops during
+normal runs. Set BUFFER_ANALYSIS_PROFILE to an output directory (local or gs://) to turn it on
+for any flow run through `run_flow`; set BUFFER_ANALYSIS_TRACE=1 to also write the trace.
+"""
+import contextlib
+import csv
+import io
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+
+import fsspec
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+PROFILE_DIR_ENV = "BUFFER_ANALYSIS_PROFILE"
+TRACE_ENV = "BUFFER_ANALYSIS_TRACE"
+REPORT_FIELDS = [
+    "name",
+    "start",
+    "wall_time",
+    "cpu_time",
+    "peak_rss_mb",
+    "rss_increase_mb",
+    "bytes_read",
+    "bytes_written",
+    "pixels",
+]
+
+
+def _peak_rss_mb() -> float:
+    """process high-water RSS, in MB"""
+    if resource is None:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macos reports bytes
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+@dataclass
+class Span:
+    """Measurements for a single task (or any named block of work)
+
+    `peak_rss_mb` is the process high-water mark when the span closed. `rss_increase_mb` is how
+    far that mark moved during the span, which attributes new memory peaks to the span that
+    caused them.
+    """
+
+    name: str
+    start: float = 0.0
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    peak_rss_mb: float = 0.0
+    rss_increase_mb: float = 0.0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    pixels: int = 0
+    thread_id: int = field(default_factory=threading.get_ident, repr=False)
+    _cpu_start: float = field(default=0.0, repr=False)
+    _rss_start: float = field(default=0.0, repr=False)
+
+
+class RunReport:
+    """Collection of finished spans for a single run"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.spans: List[Span] = []
+        self._t0 = time.perf_counter()
+        self._active: List[Span] = []
+        self._lock = threading.Lock()
+
+    def open_span(self, name: str) -> Span:
+        span = Span(
+            name=name,
+            start=time.perf_counter() - self._t0,
+            _cpu_start=time.process_time(),
+            _rss_start=_peak_rss_mb(),
+        )
+        with self._lock:
+            self._active.append(span)
+        return span
+
+    def close_span(self, span: Span) -> None:
+        span.wall_time = time.perf_counter() - self._t0 - span.start
+        span.cpu_time = time.process_time() - span._cpu_start
+        span.peak_rss_mb = _peak_rss_mb()
+        span.rss_increase_mb = span.peak_rss_mb - span._rss_start
+        with self._lock:
+            if span in self._active:
+                self._active.remove(span)
+            self.spans.append(span)
+
+    def add(self, **counters: int) -> None:
+        """add counters to every open span, so enclosing spans include nested work"""
+        with self._lock:
+            for span in self._active:
+                for k, v in counters.items():
+                    setattr(span, k, getattr(span, k) + v)
+
+    def to_records(self) -> List[dict]:
+        return [{k: asdict(span)[k] for k in REPORT_FIELDS} for span in self.spans]
+
+    def to_json(self, urlpath: str) -> None:
+        with fsspec.open(urlpath, "w") as f:
+            json.dump({"name": self.name, "tasks": self.to_records()}, f, indent=2)
+
+    def to_csv(self, urlpath: str) -> None:
+        with fsspec.open(urlpath, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.to_records())
+
+    def to_chrome_trace(self, urlpath: str) -> None:
+        """Write spans in the Chrome trace event format (complete events, microseconds)"""
+        pid = os.getpid()
+        events = [
+            {
+                "name": span.name,
+                "ph": "X",
+                "ts": span.start * 1e6,
+                "dur": span.wall_time * 1e6,
+                "pid": pid,
+                "tid": span.thread_id,
+                "args": {k: getattr(span, k) for k in REPORT_FIELDS[3:]},
+            }
+            for span in self.spans
+        ]
+        with fsspec.open(urlpath, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+_report: Optional[RunReport] = None
+
+
+def get_report() -> Optional[RunReport]:
+    return _report
+
+
+@contextlib.contextmanager
+def profile_run(name: str, report_dir: str = None, trace: bool = None):
+    """Activate instrumentation for the duration of the block
+
+    Arguments:
+        name {str} -- run name, used to name output files
+        report_dir {str} -- where to write `{name}-report.json/csv`. Defaults to the
+            BUFFER_ANALYSIS_PROFILE environment variable; if neither is set, nothing is recorded
+        trace {bool} -- also write `{name}-trace.json`. Defaults to BUFFER_ANALYSIS_TRACE
+    """
+    global _report
+
+    report_dir = report_dir or os.environ.get(PROFILE_DIR_ENV)
+    if trace is None:
+        trace = os.environ.get(TRACE_ENV, "").lower() in ("1", "true")
+    if not report_dir or _report is not None:
+        # disabled, or nested inside an already active run
+        yield _report
+        return
+
+    _report = RunReport(name)
+    root = _report.open_span(name)
+    try:
+        yield _report
+    finally:
+        report, _report = _report, None
+        report.close_span(root)
+        prefix = f"{report_dir.rstrip('/')}/{name}"
+        report.to_json(f"{prefix}-report.json")
+        report.to_csv(f"{prefix}-report.csv")
+        if trace:
+            report.to_chrome_trace(f"{prefix}-trace.json")
+
+
+@contextlib.contextmanager
+def span(name: str):
+    """Measure a block of work inside a task"""
+    report = _report
+    if report is None:
+        yield
+        return
+    s = report.open_span(name)
+    try:
+        yield
+    finally:
+        report.close_span(s)
+
+
+def record_io(bytes_read: int = 0, bytes_written: int = 0) -> None:
+    if _report is not None:
+        _report.add(bytes_read=bytes_read, bytes_written=bytes_written)
+
+
+def record_pixels(n: int) -> None:
+    if _report is not None:
+        _report.add(pixels=int(n))
+
+
+def task_state_handler(runner, old_state, new_state):
+    """prefect task runner state handler that opens/closes one span per task run"""
+    report = _report
+    if report is None:
+        return new_state
+    if new_state.is_running():
+        runner._profiling_span = report.open_span(runner.task.name)
+    elif new_state.is_finished() and getattr(runner, "_profiling_span", None) is not None:
+        report.close_span(runner._profiling_span)
+        runner._profiling_span = None
+    return new_state
+
+
+def run_flow(flow, **parameters):
+    """Run a prefect flow, instrumenting every task when profiling is enabled
+
+    Each call writes its own `{flow.name}-report.json/csv`. To run a flow several times (e.g. once
+    per scenario) into a single report, call this inside one `profile_run`.
+    """
+    with profile_run(flow.name):
+        return flow.run(task_runner_state_handlers=[task_state_handler], **parameters)
+
+
+def _nbytes(data) -> int:
+    """size of data in bytes, text files count their utf-8 encoded size"""
+    return len(data.encode()) if isinstance(data, str) else len(data)
+
+
+class CountingFile(io.IOBase):
+    """File wrapper that reports bytes read/written to the active run report"""
+
+    def __init__(self, f):
+        self._f = f
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        record_io(bytes_read=_nbytes(data))
+        return data
+
+    def readinto(self, b):
+        n = self._f.readinto(b)
+        record_io(bytes_read=n or 0)
+        return n
+
+    def readline(self, size=-1):
+        line = self._f.readline(size)
+        record_io(bytes_read=_nbytes(line))
+        return line
+
+    def write(self, data):
+        record_io(bytes_written=_nbytes(data))
+        return self._f.write(data)
+
+    def seek(self, offset, whence=0):
+        return self._f.seek(offset, whence)
+
+    def tell(self):
+        return self._f.tell()
+
+    def readable(self):
+        return self._f.readable()
+
+    def writable(self):
+        return self._f.writable()
+
+    def seekable(self):
+        return self._f.seekable()
+
+    def flush(self):
+        return self._f.flush()
+
+    @property
+    def closed(self):
+        return self._f.closed
+
+    def close(self):
+        self._f.close()
+
+
+@contextlib.contextmanager
+def open_file(urlpath: str, mode: str = "rb", **kwargs):
+    """`fsspec.open`, counting bytes against the active run report"""
+    with fsspec.open(urlpath, mode, **kwargs) as f:
+        yield f if _report is None else CountingFile(f)
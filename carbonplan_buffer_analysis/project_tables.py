@@ -0,0 +1,155 @@
+"""Normalized columnar tables built from the nested project database
+
+The project database (`cat.project_db_json`) is a list of nested per-project records. Walking
+those records in Python for every analysis gets slow once it's done per species, per scenario,
+across the whole registry. `flatten_project_db` walks them once and returns three tables that
+can be joined and grouped with vectorized pandas operations:
+
+    projects          -- one row per project, indexed by opr_id
+    assessment_areas  -- one row per (opr_id, aa_idx) assessment area
+    species           -- one row per species entry in an assessment area
+
+`make_project_table` is the interchange format for per-project values computed by flows (issuance,
+fire risks, tanoak biomass, temperatures...): one typed column per value, sharing a categorical
+opr_id index, so they're joined once and downstream math is vectorized.
+"""
+from typing import Dict, Iterable, Mapping, Union
+
+import numpy as np
+import pandas as pd
+
+TANOAK_SPECIES_CODE = 631
+GENERIC_ASSESSMENT_AREA = 999  # covers the entire project area
+
+
+def to_bool(values: pd.Series) -> pd.Series:
+    """Real booleans from booleans or the strings older records store (e.g. `"true"`)"""
+    if pd.api.types.is_bool_dtype(values):
+        return values
+    return values.astype(str).str.lower() == "true"
+
+
+def make_project_table(**columns: Union[Mapping, pd.Series]) -> pd.DataFrame:
+    """Join per-project values into one typed table indexed by opr_id
+
+    Arguments:
+        columns -- per-project values (dicts or Series keyed by opr_id), by column name
+
+    Returns:
+        pd.DataFrame -- one row per opr_id found in any column, with a categorical index. Numeric
+            columns are float64 where any project is missing a value, booleans are nullable
+            `boolean` in that case.
+    """
+    series = {}
+    for name, values in columns.items():
+        values = pd.Series(values, dtype=None if len(values) else float)
+        series[name] = values.set_axis(values.index.astype(str))
+    opr_ids = sorted(set().union(*(values.index for values in series.values())))
+
+    table = pd.DataFrame(index=pd.Index(opr_ids, name="opr_id"))
+    for name, values in series.items():
+        column = values.reindex(table.index)
+        if pd.api.types.is_bool_dtype(values) and column.isna().any():
+            column = values.astype("boolean").reindex(table.index)
+        table[name] = column
+    table.index = pd.CategoricalIndex(table.index, name="opr_id")
+    return table
+
+
+def flatten_project_db(projects: list) -> Dict[str, pd.DataFrame]:
+    """Convert nested project records into projects, assessment area and species tables
+
+    Arguments:
+        projects {list} -- project records, as returned by `cat.project_db_json.read()`
+
+    Returns:
+        dict -- `projects`, `assessment_areas` and `species` DataFrames
+    """
+    project_rows = [
+        (
+            project["opr_id"],
+            project["acreage"],
+            project.get("rp_1", {}).get("ifm_1", np.nan),
+            project.get("rp_1", {}).get("ifm_3", np.nan),
+        )
+        for project in projects
+    ]
+    aa_rows = [
+        (project["opr_id"], aa_idx, aa["code"], aa.get("site_class"), aa["acreage"])
+        for project in projects
+        for aa_idx, aa in enumerate(project["assessment_areas"])
+    ]
+    species_rows = [
+        (project["opr_id"], aa_idx, species["code"], species["fraction"])
+        for project in projects
+        for aa_idx, aa in enumerate(project["assessment_areas"])
+        for species in aa["species"]
+    ]
+
+    return {
+        "projects": pd.DataFrame(
+            project_rows, columns=["opr_id", "acreage", "ifm_1", "ifm_3"]
+        ).set_index("opr_id"),
+        "assessment_areas": pd.DataFrame(
+            aa_rows, columns=["opr_id", "aa_idx", "code", "site_class", "acreage"]
+        ),
+        "species": pd.DataFrame(species_rows, columns=["opr_id", "aa_idx", "code", "fraction"]),
+    }
+
+
+def get_grouped_species_fractions(
+    tables: Dict[str, pd.DataFrame], species_codes: pd.DataFrame
+) -> pd.DataFrame:
+    """Acreage weighted fraction of each project made up of several sets of species at once
+
+    Follows the conventions of the original per-project calculation: fractions are summed
+    across species codes (e.g., high/low site class entries) within an assessment area, generic
+    (code 999) assessment areas are weighted by total project acreage, and a project with any
+    assessment area that doesn't list one of the species gets a fraction of zero.
+
+    Arguments:
+        tables {dict} -- output of `flatten_project_db`
+        species_codes {pd.DataFrame} -- `group` and `code` columns, one row per species in a group
+
+    Returns:
+        pd.DataFrame -- fraction per opr_id (rows) and group (columns), rounded to three places
+    """
+    projects, aas, species = tables["projects"], tables["assessment_areas"], tables["species"]
+    groups = species_codes["group"].unique()
+
+    host_fraction = (
+        species.merge(species_codes, on="code")
+        .groupby(["group", "opr_id", "aa_idx"])["fraction"]
+        .sum()
+        .rename("host_fraction")
+    )
+    aas = aas.merge(pd.DataFrame({"group": groups}), how="cross")
+    aas = aas.join(host_fraction, on=["group", "opr_id", "aa_idx"])
+
+    project_acreage = aas["opr_id"].map(projects["acreage"])
+    acreage = aas["acreage"].where(aas["code"] != GENERIC_ASSESSMENT_AREA, project_acreage)
+    aas["weighted"] = aas["host_fraction"] * acreage / project_acreage
+    aas["missing"] = aas["host_fraction"].isna()
+
+    grouped = aas.groupby(["opr_id", "group"])
+    fractions = grouped["weighted"].sum().where(~grouped["missing"].any(), 0)
+    return (
+        fractions.unstack("group").reindex(index=projects.index, columns=groups).fillna(0).round(3)
+    )
+
+
+def get_species_fractions(
+    tables: Dict[str, pd.DataFrame], species_codes: Union[int, Iterable[int]]
+) -> pd.Series:
+    """Acreage weighted fraction of each project made up of a set of species
+
+    Arguments:
+        tables {dict} -- output of `flatten_project_db`
+        species_codes {int or iterable} -- FIA species code(s) to include
+
+    Returns:
+        pd.Series -- fraction per opr_id, rounded to three decimal places
+    """
+    codes = [species_codes] if np.isscalar(species_codes) else list(species_codes)
+    fractions = get_grouped_species_fractions(tables, pd.DataFrame({"group": 0, "code": codes}))
+    return fractions[0].rename(None)
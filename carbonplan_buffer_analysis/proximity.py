@@ -0,0 +1,170 @@
+"""Distance to the nearest positive SODblitz detection, as a raster
+
+A Euclidean distance transform of positive detections on a projected grid gives the distance from
+every cell to the nearest detection in one pass. Per project statistics (minimum, mean, tanoak
+weighted mean distance) are then zonal reductions over that raster, so scoring a project, a
+candidate project or the whole tanoak range needs no vector geometry work.
+
+Distances are between cell centers, so they're accurate to about one cell
+(SOD_DISTANCE_RESOLUTION). The raster is tagged with a hash of the detections and grid it was
+built from, and is only rebuilt when those change.
+"""
+import hashlib
+import shutil
+
+import geopandas
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.vrt import WarpedVRT
+from scipy import ndimage
+
+from carbonplan_buffer_analysis import profiling, utils, zonal
+
+SOD_DISTANCE_CRS = "epsg:5070"
+SOD_DISTANCE_RESOLUTION = 250  # m
+SOD_DISTANCE_RASTER = "gs://carbonplan-buffer-analysis/intermediates/sod-distance.tif"
+SOD_DISTANCE_BLOCK_ROWS = 1024
+SOURCE_HASH_TAG = "SOURCE_HASH"
+
+
+def get_source_hash(points: geopandas.GeoSeries, grid: zonal.Grid) -> str:
+    """Hash of the detections (in any order) and the grid they're rasterized on"""
+    coords = np.column_stack([points.x.to_numpy(), points.y.to_numpy()]).round(3)
+    coords = coords[np.lexsort(coords.T[::-1])]
+    h = hashlib.sha256(coords.tobytes())
+    h.update(repr((tuple(grid.transform), grid.height, grid.width, str(grid.crs))).encode())
+    return h.hexdigest()
+
+
+def is_current(path: str, source_hash: str) -> bool:
+    """Whether the raster at path exists and was built from the same detections and grid"""
+    try:
+        with rasterio.open(path) as src:
+            return src.tags().get(SOURCE_HASH_TAG) == source_hash
+    except rasterio.errors.RasterioIOError:
+        return False
+
+
+def rasterize_points(points: geopandas.GeoSeries, grid: zonal.Grid) -> np.ndarray:
+    """Boolean grid, True in cells containing at least one point (points off the grid dropped)"""
+    cols, rows = ~grid.transform * (points.x.to_numpy(), points.y.to_numpy())
+    rows, cols = np.floor(rows).astype(int), np.floor(cols).astype(int)
+    inside = (rows >= 0) & (rows < grid.height) & (cols >= 0) & (cols < grid.width)
+    mask = np.zeros((grid.height, grid.width), dtype=bool)
+    mask[rows[inside], cols[inside]] = True
+    return mask
+
+
+def distance_transform(points: geopandas.GeoSeries, grid: zonal.Grid) -> np.ndarray:
+    """Distance (m) from every cell center to the center of the nearest cell with a point"""
+    mask = rasterize_points(points, grid)
+    if not mask.any():
+        raise ValueError("no points within grid")
+    profiling.record_pixels(mask.size)
+    return ndimage.distance_transform_edt(~mask, sampling=grid.resolution).astype("float32")
+
+
+def write_distance_raster(
+    distance: np.ndarray, grid: zonal.Grid, path: str, source_hash: str
+) -> None:
+    """Write a tiled GeoTIFF (locally first, then copied to path) tagged with source_hash"""
+    local = utils.LOCAL_CACHE / "sod-distance.tif"
+    local.parent.mkdir(parents=True, exist_ok=True)
+    tmp = local.with_suffix(".tmp.tif")
+    profile = dict(
+        driver="GTiff",
+        height=grid.height,
+        width=grid.width,
+        count=1,
+        dtype="float32",
+        crs=grid.crs,
+        transform=grid.transform,
+        tiled=True,
+        blockxsize=256,
+        blockysize=256,
+        compress="deflate",
+        predictor=3,
+    )
+    with rasterio.open(tmp, "w", **profile) as dst:
+        dst.set_band_description(1, "distance_m")
+        dst.update_tags(**{SOURCE_HASH_TAG: source_hash})
+        dst.write(distance, 1)
+    tmp.rename(local)
+
+    if str(path) != str(local):
+        with open(local, "rb") as src, profiling.open_file(str(path), "wb") as dst:
+            shutil.copyfileobj(src, dst)
+
+
+def get_distance_stats(
+    geometries: geopandas.GeoSeries,
+    path: str = SOD_DISTANCE_RASTER,
+    weights_path: str = None,
+    block_rows: int = SOD_DISTANCE_BLOCK_ROWS,
+) -> pd.DataFrame:
+    """Zonal distance statistics for each geometry
+
+    Geometries are rasterized with `all_touched`, so projects smaller than a cell still get one.
+
+    Arguments:
+        geometries {geopandas.GeoSeries} -- e.g. project geometries, in any CRS
+        path {str} -- distance raster written by `write_distance_raster`
+        weights_path {str} -- optional raster of exposure weights (e.g. tanoak basal area),
+            averaged onto the distance grid
+
+    Returns:
+        pd.DataFrame -- `min_km`, `mean_km` and (with weights) `weighted_km`, indexed like
+            geometries
+    """
+    n = len(geometries)
+    distance_sums, pixels = np.zeros(n + 1), np.zeros(n + 1)
+    weighted_sums, weight_sums = np.zeros(n + 1), np.zeros(n + 1)
+    mins = np.full(n + 1, np.inf)
+
+    with rasterio.open(path) as src:
+        grid = zonal.Grid.from_raster(src)
+        geometries = geometries.to_crs(grid.crs)
+        weights = None
+        if weights_path is not None:
+            weights_src = rasterio.open(weights_path)
+            weights = WarpedVRT(
+                weights_src,
+                crs=grid.crs,
+                transform=grid.transform,
+                width=grid.width,
+                height=grid.height,
+                resampling=Resampling.average,
+            )
+        try:
+            for window in grid.intersecting_windows(geometries, block_rows):
+                with profiling.span("sod_distance_block"):
+                    distance = src.read(1, window=window).astype("float64")
+                    labels = zonal.rasterize_labels(geometries, grid, window, all_touched=True)
+                    sums, counts = zonal.zonal_sums(labels, distance, n)
+                    distance_sums += sums
+                    pixels += counts
+                    mins = np.minimum(mins, zonal.zonal_mins(labels, distance, n))
+                    if weights is not None:
+                        w = weights.read(1, window=window, masked=True).filled(0).astype("float64")
+                        weighted_sums += zonal.zonal_sums(labels, distance * w, n)[0]
+                        weight_sums += zonal.zonal_sums(labels, w, n)[0]
+                    profiling.record_pixels(distance.size)
+        finally:
+            if weights is not None:
+                weights.close()
+                weights_src.close()
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        stats = pd.DataFrame(
+            {
+                "pixels": pixels[1:].astype(int),
+                "min_km": np.where(pixels[1:] > 0, mins[1:], np.nan) / 1_000,
+                "mean_km": distance_sums[1:] / pixels[1:] / 1_000,
+            },
+            index=geometries.index,
+        )
+        if weights is not None:
+            stats["weighted_km"] = weighted_sums[1:] / weight_sums[1:] / 1_000
+    return stats
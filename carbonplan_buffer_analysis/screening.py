@@ -0,0 +1,106 @@
+"""Coarse raster screening of project x fire pairs
+
+Exact vector intersection of every project with every fire perimeter is expensive, and in a
+registry wide sweep almost all pairs don't overlap at all. Screening rasterizes every geometry's
+footprint onto a shared coarse grid, once, and finds overlapping pairs with a join on cell index.
+
+Footprints are rasterized with `all_touched`, so any pair of geometries whose intersection has
+non-zero area share at least one cell: screening never drops a real intersection (no false
+negatives). Overlap areas estimated from cells whose centers fall inside both geometries let
+callers decide which of the remaining pairs are worth exact geometry work.
+"""
+import geopandas
+import numpy as np
+import pandas as pd
+from rasterio import features
+from rasterio.errors import WindowError
+from rasterio.windows import Window
+
+from carbonplan_buffer_analysis import zonal
+
+SCREEN_RESOLUTION = 1_000  # m
+
+
+def get_footprints(geometries: geopandas.GeoSeries, grid: zonal.Grid) -> pd.DataFrame:
+    """Coarse grid cells touched by each geometry
+
+    Returns:
+        pd.DataFrame -- one row per (geometry position, cell) with `center` True where the cell
+            center is inside the geometry
+    """
+    ids, cells, centers = [], [], []
+    full = Window(0, 0, grid.width, grid.height)
+    for i, geometry in enumerate(geometries):
+        if geometry is None or geometry.is_empty:
+            continue
+        minx, miny, maxx, maxy = geometry.bounds
+        col, row = ~grid.transform * (minx, maxy)
+        col_end, row_end = ~grid.transform * (maxx, miny)
+        col, row = int(np.floor(col)), int(np.floor(row))
+        window = Window(col, row, int(np.ceil(col_end)) - col, int(np.ceil(row_end)) - row)
+        # pad by a cell so geometries on cell edges (or smaller than a cell) aren't missed
+        window = Window(window.col_off - 1, window.row_off - 1, window.width + 2, window.height + 2)
+        try:
+            window = window.intersection(full)
+        except WindowError:  # geometry is off the grid
+            continue
+
+        shape = (int(window.height), int(window.width))
+        transform = grid.window_transform(window)
+        touched = features.rasterize([(geometry, 1)], shape, transform=transform, all_touched=True)
+        center = features.rasterize([(geometry, 1)], shape, transform=transform)
+        rows, cols = np.nonzero(touched)
+
+        ids.append(np.full(len(rows), i))
+        cells.append((rows + int(window.row_off)) * grid.width + cols + int(window.col_off))
+        centers.append(center[rows, cols].astype(bool))
+
+    if not ids:
+        return pd.DataFrame({"id": [], "cell": [], "center": []})
+    return pd.DataFrame(
+        {
+            "id": np.concatenate(ids),
+            "cell": np.concatenate(cells),
+            "center": np.concatenate(centers),
+        }
+    )
+
+
+def screen_pairs(
+    projects: geopandas.GeoSeries,
+    fires: geopandas.GeoSeries,
+    resolution: float = SCREEN_RESOLUTION,
+) -> pd.DataFrame:
+    """Candidate intersecting (project, fire) pairs with approximate overlap
+
+    Arguments:
+        projects {geopandas.GeoSeries} -- project geometries
+        fires {geopandas.GeoSeries} -- fire perimeters, in the same (projected) CRS
+
+    Returns:
+        pd.DataFrame -- `project` and `fire` positions of every pair sharing a touched cell, with
+            `approx_area` (m2, from cells whose centers are in both) and `approx_fraction` of the
+            project's (center cell) area
+    """
+    grid = zonal.Grid.from_bounds(tuple(projects.total_bounds), resolution, projects.crs)
+    project_cells = get_footprints(projects, grid)
+    fire_cells = get_footprints(fires, grid)
+
+    pairs = project_cells.merge(fire_cells, on="cell", suffixes=("_project", "_fire"))
+    pairs["both_centers"] = pairs["center_project"] & pairs["center_fire"]
+    screened = (
+        pairs.groupby(["id_project", "id_fire"])["both_centers"]
+        .sum()
+        .rename("approx_cells")
+        .reset_index()
+        .rename(columns={"id_project": "project", "id_fire": "fire"})
+    )
+
+    cell_area = resolution**2
+    project_area = project_cells.groupby("id")["center"].sum() * cell_area
+    screened["approx_area"] = screened["approx_cells"] * cell_area
+    with np.errstate(invalid="ignore", divide="ignore"):
+        screened["approx_fraction"] = (
+            screened["approx_area"] / screened["project"].map(project_area).to_numpy()
+        )
+    return screened.drop(columns="approx_cells")
@@ -0,0 +1,233 @@
+"""Variance-based (Sobol) global sensitivity of buffer pool shortfall to model parameters
+
+Every uncertain, hardcoded model parameter (fire mortality by RAVG severity class, salvage
+fraction, the merchantable fraction of salvage, whether dead wood counts as lost, tanoak
+mortality, pest and other disturbance buffer rates) is given a range. Parameters are sampled
+jointly with a scrambled Sobol sequence, and first order (`S1`) and total (`ST`) indices are
+estimated with the Saltelli (2010) and Jansen (1999) estimators from N * (d + 2) model
+evaluations for d parameters (Saltelli et al., 2010, doi:10.1016/j.cpc.2009.09.018).
+
+`S1` is the fraction of the variance in an output explained by a parameter alone, `ST` also
+includes its interactions with every other parameter; a parameter with `ST` near zero can be
+fixed anywhere in its range without changing the output.
+
+The model itself, `calculate_shortfall`, is a function of arrays of parameter samples over fixed
+per-event and per-project inputs, so each batch of samples is a handful of (samples, events) and
+(samples, projects) array operations rather than flow runs.
+"""
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+from scipy.stats import qmc
+
+N_SAMPLES = 2**13  # base samples, the model is evaluated N * (d + 2) times
+BATCH_SIZE = 2**14  # model evaluations per batch
+N_BOOTSTRAP = 100
+CONFIDENCE = 0.95
+OUTPUT_QUANTILES = [0.05, 0.5, 0.95]
+
+Bounds = Dict[str, Tuple[float, float]]
+Model = Callable[[Dict[str, np.ndarray]], Dict[str, np.ndarray]]
+
+
+def get_samples(bounds: Bounds, n: int = N_SAMPLES, seed: int = 0) -> Tuple[np.ndarray, ...]:
+    """Saltelli sample matrices
+
+    Arguments:
+        bounds {dict} -- (lower, upper) by parameter name, parameters are uniform in between
+        n {int} -- number of base samples, rounded up to a power of two (as Sobol sequences
+            require for their balance properties)
+
+    Returns:
+        tuple -- A and B (n, d) matrices of independent samples, and AB (d, n, d) where AB[i] is
+            A with column i taken from B
+    """
+    d = len(bounds)
+    lower, upper = np.array(list(bounds.values()), dtype="float64").T
+    sampler = qmc.Sobol(d=2 * d, scramble=True, seed=seed)
+    AB = sampler.random_base2(int(np.ceil(np.log2(n))))
+    A = qmc.scale(AB[:, :d], lower, upper)
+    B = qmc.scale(AB[:, d:], lower, upper)
+
+    ABi = np.repeat(A[np.newaxis], d, axis=0)
+    for i in range(d):
+        ABi[i, :, i] = B[:, i]
+    return A, B, ABi
+
+
+def evaluate(
+    model: Model, names: list, samples: np.ndarray, fixed: dict = None, batch_size: int = BATCH_SIZE
+) -> Dict[str, np.ndarray]:
+    """Evaluate model over rows of samples, batch_size rows at a time
+
+    Arguments:
+        model {callable} -- {name: (rows,) array} to {output: (rows,) array}
+        names {list} -- parameter name of each column of samples
+        fixed {dict} -- values of parameters that aren't sampled
+
+    Returns:
+        dict -- (rows,) array per model output
+    """
+    batches = []
+    for start in range(0, len(samples), batch_size):
+        batch = samples[start : start + batch_size]
+        params = {**(fixed or {}), **dict(zip(names, batch.T))}
+        batches.append(model(params))
+    return {k: np.concatenate([batch[k] for batch in batches]) for k in batches[0]}
+
+
+def estimate_indices(
+    f_A: np.ndarray, f_B: np.ndarray, f_AB: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """First order and total Sobol indices of every parameter
+
+    Arguments:
+        f_A, f_B {np.ndarray} -- (..., n) model output over A and B
+        f_AB {np.ndarray} -- (d, ..., n) model output over each AB[i]
+
+    Returns:
+        tuple -- (S1, ST), each (d, ...), nan where the output doesn't vary
+    """
+    f = np.concatenate([f_A, f_B], axis=-1)
+    variance = np.var(f, axis=-1)
+    # centering doesn't change the indices, but reduces the variance of the S1 estimator a lot
+    # when the output's mean is large relative to its spread (e.g. a shortfall in tCO2)
+    mean = np.mean(f, axis=-1, keepdims=True)
+    f_A, f_B, f_AB = f_A - mean, f_B - mean, f_AB - mean
+    with np.errstate(invalid="ignore", divide="ignore"):
+        variance = np.where(variance > 0, variance, np.nan)
+        first = np.mean(f_B * (f_AB - f_A), axis=-1) / variance
+        total = 0.5 * np.mean((f_A - f_AB) ** 2, axis=-1) / variance
+    return first, total
+
+
+def get_sobol_indices(
+    f_A: np.ndarray,
+    f_B: np.ndarray,
+    f_AB: np.ndarray,
+    names: list,
+    n_bootstrap: int = N_BOOTSTRAP,
+    confidence: float = CONFIDENCE,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """Sobol indices with bootstrap confidence intervals, for one model output
+
+    Returns:
+        pd.DataFrame -- `S1`, `S1_conf`, `ST` and `ST_conf` (confidence interval half widths) by
+            parameter
+    """
+    first, total = estimate_indices(f_A, f_B, f_AB)
+
+    # resample rows (jointly across A, B and AB) and recompute, all resamples at once
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(f_A), size=(n_bootstrap, len(f_A)))
+    first_boot, total_boot = estimate_indices(f_A[rows], f_B[rows], f_AB[:, rows])
+    z = stats.norm.ppf(0.5 + confidence / 2)
+    return pd.DataFrame(
+        {
+            "S1": first,
+            "S1_conf": z * np.nanstd(first_boot, axis=1, ddof=1),
+            "ST": total,
+            "ST_conf": z * np.nanstd(total_boot, axis=1, ddof=1),
+        },
+        index=pd.Index(names, name="parameter"),
+    )
+
+
+def analyze(
+    model: Model,
+    bounds: Bounds,
+    fixed: dict = None,
+    n: int = N_SAMPLES,
+    seed: int = 0,
+    batch_size: int = BATCH_SIZE,
+    n_bootstrap: int = N_BOOTSTRAP,
+) -> Dict[str, pd.DataFrame]:
+    """Global sensitivity of every model output to every parameter in bounds
+
+    Returns:
+        dict -- `indices` by (output, parameter), `outputs`, the distribution of each output
+            (mean, std, OUTPUT_QUANTILES and the probability it's positive) over the parameter
+            space, and `n_evaluations` of the model
+    """
+    names = list(bounds)
+    A, B, AB = get_samples(bounds, n, seed)
+    n = len(A)
+    samples = np.concatenate([A, B, AB.reshape(-1, len(names))])
+    outputs = evaluate(model, names, samples, fixed, batch_size)
+
+    indices, distributions = {}, {}
+    for output, values in outputs.items():
+        f_A, f_B, f_AB = values[:n], values[n : 2 * n], values[2 * n :].reshape(len(names), n)
+        indices[output] = get_sobol_indices(f_A, f_B, f_AB, names, n_bootstrap, seed=seed)
+
+        sampled = values[: 2 * n]  # A and B are independent draws from the parameter space
+        distribution = {"mean": sampled.mean(), "std": sampled.std()}
+        distribution.update({str(q): np.quantile(sampled, q) for q in OUTPUT_QUANTILES})
+        distribution["probability_positive"] = np.mean(sampled > 0)
+        distributions[output] = distribution
+
+    return {
+        "indices": pd.concat(indices, names=["output"]),
+        "outputs": pd.DataFrame(distributions).T.rename_axis("output"),
+        "n_evaluations": len(samples),
+    }
+
+
+def calculate_shortfall(params: Dict[str, np.ndarray], inputs: dict) -> Dict[str, np.ndarray]:
+    """Buffer pool shortfall (losses less contributions, tCO2) for arrays of parameter values
+
+    Fire losses follow `project_reversals` in `area` mode: the burned fraction of each project's
+    onsite carbon times its area weighted mortality, less salvaged wood products, capped at the
+    project's issuance, plus known reversals. Tanoak losses follow `summarize_tanoak`: tanoak
+    biomass times mortality, capped at issuance. Contributions follow
+    `calculate_buffer_contributions`.
+
+    Arguments:
+        params {dict} -- (samples,) array (or scalar) per parameter: `mortality_{class}` for
+            every RAVG severity class in inputs, `salvage_fraction`, `frac_merch_override` (0 uses
+            each project's own merchantable fraction, 1 the registry override), `ifm3_fraction`
+            (fraction of dead wood counted as onsite carbon), `tanoak_mortality`,
+            `pest_buffer_rate` and `other_buffer_rate`
+        inputs {dict} -- fixed inputs, see `calculate_buffer_sensitivity.get_model_inputs`
+
+    Returns:
+        dict -- `fire`, `pest` and `total` shortfall per sample (positive where losses exceed
+            contributions)
+    """
+    n = max(np.size(v) for v in params.values())
+
+    def column(name):
+        return np.broadcast_to(np.asarray(params[name], dtype="float64"), n)[:, np.newaxis]
+
+    # (samples, classes) @ (classes, events)
+    mortality = np.concatenate([column(f"mortality_{c}") for c in inputs["severity_classes"]], 1)
+    weighted_mortality = mortality @ inputs["severity_shares"].T
+
+    onsite = inputs["ifm1"] + column("ifm3_fraction") * inputs["ifm3"]
+    biomass_loss = onsite * inputs["frac_burned"] * weighted_mortality
+
+    frac_merch = inputs["frac_merch"] + column("frac_merch_override") * (
+        inputs["frac_merch_registry"] - inputs["frac_merch"]
+    )
+    salvaged = biomass_loss * column("salvage_fraction") * frac_merch * inputs["storage_frac"]
+    fire_losses = np.minimum(biomass_loss - salvaged, inputs["fire_max_loss"]).sum(axis=1)
+    fire_losses += inputs["known_reversals"]
+
+    tanoak_losses = np.minimum(
+        column("tanoak_mortality") * inputs["tanoak_biomass"], inputs["tanoak_max_loss"]
+    ).sum(axis=1)
+
+    pest_contributions = column("pest_buffer_rate")[:, 0] * inputs["issuance"]
+    other_contributions = column("other_buffer_rate")[:, 0] * inputs["issuance"]
+    return {
+        "fire": fire_losses - inputs["fire_contributions"],
+        "pest": tanoak_losses - pest_contributions,
+        "total": fire_losses
+        + tanoak_losses
+        - inputs["fire_contributions"]
+        - pest_contributions
+        - other_contributions,
+    }
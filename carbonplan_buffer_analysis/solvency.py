@@ -0,0 +1,132 @@
+"""Monte Carlo simulation of buffer pool depletion
+
+Each trajectory draws, for every project and every year, whether the project is disturbed
+(Bernoulli with the project's annual probability) and, if so, what fraction of its credits are lost
+(Beta distributed severity). A project can't lose more than it was issued, so cumulative losses are
+capped per project. The pool is insolvent in the first year cumulative losses exceed it.
+
+Trajectories are simulated in batches of (trajectories, years, projects) arrays sized to fit in a
+memory budget; there are no per-project or per-year Python loops.
+"""
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+SEVERITY_BETA = (2.0, 5.0)  # mean loss of ~30% of credits when a project is disturbed
+MEMORY_BUDGET = 512 * 2**20  # bytes
+# peak traced allocation per (trajectory, year, project) cell in simulate_batch is ~13 bytes
+# when every cell is disturbed (float32 losses + bool events + float64 severity draws), plus ~50%
+# for allocator fragmentation. See test_bytes_per_cell, which measures it.
+BYTES_PER_CELL = 20
+TIME_TO_INSOLVENCY_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+
+def get_batch_size(n_years: int, n_projects: int, memory_budget: int = MEMORY_BUDGET) -> int:
+    """Number of trajectories that can be simulated at once within memory_budget"""
+    return max(1, memory_budget // (n_years * n_projects * BYTES_PER_CELL))
+
+
+def simulate_batch(
+    rng: np.random.Generator,
+    credits: np.ndarray,
+    probabilities: np.ndarray,
+    buffer_pool: float,
+    n_years: int,
+    n_trajectories: int,
+    severity: Tuple[float, float],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Simulate one batch of trajectories
+
+    Returns:
+        tuple -- (insolvency year, 1-indexed and nan if never, remaining pool at horizon)
+    """
+    shape = (n_trajectories, n_years, len(credits))
+    events = rng.random(shape, dtype="float32") < probabilities.astype("float32")
+
+    # disturbances are rare, so only draw severities where they happened
+    losses = np.zeros(shape, dtype="float32")
+    losses[events] = rng.beta(*severity, size=events.sum())
+    losses *= credits.astype("float32")
+
+    cumulative = np.minimum(np.cumsum(losses, axis=1), credits.astype("float32"))
+    pool = buffer_pool - cumulative.sum(axis=2, dtype="float64")  # (trajectories, years)
+
+    insolvent = pool < 0
+    insolvency_year = np.where(insolvent.any(axis=1), insolvent.argmax(axis=1) + 1.0, np.nan)
+    return insolvency_year, pool[:, -1]
+
+
+def simulate_pool(
+    credits: Iterable[float],
+    probabilities: Iterable[float],
+    buffer_pool: float,
+    n_years: int = 100,
+    n_trajectories: int = 10_000,
+    severity: Tuple[float, float] = SEVERITY_BETA,
+    seed: int = 0,
+    memory_budget: int = MEMORY_BUDGET,
+) -> Dict[str, np.ndarray]:
+    """Simulate buffer pool depletion over n_years for n_trajectories
+
+    Arguments:
+        credits {array-like} -- credits issued per project
+        probabilities {array-like} -- annual disturbance probability per project
+        buffer_pool {float} -- credits in the buffer pool at the start of the simulation
+        n_years {int} -- simulation horizon
+        n_trajectories {int} -- number of simulated trajectories
+        severity {tuple} -- Beta distribution (a, b) of the fraction of credits lost per event
+        seed {int} -- random seed
+        memory_budget {int} -- approximate bytes to use per batch of trajectories
+
+    Returns:
+        dict -- `insolvency_year` (nan if the pool survives the horizon) and `final_pool` per
+            trajectory
+    """
+    credits = np.asarray(credits, dtype="float64")
+    probabilities = np.asarray(probabilities, dtype="float64")
+    batch_size = get_batch_size(n_years, len(credits), memory_budget)
+
+    n_batches = -(-n_trajectories // batch_size)
+    rngs = [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(n_batches)]
+    batches = [
+        simulate_batch(
+            rng,
+            credits,
+            probabilities,
+            buffer_pool,
+            n_years,
+            min(batch_size, n_trajectories - i * batch_size),
+            severity,
+        )
+        for i, rng in enumerate(rngs)
+    ]
+    return {
+        "insolvency_year": np.concatenate([batch[0] for batch in batches]),
+        "final_pool": np.concatenate([batch[1] for batch in batches]),
+    }
+
+
+def summarize_simulation(
+    simulation: Dict[str, np.ndarray], quantiles: Iterable[float] = TIME_TO_INSOLVENCY_QUANTILES
+) -> dict:
+    """Insolvency probability and quantiles of time to insolvency and final pool size
+
+    Time to insolvency quantiles are None where at least that fraction of trajectories stayed
+    solvent over the whole horizon.
+    """
+    insolvency_year = simulation["insolvency_year"]
+    # inverted cdf quantiles, so trajectories that never go insolvent (inf) don't interpolate
+    years = np.sort(np.where(np.isnan(insolvency_year), np.inf, insolvency_year))
+    ranks = np.ceil(np.asarray(quantiles) * len(years)).astype(int) - 1
+    time_to_insolvency = years[np.clip(ranks, 0, len(years) - 1)]
+    return {
+        "insolvency_probability": float(np.mean(~np.isnan(insolvency_year))),
+        "time_to_insolvency": {
+            str(q): (float(t) if np.isfinite(t) else None)
+            for q, t in zip(quantiles, time_to_insolvency)
+        },
+        "final_pool": {
+            str(q): float(v)
+            for q, v in zip(quantiles, np.quantile(simulation["final_pool"], quantiles))
+        },
+    }
@@ -0,0 +1,161 @@
+"""Local analytical store over pipeline intermediates and outputs
+
+`sync` pulls every intermediate and output the flows write to cloud storage into local Parquet
+files, one per table, and registers each as a view in an embedded DuckDB database. Ad hoc analyses
+across projects and scenarios are then SQL queries (columnar scans of local files) instead of
+globbing and reloading JSON from the bucket:
+
+    from carbonplan_buffer_analysis import store
+
+    store.query("select severity, salvage, sum(biomass_loss) from reversals group by 1, 2")
+"""
+from typing import Callable, Dict
+
+import duckdb
+import pandas as pd
+
+from carbonplan_buffer_analysis import profiling, project_tables, storage, utils
+
+BUCKET = "gs://carbonplan-buffer-analysis"
+STORE_DIR = utils.LOCAL_CACHE / "store"
+DATABASE = STORE_DIR / "buffer-analysis.duckdb"
+
+
+def read_csv(path: str) -> pd.DataFrame:
+    with profiling.open_file(path, "r") as f:
+        return pd.read_csv(f)
+
+
+def load_reversals() -> pd.DataFrame:
+    records = [
+        *storage.read_json_glob(f"{BUCKET}/outputs/reversals/*.json").values(),
+        *storage.read_json_glob(f"{BUCKET}/outputs/reversals-*/*.json").values(),
+    ]
+    if not records:
+        raise FileNotFoundError("no reversal estimates")
+    df = pd.DataFrame(records)
+    if "loss_mode" not in df:
+        df["loss_mode"] = "area"
+    df["loss_mode"] = df["loss_mode"].fillna("area")
+    df["includes_ifm_3"] = project_tables.to_bool(df["includes_ifm_3"])
+    return df
+
+
+def load_ravg_summaries() -> pd.DataFrame:
+    summaries = storage.read_json_glob(f"{BUCKET}/intermediates/ravg/*.json")
+    if not summaries:
+        raise FileNotFoundError("no RAVG summaries")
+    rows = []
+    for path, summary in summaries.items():
+        fire_name = path.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+        pixel_loss = summary.get("pixel_loss", {})
+        for ba7_class, acres in summary["counts"].items():
+            rows.append(
+                {
+                    "fire_name": fire_name,
+                    "ba7_class": int(float(ba7_class)),
+                    "acres": acres,
+                    "low": summary["low"],
+                    "high": summary["high"],
+                    "pixel_loss_low": pixel_loss.get("low"),
+                    "pixel_loss_high": pixel_loss.get("high"),
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+def load_tanoak_summary() -> pd.DataFrame:
+    d = storage.read_json(f"{BUCKET}/outputs/tanoak-summary.json")
+    return pd.DataFrame(
+        [
+            {"scenario": scenario, "bound": bound, "loss": loss}
+            for scenario, bounds in d.items()
+            for bound, loss in bounds.items()
+        ]
+    )
+
+
+def load_buffer_contributions() -> pd.DataFrame:
+    return pd.DataFrame([storage.read_json(f"{BUCKET}/outputs/buffer_contributions.json")])
+
+
+def load_fire_summary() -> pd.DataFrame:
+    return pd.DataFrame([storage.read_json(f"{BUCKET}/outputs/fire-summary.json")])
+
+
+def load_sod_distances() -> pd.DataFrame:
+    d = storage.read_json(f"{BUCKET}/outputs/distance-to-sod-blitz.json")
+    return pd.DataFrame({"opr_id": list(d), "distance_km": list(d.values())})
+
+
+def load_fire_intersections() -> pd.DataFrame:
+    with profiling.open_file(f"{BUCKET}/intermediates/project-fire-intersections.parquet") as f:
+        return pd.read_parquet(f)
+
+
+TABLES: Dict[str, Callable[[], pd.DataFrame]] = {
+    "reversals": load_reversals,
+    "ravg_summaries": load_ravg_summaries,
+    "tanoak_summary": load_tanoak_summary,
+    "buffer_contributions": load_buffer_contributions,
+    "fire_summary": load_fire_summary,
+    "sod_distances": load_sod_distances,
+    "pest_exposure": lambda: read_csv(f"{BUCKET}/intermediates/pest-exposure.csv"),
+    "burn_probability": lambda: read_csv(f"{BUCKET}/intermediates/burn-probability.csv"),
+    "project_climate": lambda: read_csv(f"{BUCKET}/intermediates/project-climate.csv"),
+    "tanoak_zonal": lambda: read_csv(f"{BUCKET}/intermediates/tanoak-lemma-zonal.csv"),
+    "buffer_timeseries": lambda: read_csv(f"{BUCKET}/outputs/buffer_contributions_timeseries.csv"),
+    "fire_intersections": load_fire_intersections,
+    "sod_distance_stats": lambda: read_csv(f"{BUCKET}/intermediates/sod-distance.csv"),
+    "buffer_sensitivity": lambda: read_csv(f"{BUCKET}/intermediates/buffer-sensitivity.csv"),
+}
+
+
+def connect(read_only: bool = False) -> duckdb.DuckDBPyConnection:
+    STORE_DIR.mkdir(parents=True, exist_ok=True)
+    return duckdb.connect(str(DATABASE), read_only=read_only)
+
+
+def register(con: duckdb.DuckDBPyConnection, name: str, df: pd.DataFrame) -> None:
+    """Write a table to Parquet and (re)create a view over it"""
+    path = STORE_DIR / f"{name}.parquet"
+    df.to_parquet(path, index=False)
+    con.execute(f"create or replace view {name} as select * from read_parquet('{path}')")
+
+
+def sync(tables: list = None) -> dict:
+    """Pull intermediates and outputs into the local store
+
+    Tables whose source doesn't exist yet (e.g. a flow that hasn't been run) are skipped.
+
+    Arguments:
+        tables {list} -- table names to sync, defaults to all of TABLES
+
+    Returns:
+        dict -- number of rows per synced table
+    """
+    synced = {}
+    con = connect()
+    try:
+        for name in tables or TABLES:
+            try:
+                with profiling.span(f"sync_{name}"):
+                    df = TABLES[name]()
+            except FileNotFoundError:
+                continue
+            register(con, name, df)
+            synced[name] = len(df)
+    finally:
+        con.close()
+    return synced
+
+
+def query(sql: str) -> pd.DataFrame:
+    """Run SQL against the local store"""
+    if not DATABASE.exists():
+        raise FileNotFoundError(f"no local store at {DATABASE}, run store-sync first")
+    con = connect(read_only=True)
+    try:
+        return con.execute(sql).df()
+    finally:
+        con.close()
@@ -1,22 +1,95 @@
+import hashlib
 import json
+import os
+import shutil
+from pathlib import Path
 
-import fsspec
 import geopandas
 import pandas as pd
 
+from carbonplan_buffer_analysis import profiling, storage
+
+# local scratch space for derived, rebuildable data (aligned rasters, indexes, manifests)
+LOCAL_CACHE = Path(
+    os.environ.get("BUFFER_ANALYSIS_CACHE", Path.home() / ".cache" / "carbonplan-buffer-analysis")
+)
+
+
+# object metadata that changes when an object is overwritten (keys vary by filesystem)
+VERSION_KEYS = [
+    "size",
+    "mtime",
+    "updated",
+    "LastModified",
+    "Last-Modified",
+    "etag",
+    "ETag",
+    "generation",
+]
+
+
+def get_version(urlpath: str) -> dict:
+    """Metadata identifying the current version of a remote object, for validating caches"""
+    info = storage.info(urlpath)
+    return {k: str(info[k]) for k in VERSION_KEYS if k in info}
+
+
+def get_local_copy(urlpath: str) -> Path:
+    """Path to a local copy of an input, downloaded into the local cache on first use
+
+    For readers that need a real file (e.g. GDAL based ones) rather than a file-like object.
+    Copies are keyed on the full urlpath, and downloaded again if the remote object's size,
+    modification time or etag no longer match the ones recorded alongside the copy.
+    """
+    if "://" not in urlpath:
+        return Path(urlpath)
+    key = hashlib.sha256(urlpath.encode()).hexdigest()[:16]
+    # keep the file name, GDAL picks drivers by extension
+    path = LOCAL_CACHE / "inputs" / key / urlpath.rsplit("/", 1)[-1]
+    version_path = path.with_name(path.name + ".version.json")
+
+    version = get_version(urlpath)
+    if path.exists() and version_path.exists() and json.loads(version_path.read_text()) == version:
+        return path
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".partial")
+    with profiling.open_file(urlpath) as src, open(tmp, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    tmp.replace(path)
+    version_path.write_text(json.dumps(version))
+    return path
+
+
+PROJECT_GEOMETRY = "gs://carbonplan-forest-offsets/carb-geometries/raw/{opr_id}.json"
+
 
 def load_project_geometry(opr_id: str) -> geopandas.GeoDataFrame:
     """Load project geojson"""
 
     # using fsspec/from_features because geopandas.read_file silently fails on large geojson
-    with fsspec.open(f"gs://carbonplan-forest-offsets/carb-geometries/raw/{opr_id}.json") as f:
-        d = json.load(f)
+    d = storage.read_json(PROJECT_GEOMETRY.format(opr_id=opr_id))
 
     gdf = geopandas.GeoDataFrame.from_features(d)
     gdf = gdf.set_crs("epsg:4326")
     return gdf
 
 
+def load_project_geometries(opr_ids: list, crs: str) -> geopandas.GeoDataFrame:
+    """Load many project geometries as one (valid) polygon per project, indexed by opr_id
+
+    The geojson files are fetched concurrently, in one batch.
+    """
+    urlpaths = [PROJECT_GEOMETRY.format(opr_id=opr_id) for opr_id in opr_ids]
+    features = storage.read_json_many(urlpaths)
+    gdfs = []
+    for opr_id, urlpath in zip(opr_ids, urlpaths):
+        gdf = geopandas.GeoDataFrame.from_features(features[urlpath]).set_crs("epsg:4326")
+        geometry = gdf.to_crs(crs).buffer(0).unary_union
+        gdfs.append(geopandas.GeoDataFrame({"opr_id": [opr_id]}, geometry=[geometry], crs=crs))
+    return pd.concat(gdfs).set_index("opr_id")
+
+
 def get_project_centroid(gdf: geopandas.GeoDataFrame) -> tuple:
     """return project centroid in lat/lon space"""
     c = gdf.to_crs("epsg:5070").centroid.to_crs("epsg:4326").item().coords.xy
@@ -29,7 +102,7 @@ def load_sod_blitz() -> geopandas.GeoDataFrame:
     def is_positive(x):
         return x == "positive"
 
-    with fsspec.open("gs://carbonplan-buffer-analysis/inputs/sod-blitz.csv", "r") as f:
+    with profiling.open_file("gs://carbonplan-buffer-analysis/inputs/sod-blitz.csv", "r") as f:
         lines = f.readlines()
 
     obs = [
@@ -0,0 +1,215 @@
+"""Streaming zonal statistics for every project on a common grid
+
+Rather than clipping a raster once per project, all project polygons are rasterized onto a single
+label grid (0 is background, `i + 1` is the i-th project) and values are reduced per label with
+`np.bincount`. Overlapping projects can't share one label grid, so they are rasterized onto
+additional layers of it, one per set of mutually non-overlapping projects. Both steps run one block
+of rows at a time, so memory use is bounded by the block size, not the size of the grid, and the
+cost of a registry wide pass is roughly that of reading the raster once.
+"""
+from dataclasses import dataclass
+from typing import Iterator, Tuple
+
+import geopandas
+import numpy as np
+from rasterio import features
+from rasterio.transform import Affine, from_origin
+from rasterio.windows import Window
+from shapely.geometry import box
+
+BLOCK_ROWS = 1024
+
+
+@dataclass
+class Grid:
+    transform: Affine
+    height: int
+    width: int
+    crs: str
+
+    @classmethod
+    def from_bounds(cls, bounds: Tuple[float, float, float, float], resolution: float, crs: str):
+        """Grid covering (minx, miny, maxx, maxy), snapped to multiples of resolution"""
+        minx, miny, maxx, maxy = bounds
+        minx, miny = (np.floor(v / resolution) * resolution for v in (minx, miny))
+        maxx, maxy = (np.ceil(v / resolution) * resolution for v in (maxx, maxy))
+        return cls(
+            transform=from_origin(minx, maxy, resolution, resolution),
+            height=int(round((maxy - miny) / resolution)),
+            width=int(round((maxx - minx) / resolution)),
+            crs=crs,
+        )
+
+    @classmethod
+    def from_raster(cls, src):
+        """Native grid of an open rasterio dataset"""
+        return cls(transform=src.transform, height=src.height, width=src.width, crs=src.crs)
+
+    @property
+    def resolution(self) -> float:
+        return self.transform.a
+
+    def windows(self, block_rows: int = BLOCK_ROWS) -> Iterator[Window]:
+        """Full width windows of (at most) block_rows rows"""
+        for row in range(0, self.height, block_rows):
+            yield Window(0, row, self.width, min(block_rows, self.height - row))
+
+    def intersecting_windows(
+        self, geometries: geopandas.GeoSeries, block_rows: int = BLOCK_ROWS
+    ) -> Iterator[Window]:
+        """Windows that intersect at least one geometry, so empty parts of the grid aren't read"""
+        for window in self.windows(block_rows):
+            if len(geometries.sindex.query(box(*self.window_bounds(window)))):
+                yield window
+
+    def window_bounds(self, window: Window) -> Tuple[float, float, float, float]:
+        transform = self.window_transform(window)
+        return (
+            transform.c,
+            transform.f - window.height * self.resolution,
+            transform.c + window.width * self.resolution,
+            transform.f,
+        )
+
+    def window_transform(self, window: Window) -> Affine:
+        return self.transform * Affine.translation(window.col_off, window.row_off)
+
+
+def get_label_layers(geometries: geopandas.GeoSeries) -> np.ndarray:
+    """Layer of every geometry, such that no two geometries on a layer overlap
+
+    Geometries that only touch (share a boundary) don't overlap. Layers are assigned greedily, in
+    order, so without overlaps every geometry is on layer 0.
+    """
+    layers = np.zeros(len(geometries), dtype=int)
+    sindex = geometries.sindex
+    for i, geometry in enumerate(geometries):
+        overlapping = [
+            j
+            for j in sindex.query(geometry, predicate="intersects")
+            if j < i and not geometry.touches(geometries.iloc[j])
+        ]
+        taken = set(layers[overlapping])
+        layers[i] = next(layer for layer in range(len(taken) + 1) if layer not in taken)
+    return layers
+
+
+def rasterize_labels(
+    geometries: geopandas.GeoSeries,
+    grid: Grid,
+    window: Window,
+    all_touched: bool = False,
+) -> np.ndarray:
+    """Rasterize geometries to labels (position + 1, 0 for none) within a window of grid
+
+    Only geometries intersecting the window are burned in. Overlapping geometries are burned into
+    separate layers (see `get_label_layers`), so every geometry keeps all of its pixels.
+
+    Returns:
+        np.ndarray -- (layers, rows, cols) labels, with a single layer if nothing overlaps
+    """
+    shape = (int(window.height), int(window.width))
+    candidates = geometries.sindex.query(box(*grid.window_bounds(window)))
+    if not len(candidates):
+        return np.zeros((1, *shape), dtype="int32")
+
+    candidate_geometries = geometries.iloc[candidates]
+    layers = get_label_layers(candidate_geometries)
+    labels = np.zeros((layers.max() + 1, *shape), dtype="int32")
+    for layer, out in enumerate(labels):
+        on_layer = layers == layer
+        features.rasterize(
+            zip(candidate_geometries[on_layer], candidates[on_layer] + 1),
+            out=out,
+            transform=grid.window_transform(window),
+            all_touched=all_touched,
+        )
+    return labels
+
+
+def rasterize_mask(
+    geometries: geopandas.GeoSeries, grid: Grid, window: Window, all_touched: bool = False
+) -> np.ndarray:
+    """Boolean footprint of the union of geometries within a window of grid"""
+    return (rasterize_labels(geometries, grid, window, all_touched=all_touched) > 0).any(axis=0)
+
+
+def zonal_sums(
+    labels: np.ndarray, values: np.ndarray, n_labels: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Per label sum of values and count of valid (non-nan) pixels
+
+    Arguments:
+        labels {np.ndarray} -- output of `rasterize_labels`
+        values {np.ndarray} -- values on the same grid as labels (broadcast across label layers)
+        n_labels {int} -- number of geometries, output arrays have n_labels + 1 entries with
+            background at index 0
+
+    Returns:
+        tuple -- (sums, counts) arrays indexed by label
+    """
+    values = np.broadcast_to(np.asarray(values, dtype="float64"), labels.shape).ravel()
+    labels = labels.ravel()
+    valid = ~np.isnan(values)
+    sums = np.bincount(labels[valid], weights=values[valid], minlength=n_labels + 1)
+    counts = np.bincount(labels[valid], minlength=n_labels + 1)
+    return sums, counts
+
+
+def zonal_mins(labels: np.ndarray, values: np.ndarray, n_labels: int) -> np.ndarray:
+    """Per label minimum of values (inf for labels without valid pixels), indexed by label"""
+    values = np.broadcast_to(np.asarray(values, dtype="float64"), labels.shape).ravel()
+    labels = labels.ravel()
+    valid = ~np.isnan(values)
+    mins = np.full(n_labels + 1, np.inf)
+    np.minimum.at(mins, labels[valid], values[valid])
+    return mins
+
+
+def coverage_sums(
+    geometries: geopandas.GeoSeries,
+    grid: Grid,
+    window: Window,
+    values: np.ndarray,
+    weights: np.ndarray = None,
+    supersample: int = 10,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Per geometry sums of coverage (and optionally otherwise) weighted values on a coarse grid
+
+    Each coarse cell is weighted by the fraction of it covered by a geometry, estimated by
+    rasterizing geometries on a grid `supersample` times finer, so small projects on e.g. a 4 km
+    climate grid still get a sensible area weighted mean instead of one (or no) cell.
+
+    Arguments:
+        values {np.ndarray} -- coarse values within window, nan where missing
+        weights {np.ndarray} -- optional additional coarse weights within window (e.g. tanoak cover)
+
+    Returns:
+        tuple -- (sum of weight * value, sum of weight) arrays indexed by label
+    """
+    n_labels = len(geometries)
+    fine = Grid(
+        transform=grid.window_transform(window) * Affine.scale(1 / supersample),
+        height=int(window.height) * supersample,
+        width=int(window.width) * supersample,
+        crs=grid.crs,
+    )
+    labels = rasterize_labels(geometries, fine, Window(0, 0, fine.width, fine.height))
+    n_layers = len(labels)
+    labels = labels.ravel()
+
+    if weights is None:
+        weights = np.ones_like(values, dtype="float64")
+    weights = np.where(np.isnan(values), 0, weights) / supersample**2
+    values = np.nan_to_num(values)
+
+    def upsample(a):
+        # repeated for every label layer
+        fine_a = np.repeat(np.repeat(a, supersample, axis=0), supersample, axis=1).ravel()
+        return np.tile(fine_a, n_layers)
+
+    fine_weights = upsample(weights)
+    return (
+        np.bincount(labels, weights=fine_weights * upsample(values), minlength=n_labels + 1),
+        np.bincount(labels, weights=fine_weights, minlength=n_labels + 1),
+    )
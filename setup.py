@@ -26,6 +26,9 @@ setup(
     include_package_data=True,
     python_requires=PYTHON_REQUIRES,
     install_requires=INSTALL_REQUIRES,
+    entry_points={
+        "console_scripts": ["carbonplan-buffer-analysis=carbonplan_buffer_analysis.cli:main"]
+    },
     tests_require=["pytest"],
     license="MIT",
     keywords="carbon, data, forest offsets",
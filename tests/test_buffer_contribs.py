@@ -1,3 +1,6 @@
+import pandas as pd
+import pytest
+
 from carbonplan_buffer_analysis.prefect.flows import calculate_buffer_contributions
 
 
@@ -8,3 +11,44 @@ def test_all_projects():
     fire_risks = calculate_buffer_contributions.load_project_fire_risks.run()
     for forest_project in forest_projects:
         assert forest_project in fire_risks
+
+
+def test_contributions_timeseries():
+    issuance = pd.DataFrame(
+        {
+            "opr_id": ["A", "B", "A", "C", "B"],
+            "project_type": ["forest", "forest", "forest", "livestock", "forest"],
+            "issued_at": pd.to_datetime(
+                ["2015-01-01", "2016-06-01", "2018-03-01", "2018-03-01", "2020-01-01"]
+            ),
+            "allocation": [100.0, 200.0, 50.0, 1000.0, None],  # B's last row is a reversal
+            "buffer_pool": [20.0, 40.0, 10.0, None, None],
+        }
+    )
+    fire_risks = {"A": 0.02, "B": 0.04}
+    timeseries = calculate_buffer_contributions.get_contributions_timeseries(issuance, fire_risks)
+
+    assert timeseries.index.is_monotonic_increasing
+    assert timeseries["gross_buffer"].tolist() == [20, 60, 70, 70]
+    assert timeseries["fire_contributions"].round(6).tolist() == [2, 10, 11, 11]
+    assert timeseries["pest_contributions"].iloc[-1] == 350 * 0.03
+
+    as_of = calculate_buffer_contributions.get_contributions_as_of(
+        timeseries, ["2010-01-01", "2017-01-01", "2018-03-01"]
+    )
+    assert as_of["gross_buffer"].tolist() == [0, 60, 70]
+
+
+def test_contributions_timeseries_missing_fire_risk():
+    issuance = pd.DataFrame(
+        {
+            "opr_id": ["A", "B", "C"],
+            "project_type": ["forest", "forest", "livestock"],
+            "issued_at": pd.to_datetime(["2015-01-01", "2016-06-01", "2018-03-01"]),
+            "allocation": [100.0, 200.0, 1000.0],
+            "buffer_pool": [20.0, 40.0, None],
+        }
+    )
+    # non-forest projects don't need a fire risk
+    with pytest.raises(KeyError, match="'B'"):
+        calculate_buffer_contributions.get_contributions_timeseries(issuance, {"A": 0.02})
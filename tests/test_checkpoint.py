@@ -0,0 +1,24 @@
+from carbonplan_buffer_analysis.checkpoint import Manifest
+
+
+def test_resume(tmp_path):
+    manifest = Manifest("run", directory=tmp_path)
+    manifest.record("distance", "ACR260", result=1.5)
+    manifest.record("reversal", "ACR260", params={"severity": "low"})
+    with open(manifest.path, "a") as f:
+        f.write('{"key": "trunc')  # killed mid-write
+
+    resumed = Manifest("run", directory=tmp_path)
+    assert len(resumed) == 2
+    assert resumed.is_done("distance", "ACR260")
+    assert resumed.get("distance", "ACR260") == 1.5
+    assert resumed.is_done("reversal", "ACR260", {"severity": "low"})
+    assert not resumed.is_done("reversal", "ACR260", {"severity": "high"})
+    assert resumed.results("distance") == {"ACR260": 1.5}
+
+    # appending after a truncated line doesn't corrupt the new record
+    resumed.record("distance", "CAR1102", result=2.0)
+    assert Manifest("run", directory=tmp_path).get("distance", "CAR1102") == 2.0
+
+    resumed.clear()
+    assert len(Manifest("run", directory=tmp_path)) == 0
@@ -0,0 +1,55 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from carbonplan_buffer_analysis import cli
+
+IMPORT_TIME_BUDGET = 0.5  # seconds, generous for slow CI machines
+HEAVY_MODULES = [
+    "carbonplan_forest_offsets",
+    "geopandas",
+    "matplotlib",
+    "prefect",
+    "rioxarray",
+    "xarray",
+]
+
+
+def test_import_time_budget():
+    """importing the CLI must not pull in any heavy dependency"""
+    code = (
+        "import sys, time, json; t = time.perf_counter(); "
+        "import carbonplan_buffer_analysis.cli; "
+        "print(json.dumps([time.perf_counter() - t, sorted(sys.modules)]))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, check=True, text=True)
+    elapsed, modules = json.loads(out.stdout)
+    assert elapsed < IMPORT_TIME_BUDGET
+    for heavy in HEAVY_MODULES:
+        assert heavy not in modules
+
+
+def test_summary(tmp_path, capsys):
+    outputs = {
+        "buffer_contributions.json": {"gross_buffer": 100, "fire_contributions": 10},
+        "fire-summary.json": {"minimum": 1, "maximum": 2},
+        "tanoak-summary.json": {"bay": {"minimum": 3, "maximum": 4}},
+    }
+    for fn, d in outputs.items():
+        (tmp_path / fn).write_text(json.dumps(d))
+
+    cli.main(["summary", "--outputs-dir", str(tmp_path)])
+    out = capsys.readouterr().out
+    assert "bay.maximum" in out
+    assert "fire_contributions" in out
+
+
+def test_subcommands():
+    parser = cli.get_parser()
+    for command in [*cli.FLOWS, *cli.FIGURES, *cli.SCRIPTS]:
+        args = parser.parse_args([command])
+        assert args.func is cli.run_module
+    with pytest.raises(SystemExit):
+        parser.parse_args([])
@@ -0,0 +1,38 @@
+from carbonplan_buffer_analysis import cluster
+
+
+def test_get_cluster_options(monkeypatch):
+    monkeypatch.setenv(cluster.WORKERS_ENV, "3")
+    monkeypatch.setenv(cluster.MEMORY_LIMIT_ENV, "4GB")
+    options = cluster.get_cluster_options()
+    assert options["n_workers"] == 3
+    assert options["memory_limit"] == "4GB"
+
+    # arguments win over the environment
+    options = cluster.get_cluster_options(workers=2, memory_limit="1GB")
+    assert options["n_workers"] == 2
+    assert options["memory_limit"] == "1GB"
+
+    monkeypatch.delenv(cluster.WORKERS_ENV)
+    monkeypatch.delenv(cluster.MEMORY_LIMIT_ENV)
+    options = cluster.get_cluster_options()
+    assert options["n_workers"] >= 1
+    assert options["memory_limit"] == "auto"
+
+
+def test_local_cluster_disabled(monkeypatch):
+    monkeypatch.delenv(cluster.CLUSTER_ENV, raising=False)
+    with cluster.local_cluster("test") as client:
+        assert client is None
+        assert cluster.get_client() is None
+
+
+def test_local_cluster(tmp_path, monkeypatch):
+    monkeypatch.setattr(cluster, "SPILL_DIR", tmp_path / "spill")
+    with cluster.local_cluster("test", enabled=True, workers=1, report_dir=str(tmp_path)) as client:
+        assert cluster.get_client() is client
+        assert client.submit(sum, [1, 2]).result() == 3
+        with cluster.local_cluster("nested", enabled=True) as nested:
+            assert nested is client
+    assert cluster.get_client() is None
+    assert (tmp_path / "test-dask-report.html").exists()
@@ -0,0 +1,86 @@
+import pandas as pd
+import pytest
+
+from carbonplan_buffer_analysis.prefect.flows.calculate_fia_biomass import (
+    RFIA_OUTPUTS,
+    summarize_plots,
+    summarize_state,
+)
+
+
+def test_summarize_plots():
+    plots = pd.DataFrame(
+        {
+            "CN": ["1", "2"],
+            "STATECD": [6, 6],
+            "UNITCD": [1, 1],
+            "COUNTYCD": [23, 23],
+            "PLOT": [100, 101],
+            "MEASYEAR": [2015, 2016],
+        }
+    )
+    trees = pd.DataFrame(
+        {
+            "PLT_CN": ["1", "1", "1", "2"],
+            "CONDID": [1, 1, 1, 1],
+            "STATUSCD": [1, 1, 2, 1],  # third tree is dead
+            "SPCD": [631, 202, 631, 202],
+            "DIA": [10.0, 20.0, 30.0, 10.0],
+            "TPA_UNADJ": [6.0, 6.0, 6.0, 6.0],
+            "DRYBIO_AG": [1000.0, 2000.0, 3000.0, 1000.0],
+        }
+    )
+    conds = pd.DataFrame({"PLT_CN": ["1", "2"], "CONDID": [1, 1], "COND_STATUS_CD": [1, 1]})
+    summaries = summarize_plots(plots, trees, conds)
+
+    plot = summaries["plot"].loc[("1_6_23_100", 2015)]
+    assert plot["TPA"] == 12
+    assert plot["BIO_ACRE"] == pytest.approx((1000 + 2000) * 6 / 2000)
+    assert plot["BAA"] == pytest.approx(0.005454154 * (10**2 + 20**2) * 6)
+
+    tanoak = summaries["plot_species"].loc[("1_6_23_100", 2015, 631)]
+    assert tanoak["BAA"] / plot["BAA"] == pytest.approx(100 / 500)
+    assert len(summaries["plot"]) == 2
+
+
+def test_summarize_plots_forest_conditions_only():
+    plots = pd.DataFrame(
+        {
+            "CN": ["1"],
+            "STATECD": [6],
+            "UNITCD": [1],
+            "COUNTYCD": [23],
+            "PLOT": [100],
+            "MEASYEAR": [2015],
+        }
+    )
+    trees = pd.DataFrame(
+        {
+            "PLT_CN": ["1", "1"],
+            "CONDID": [1, 2],  # second tree is on a nonforest condition
+            "STATUSCD": [1, 1],
+            "SPCD": [631, 202],
+            "DIA": [10.0, 20.0],
+            "TPA_UNADJ": [6.0, 6.0],
+            "DRYBIO_AG": [1000.0, 2000.0],
+        }
+    )
+    conds = pd.DataFrame({"PLT_CN": ["1", "1"], "CONDID": [1, 2], "COND_STATUS_CD": [1, 2]})
+    summaries = summarize_plots(plots, trees, conds)
+
+    plot = summaries["plot"].loc[("1_6_23_100", 2015)]
+    assert plot["TPA"] == 6
+    assert plot["BIO_ACRE"] == pytest.approx(1000 * 6 / 2000)
+    assert list(summaries["plot_species"].index.get_level_values("SPCD")) == [631]
+
+
+def test_summaries_match_rfia():
+    summaries = summarize_state.run("CA")
+
+    # a handful of plots spread through the rFIA-generated outputs
+    for fn, metrics in [("plot_tpa.csv", ["TPA", "BAA"]), ("plot_biomass.csv", ["BIO_ACRE"])]:
+        expected = pd.read_csv(f"{RFIA_OUTPUTS}/{fn}").set_index(["pltID", "YEAR"])[metrics]
+        expected = expected[expected[metrics[0]] > 0]
+        expected = expected.iloc[:: len(expected) // 5][:5]
+        actual = summaries["plot"].loc[expected.index, metrics]
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False, rtol=1e-3)
@@ -0,0 +1,52 @@
+import json
+import sys
+
+from carbonplan_buffer_analysis.analysis import figures
+
+FIGURE_MODULE = '''
+import matplotlib.pyplot as plt
+
+NAME = "test-bars"
+INPUTS = ["fire-summary.json"]
+THEME = False
+
+
+def plot(outputs):
+    fig, ax = plt.subplots()
+    ax.barh([0, 1], list(outputs["fire-summary.json"].values()))
+    return fig
+'''
+
+
+def test_build_skips_unchanged(tmp_path, monkeypatch):
+    (tmp_path / "test_figure_module.py").write_text(FIGURE_MODULE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    outputs = tmp_path / "fire-summary.json"
+    outputs.write_text(json.dumps({"minimum": 1, "maximum": 2}))
+    img_dir = tmp_path / "img"
+    img_dir.mkdir()
+
+    def build():
+        return figures.build(["test_figure_module"], str(tmp_path), img_dir=img_dir, jobs=2)
+
+    assert len(build()) == 2
+    assert (img_dir / "test-bars.pdf").exists() and (img_dir / "test-bars.svg").exists()
+    assert build() == []
+
+    outputs.write_text(json.dumps({"minimum": 1, "maximum": 3}))
+    assert len(build()) == 2
+    sys.modules.pop("test_figure_module", None)
+
+
+def test_figure_hash_includes_shared_source(tmp_path, monkeypatch):
+    (tmp_path / "test_hash_module.py").write_text(FIGURE_MODULE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = __import__("test_hash_module")
+    outputs = {"fire-summary.json": {"minimum": 1, "maximum": 2}}
+    before = figures.get_figure_hash(module, outputs)
+
+    style = tmp_path / "style.py"
+    style.write_text("# a changed style\n")
+    monkeypatch.setattr(figures, "SHARED_SOURCES", [style, *figures.SHARED_SOURCES[1:]])
+    assert figures.get_figure_hash(module, outputs) != before
+    sys.modules.pop("test_hash_module", None)
@@ -0,0 +1,71 @@
+import geopandas
+import pandas as pd
+from shapely.geometry import box
+
+from carbonplan_buffer_analysis import intersections
+from carbonplan_buffer_analysis.prefect.flows.calculate_fire_intersections import (
+    get_intersections,
+)
+from carbonplan_buffer_analysis.prefect.tasks.project_reversals import CRS, M2_TO_ACRE
+
+
+def test_get_intersections():
+    projects = geopandas.GeoDataFrame(
+        {"opr_id": ["A", "B"]}, geometry=[box(0, 0, 100, 100), box(500, 500, 600, 600)], crs=CRS
+    ).set_index("opr_id")
+    fires = geopandas.GeoDataFrame(
+        {
+            "fire_id": ["mtbs-0", "mtbs-1", "nifc-0"],
+            "name": ["ROUTE COMPLEX", "TOUCHING", "ELSEWHERE"],
+            "ignite_at": pd.to_datetime(["2021-08-01", "2020-01-01", "2019-01-01"]),
+        },
+        geometry=[box(50, 0, 150, 100), box(100, 0, 200, 100), box(1000, 1000, 1100, 1100)],
+        crs=CRS,
+    )
+    df = get_intersections(projects, fires)
+
+    assert df["fire_id"].tolist() == ["mtbs-0"]  # boundary touch and disjoint fires dropped
+    assert df["opr_id"].tolist() == ["A"]
+    assert df["fraction"].iloc[0] == 0.5
+    assert df["acres"].iloc[0] == 5000 / M2_TO_ACRE
+
+    assert len(intersections.get_project_fires(df, "A", after="2021-01-01")) == 1
+    assert len(intersections.get_project_fires(df, "A", after="2022-01-01")) == 0
+    assert intersections.get_fire_projects(df, "route complex")["opr_id"].tolist() == ["A"]
+
+
+def test_get_intersections_screen_threshold():
+    projects = geopandas.GeoDataFrame(
+        {"opr_id": ["A"]}, geometry=[box(0, 0, 10_000, 10_000)], crs=CRS
+    ).set_index("opr_id")
+    fires = geopandas.GeoDataFrame(
+        {
+            "fire_id": ["mtbs-0", "mtbs-1"],
+            "name": ["BIG", "SMALL"],
+            "ignite_at": pd.to_datetime(["2021-08-01", "2020-01-01"]),
+        },
+        geometry=[box(5_000, 0, 15_000, 10_000), box(0, 0, 1_000, 1_000)],
+        crs=CRS,
+    )
+    df = get_intersections(projects, fires, screen_threshold=0.05).set_index("fire_id")
+
+    assert df.loc["mtbs-0", "exact"]
+    assert df.loc["mtbs-0", "fraction"] == 0.5
+    assert not df.loc["mtbs-1", "exact"]  # approximated from the coarse screen
+    assert df.loc["mtbs-1", "fraction"] == 0.01
+
+
+def test_get_intersections_no_approx_overlap():
+    # overlap too small to cover any screening cell center is still measured exactly
+    projects = geopandas.GeoDataFrame(
+        {"opr_id": ["A"]}, geometry=[box(0, 0, 10_000, 10_000)], crs=CRS
+    ).set_index("opr_id")
+    fires = geopandas.GeoDataFrame(
+        {"fire_id": ["mtbs-0"], "name": ["SLIVER"], "ignite_at": pd.to_datetime(["2021-08-01"])},
+        geometry=[box(9_900, 0, 12_000, 10_000)],
+        crs=CRS,
+    )
+    df = get_intersections(projects, fires, screen_threshold=0.05)
+
+    assert df["exact"].tolist() == [True]
+    assert df["acres"].iloc[0] == 100 * 10_000 / M2_TO_ACRE
@@ -0,0 +1,65 @@
+import geopandas
+from shapely.geometry import box
+
+from carbonplan_buffer_analysis.prefect.tasks.project_reversals import (
+    CRS,
+    load_mtbs_fires,
+    load_nifc_fires,
+)
+
+
+def get_bbox():
+    """Northern California, in CRS"""
+    return tuple(
+        geopandas.GeoSeries([box(-122, 37, -119, 40)], crs="epsg:4326").to_crs(CRS).total_bounds
+    )
+
+
+def test_load_nifc_fires(tmp_path):
+    geometries = [
+        box(-120, 38, -119.9, 38.1),
+        box(-120, 38, -119.9, 38.1),
+        box(-121, 39, -120.9, 39.1),
+        box(-80, 30, -79.9, 30.1),
+    ]
+    geopandas.GeoDataFrame(
+        {
+            "poly_IncidentName": ["A", "B", "C", "D"],
+            "poly_Acres_AutoCalc": [1.0, 2.0, 3.0, 4.0],
+            "irwin_FireDiscoveryDateTime": [
+                "2019-07-01T10:00:00Z",
+                "2020-08-01T10:00:00Z",
+                "2021-08-01T10:00:00Z",
+                "2021-09-01T10:00:00Z",
+            ],
+        },
+        geometry=geometries,
+        crs="epsg:4326",
+    ).to_file(tmp_path / "nifc.geojson", driver="GeoJSON")
+
+    fires = load_nifc_fires(get_bbox(), urlpath=str(tmp_path / "nifc.geojson"))
+
+    assert fires["name"].tolist() == ["B", "C"]  # 2019 and out of bbox fires aren't read
+    assert fires.index.tolist() == [1, 2]  # ids from the file, not the filtered frame
+    assert str(fires["ignite_at"].iloc[0]) == "2020-08-01 00:00:00"
+
+
+def test_load_mtbs_fires(tmp_path):
+    geopandas.GeoDataFrame(
+        {
+            "Incid_Name": ["X", "Y", "Z"],
+            "BurnBndAc": [1.0, 2.0, 3.0],
+            "Ig_Date": ["2018-07-01", "2018-08-01", "2019-01-01"],
+            "Incid_Type": ["Wildfire", "Prescribed Fire", "Wildfire"],
+        },
+        geometry=[
+            box(-120, 38, -119.9, 38.1),
+            box(-120, 38, -119.9, 38.1),
+            box(-80, 30, -79.9, 30.1),
+        ],
+        crs="epsg:4326",
+    ).to_file(tmp_path / "mtbs.json", driver="GeoJSON")
+
+    path = str(tmp_path / "mtbs.json")
+    assert load_mtbs_fires(urlpath=path)["name"].tolist() == ["X", "Z"]
+    assert load_mtbs_fires(get_bbox(), urlpath=path)["name"].tolist() == ["X"]
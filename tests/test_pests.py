@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+
+from carbonplan_buffer_analysis import pests, project_tables
+
+
+@pytest.fixture
+def tables():
+    def project(opr_id, species, ifm_1):
+        return {
+            "opr_id": opr_id,
+            "acreage": 100,
+            "assessment_areas": [
+                {
+                    "code": 1,
+                    "site_class": "low",
+                    "acreage": 100,
+                    "species": [{"code": c, "fraction": f} for c, f in species],
+                }
+            ],
+            "rp_1": {"ifm_1": ifm_1, "ifm_3": 0},
+        }
+
+    return project_tables.flatten_project_db(
+        [
+            project("A", [(631, 0.5), (981, 0.1), (999, 0.4)], 1000),
+            project("B", [(631, 0.2), (999, 0.8)], 1000),
+            project("C", [(999, 1)], 1000),
+        ]
+    )
+
+
+def test_cap_losses():
+    losses = pests.cap_losses(
+        pd.Series({"A": 100.0, "B": 100.0}),
+        pd.Series({"A": 60.0}),
+        {"minimum": 0.5, "maximum": 0.8},
+    )
+    assert losses.loc["A"].tolist() == [50, 60]
+    assert losses.loc["B"].tolist() == [0, 0]  # no issuance, nothing to lose
+
+
+def test_calculate_exposure(tables):
+    max_loses = pd.Series({"A": 1000.0, "B": 150.0, "C": 1000.0})
+    exposure = pests.calculate_exposure(tables, max_loses)
+
+    sod = exposure.loc["sudden-oak-death"]
+    assert sod.index.tolist() == ["A", "B"]
+    assert sod.loc["A", "exposed_biomass"] == 500
+    assert sod.loc["A", "maximum"] == 400
+    assert sod.loc["B", "maximum"] == 150  # capped at issuance
+
+    # bay laurel co-host only listed at A
+    assert exposure.loc["sudden-oak-death-bay"].index.tolist() == ["A"]
+
+
+def test_calculate_exposure_custom_scenario(tables):
+    scenarios = {"generic": {"hosts": [999], "mortality": {"only": 0.1}, "co_hosts": []}}
+    exposure = pests.calculate_exposure(tables, pd.Series(1e6, index=["A", "B", "C"]), scenarios)
+    assert exposure.loc["generic", "only"].round(6).tolist() == [40, 80, 100]
+
+
+def test_co_host_listed_overrides_project_db(tables):
+    scenarios = {
+        "bay": {
+            "hosts": [631],
+            "mortality": {"maximum": 0.8},
+            "co_hosts": [981],
+            "co_host_listed": {"A": False, "B": True},
+        }
+    }
+    exposure = pests.calculate_exposure(tables, pd.Series(1e6, index=["A", "B", "C"]), scenarios)
+    # A lists bay in its species, B doesn't; the hand-checked documentation wins for both
+    assert exposure.loc["bay"].index.tolist() == ["B"]
+
+
+def test_bay_scenario_matches_tanoak_summary():
+    scenario = pests.PEST_SCENARIOS["sudden-oak-death-bay"]
+    assert scenario["co_host_listed"] is pests.BAY_LAUREL_LISTED
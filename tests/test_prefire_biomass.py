@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+
+from carbonplan_buffer_analysis.prefect.flows.calculate_prefire_biomass import (
+    project_pools_forward,
+)
+
+
+def test_project_pools_forward():
+    """Matches the per-project values from notebooks/pre-fire-biomass.ipynb"""
+    raw_data = {
+        "ACR260": [
+            (2015, 4_105_735, 829_223),
+            (2016, 4_440_489, 927_324),
+            (2017, 4_514_130, 914_989),
+            (2018, 4_588_312, 894_781),
+        ],
+        "CAR1102": [
+            (2016, 828_840, 12_978),
+            (2017, 836_414, 12_978),
+            (2018, 843_988, 12_978),
+            (2019, 852_198, 19_204),
+        ],
+        "ACR255": [(2017, 45_781_013, 5_529_953)],
+    }
+    pools = pd.DataFrame(
+        [
+            (opr_id, year, pool, value)
+            for opr_id, rows in raw_data.items()
+            for year, ifm_1, ifm_3 in rows
+            for pool, value in [("ifm-1", ifm_1), ("ifm-3", ifm_3)]
+        ],
+        columns=["opr_id", "year", "pool", "value"],
+    )
+    event_years = pd.Series({"ACR260": 2019, "CAR1102": 2019, "ACR255": 2021})
+
+    projected = project_pools_forward(pools, event_years)
+    assert projected.loc["ACR260"].to_dict() == {"ifm-1": 4_664_404, "ifm-3": 882_879}
+    # event year equal to the last OPDR keeps the last reported values
+    assert projected.loc["CAR1102"].to_dict() == {"ifm-1": 852_198, "ifm-3": 19_204}
+    # single reported year is held constant
+    assert projected.loc["ACR255"].to_dict() == {"ifm-1": 45_781_013, "ifm-3": 5_529_953}
+
+
+def make_pools(rows):
+    return pd.DataFrame(rows, columns=["opr_id", "year", "pool", "value"]).astype(
+        {"pool": "category"}
+    )
+
+
+def test_project_pools_forward_growth_from_zero():
+    pools = make_pools(
+        [
+            ("A", 2017, "ifm-1", 100),
+            ("A", 2018, "ifm-1", 110),
+            ("A", 2019, "ifm-1", 121),
+            ("A", 2017, "ifm-3", 0),
+            ("A", 2018, "ifm-3", 10),
+            ("A", 2019, "ifm-3", 20),
+        ]
+    )
+    projected = project_pools_forward(pools, pd.Series({"A": 2020}))
+    # ifm-1 grows 10%/yr; ifm-3 has growth of [inf, 100%], inf is ignored
+    assert projected.loc["A"].to_dict() == {"ifm-1": 133, "ifm-3": 40}
+
+
+def test_project_pools_forward_missing():
+    pools = make_pools([("A", 2019, "ifm-1", 100), ("A", 2019, "ifm-3", 10)])
+    with pytest.raises(KeyError, match="'B'"):
+        project_pools_forward(pools, pd.Series({"A": 2020, "B": 2020}))
+
+    pools = make_pools(
+        [("A", 2019, "ifm-1", 100), ("B", 2019, "ifm-1", 1), ("B", 2019, "ifm-3", 1)]
+    )
+    with pytest.raises(KeyError, match="'A'"):
+        project_pools_forward(pools, pd.Series({"A": 2020, "B": 2020}))
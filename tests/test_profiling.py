@@ -0,0 +1,68 @@
+import json
+
+from carbonplan_buffer_analysis import profiling
+
+
+def test_disabled_by_default(monkeypatch):
+    monkeypatch.delenv(profiling.PROFILE_DIR_ENV, raising=False)
+    with profiling.profile_run("noop") as report:
+        assert report is None
+        with profiling.span("inner"):
+            profiling.record_pixels(10)
+
+
+def test_profile_run(tmp_path):
+    fn = tmp_path / "data.json"
+    fn.write_text(json.dumps({"a": 1}))
+
+    with profiling.profile_run("test-run", report_dir=str(tmp_path), trace=True):
+        with profiling.span("load"):
+            with profiling.open_file(str(fn), "r") as f:
+                json.load(f)
+        with profiling.span("count"):
+            profiling.record_pixels(100)
+
+    with open(tmp_path / "test-run-report.json") as f:
+        report = json.load(f)
+    tasks = {task["name"]: task for task in report["tasks"]}
+
+    assert tasks["load"]["bytes_read"] == len(fn.read_text())
+    assert tasks["count"]["pixels"] == 100
+    # enclosing run span accumulates nested counters
+    assert tasks["test-run"]["pixels"] == 100
+    assert tasks["test-run"]["wall_time"] >= tasks["load"]["wall_time"]
+
+    assert (tmp_path / "test-run-report.csv").exists()
+    with open(tmp_path / "test-run-trace.json") as f:
+        trace = json.load(f)
+    assert len(trace["traceEvents"]) == 3
+
+
+def test_nested_runs_share_one_report(tmp_path):
+    with profiling.profile_run("outer", report_dir=str(tmp_path)) as outer:
+        for i in range(2):
+            with profiling.profile_run("inner", report_dir=str(tmp_path)) as inner:
+                assert inner is outer
+                with profiling.span(f"scenario-{i}"):
+                    profiling.record_pixels(1)
+
+    assert not (tmp_path / "inner-report.json").exists()
+    with open(tmp_path / "outer-report.json") as f:
+        report = json.load(f)
+    names = [task["name"] for task in report["tasks"]]
+    assert {"scenario-0", "scenario-1", "outer"} == set(names)
+
+
+def test_text_files_count_encoded_bytes(tmp_path):
+    fn = tmp_path / "text.txt"
+    text = "tCO₂e ±5%"
+
+    with profiling.profile_run("text", report_dir=str(tmp_path)) as report:
+        with profiling.open_file(str(fn), "w", encoding="utf-8") as f:
+            f.write(text)
+        with profiling.open_file(str(fn), "r", encoding="utf-8") as f:
+            assert f.read() == text
+        root = report._active[0]
+        assert root.bytes_written == len(text.encode()) == fn.stat().st_size
+        assert root.bytes_read == len(text.encode())
+    assert len(text.encode()) > len(text)
@@ -0,0 +1,78 @@
+import pandas as pd
+import pytest
+
+from carbonplan_buffer_analysis import project_tables
+
+
+def make_project(opr_id, acreage, assessment_areas, ifm_1=1000):
+    return {
+        "opr_id": opr_id,
+        "acreage": acreage,
+        "assessment_areas": assessment_areas,
+        "rp_1": {"ifm_1": ifm_1, "ifm_3": 10},
+    }
+
+
+def make_aa(code, acreage, species):
+    return {
+        "code": code,
+        "site_class": "low",
+        "acreage": acreage,
+        "species": [{"code": c, "fraction": f} for c, f in species],
+    }
+
+
+@pytest.fixture
+def tables():
+    projects = [
+        make_project("A", 100, [make_aa(1, 100, [(631, 0.5), (999, 0.5)])]),
+        make_project(
+            "B",
+            200,
+            [
+                make_aa(1, 50, [(631, 0.2), (631, 0.2), (981, 0.1)]),
+                make_aa(999, 150, [(631, 0.1), (999, 0.9)]),
+            ],
+        ),
+        make_project("C", 100, [make_aa(1, 50, [(631, 1)]), make_aa(2, 50, [(999, 1)])]),
+        make_project("D", 100, []),
+    ]
+    return project_tables.flatten_project_db(projects)
+
+
+def test_flatten_project_db(tables):
+    assert tables["projects"].index.tolist() == ["A", "B", "C", "D"]
+    assert len(tables["assessment_areas"]) == 5
+    assert len(tables["species"]) == 9
+    assert tables["projects"].loc["B", "ifm_1"] == 1000
+
+
+def test_get_species_fractions(tables):
+    fractions = project_tables.get_species_fractions(tables, 631)
+    # B: 0.4 * 50 / 200 + 0.1 * (generic aa -> full project acreage) 200 / 200
+    assert fractions.to_dict() == {"A": 0.5, "B": 0.2, "C": 0, "D": 0}
+
+
+def test_get_species_fractions_multiple_codes(tables):
+    fractions = project_tables.get_species_fractions(tables, [631, 981])
+    assert fractions["B"] == pytest.approx(0.4 * 50 / 200 + 0.1 * 50 / 200 + 0.1)
+    # missing from an assessment area zeroes out the project
+    assert project_tables.get_species_fractions(tables, [981])["B"] == 0
+
+
+def test_make_project_table():
+    table = project_tables.make_project_table(
+        issuance={"B": 200, "A": 100},
+        has_bay={"A": True},
+        fire_risk=pd.Series({"A": 0.02, "C": 0.04}),
+    )
+    assert table.index.tolist() == ["A", "B", "C"]
+    assert str(table.index.dtype) == "category"
+    assert table["issuance"].dtype == "float64"  # C has no issuance
+    assert str(table["has_bay"].dtype) == "boolean"
+    assert table.loc["A", "issuance"] * table.loc["A", "fire_risk"] == 2
+
+
+def test_to_bool():
+    values = pd.Series(["true", "false", True, "True", None])
+    assert project_tables.to_bool(values).tolist() == [True, False, True, True, False]
@@ -0,0 +1,87 @@
+import geopandas
+import numpy as np
+import pytest
+import rasterio
+from shapely.geometry import Point, box
+
+from carbonplan_buffer_analysis import proximity, utils, zonal
+
+
+@pytest.fixture
+def grid():
+    return zonal.Grid.from_bounds((0, 0, 1_000, 1_000), 100, "epsg:5070")
+
+
+@pytest.fixture
+def points():
+    # one detection off the grid, which is dropped
+    return geopandas.GeoSeries([Point(50, 950), Point(950, 50), Point(5_000, 5_000)])
+
+
+def test_distance_transform(grid, points):
+    distance = proximity.distance_transform(points, grid)
+
+    assert distance.shape == (10, 10)
+    assert distance[0, 0] == distance[9, 9] == 0
+    assert distance[0, 3] == 300
+    assert distance[9, 0] == pytest.approx(np.hypot(900, 0))
+    assert distance[4, 5] == pytest.approx(np.hypot(400, 500))
+
+    with pytest.raises(ValueError):
+        proximity.distance_transform(points.iloc[2:], grid)
+
+
+def test_source_hash(grid, points):
+    source_hash = proximity.get_source_hash(points, grid)
+
+    assert proximity.get_source_hash(points.iloc[::-1], grid) == source_hash
+    assert proximity.get_source_hash(points.iloc[:2], grid) != source_hash
+    coarse = zonal.Grid.from_bounds((0, 0, 1_000, 1_000), 200, "epsg:5070")
+    assert proximity.get_source_hash(points, coarse) != source_hash
+
+
+def test_get_distance_stats(tmp_path, monkeypatch, grid, points):
+    monkeypatch.setattr(utils, "LOCAL_CACHE", tmp_path)
+    path = tmp_path / "distance.tif"
+    distance = proximity.distance_transform(points, grid)
+    source_hash = proximity.get_source_hash(points, grid)
+
+    assert not proximity.is_current(str(path), source_hash)
+    proximity.write_distance_raster(distance, grid, str(path), source_hash)
+    assert proximity.is_current(str(path), source_hash)
+    assert not proximity.is_current(str(path), "stale")
+
+    # weights: 1 in the left half of the grid, 0 in the right
+    weights_path = tmp_path / "weights.tif"
+    profile = dict(
+        driver="GTiff",
+        height=grid.height,
+        width=grid.width,
+        count=1,
+        dtype="float32",
+        crs=grid.crs,
+        transform=grid.transform,
+    )
+    weights = np.zeros((grid.height, grid.width), dtype="float32")
+    weights[:, :5] = 1
+    with rasterio.open(weights_path, "w", **profile) as dst:
+        dst.write(weights, 1)
+
+    geometries = geopandas.GeoSeries(
+        [box(310, 610, 390, 690), box(0, 0, 1_000, 200), box(2_000, 2_000, 2_100, 2_100)],
+        index=["small", "strip", "off-grid"],
+        crs="epsg:5070",
+    )
+    stats = proximity.get_distance_stats(
+        geometries, str(path), weights_path=str(weights_path), block_rows=3
+    )
+
+    assert stats.index.tolist() == ["small", "strip", "off-grid"]
+    # smaller than a cell, still gets the one cell it's in (row 3, col 3)
+    assert stats.loc["small", "pixels"] == 1
+    assert stats.loc["small", "min_km"] == stats.loc["small", "mean_km"]
+    assert stats.loc["small", "min_km"] == pytest.approx(np.hypot(0.3, 0.3))
+    assert stats.loc["strip", "min_km"] == 0
+    assert stats.loc["strip", "mean_km"] == pytest.approx(distance[8:].mean() / 1_000)
+    assert stats.loc["strip", "weighted_km"] == pytest.approx(distance[8:, :5].mean() / 1_000)
+    assert stats.loc["off-grid"].isna()[["min_km", "mean_km", "weighted_km"]].all()
@@ -0,0 +1,24 @@
+import numpy as np
+
+from carbonplan_buffer_analysis.prefect.tasks.ravg import (
+    apply_mortality,
+    count_classes,
+    get_mortality_lut,
+)
+
+
+def test_apply_mortality():
+    severity = np.array([[np.nan, 1, 7], [6, 5, 9]])
+    biomass = np.array([[5, 5, 10], [np.nan, 2, 3]])
+
+    low = apply_mortality(severity, biomass, get_mortality_lut(0))
+    high = apply_mortality(severity, biomass, get_mortality_lut(1))
+
+    np.testing.assert_allclose(low, [[0, 0, 9], [0, 1, 0]])
+    np.testing.assert_allclose(high, [[0, 0, 10], [0, 1, 0]])
+
+
+def test_count_classes():
+    severity = np.array([[np.nan, 1, 7], [7, 9, 3]])
+
+    assert count_classes(severity).tolist() == [0, 1, 0, 1, 0, 0, 0, 2]
@@ -0,0 +1,31 @@
+import geopandas
+import numpy as np
+from shapely.geometry import box
+
+from carbonplan_buffer_analysis.screening import screen_pairs
+
+CRS = "epsg:5070"
+
+
+def test_screen_pairs():
+    projects = geopandas.GeoSeries(
+        [box(0, 0, 10_000, 10_000), box(50_000, 0, 60_000, 10_000)], crs=CRS
+    )
+    fires = geopandas.GeoSeries(
+        [
+            box(5_000, 0, 15_000, 10_000),  # half of project 0
+            box(10_000, 0, 20_000, 10_000),  # touches project 0 boundary
+            box(9_990, 5_000, 10_010, 5_010),  # sliver, smaller than a cell
+            box(100_000, 0, 110_000, 10_000),  # off the grid
+        ],
+        crs=CRS,
+    )
+    pairs = screen_pairs(projects, fires, resolution=1_000)
+
+    assert sorted(zip(pairs["project"], pairs["fire"])) == [
+        (0, 0),
+        (0, 2),
+    ]  # boundary touch has no area
+    pairs = pairs.set_index("fire")
+    np.testing.assert_allclose(pairs.loc[0, "approx_fraction"], 0.5)
+    assert pairs.loc[2, "approx_area"] == 0  # kept as a candidate, even though tiny
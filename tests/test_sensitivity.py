@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from carbonplan_buffer_analysis import sensitivity
+
+
+def ishigami(params, a=7, b=0.1):
+    x1, x2, x3 = params["x1"], params["x2"], params["x3"]
+    return {"y": np.sin(x1) + a * np.sin(x2) ** 2 + b * x3**4 * np.sin(x1)}
+
+
+def test_ishigami_indices():
+    """standard test function with known (analytic) indices"""
+    bounds = {name: (-np.pi, np.pi) for name in ["x1", "x2", "x3"]}
+    result = sensitivity.analyze(ishigami, bounds, n=2**12, batch_size=1_000)
+    indices = result["indices"].loc["y"]
+
+    np.testing.assert_allclose(indices["S1"], [0.3139, 0.4424, 0.0], atol=0.03)
+    np.testing.assert_allclose(indices["ST"], [0.5576, 0.4424, 0.2437], atol=0.03)
+    assert (indices["S1_conf"] > 0).all()
+    assert result["n_evaluations"] == 2**12 * 5
+
+
+def test_fixed_parameters():
+    def model(params):
+        return {"y": params["x1"] + 2 * params["x2"] + params["offset"]}
+
+    bounds = {"x1": (0, 1), "x2": (0, 1)}
+    result = sensitivity.analyze(model, bounds, fixed={"offset": 10}, n=2**10)
+
+    # additive, so no interactions and variance splits 1:4
+    indices = result["indices"].loc["y"]
+    np.testing.assert_allclose(indices["S1"], [0.2, 0.8], atol=0.02)
+    np.testing.assert_allclose(indices["ST"], [0.2, 0.8], atol=0.02)
+    assert result["outputs"].loc["y", "mean"] == pytest.approx(11.5, abs=0.01)
+    assert result["outputs"].loc["y", "probability_positive"] == 1
+
+
+@pytest.fixture
+def inputs():
+    return {
+        "severity_classes": [1, 2, 7],
+        "severity_shares": np.array([[0.5, 0.25, 0.25], [0, 0, 1.0]]),
+        "ifm1": np.array([100.0, 1_000.0]),
+        "ifm3": np.array([20.0, 0.0]),
+        "frac_burned": np.array([0.5, 1.0]),
+        "frac_merch": np.array([0.4, 0.5]),
+        "frac_merch_registry": 0.6,
+        "storage_frac": np.array([0.5, 0.5]),
+        "fire_max_loss": np.array([np.inf, 300.0]),
+        "known_reversals": 1_000.0,
+        "tanoak_biomass": np.array([100.0, 50.0]),
+        "tanoak_max_loss": np.array([10.0, 0.0]),
+        "issuance": 10_000.0,
+        "fire_contributions": 500.0,
+    }
+
+
+def test_calculate_shortfall(inputs):
+    params = {
+        "mortality_1": 0.0,
+        "mortality_2": np.array([0.0, 0.1]),
+        "mortality_7": 1.0,
+        "salvage_fraction": 0.1,
+        "frac_merch_override": np.array([0.0, 1.0]),
+        "ifm3_fraction": np.array([0.0, 1.0]),
+        "tanoak_mortality": 0.5,
+        "pest_buffer_rate": 0.03,
+        "other_buffer_rate": np.array([0.03, 0.02]),
+    }
+    shortfall = sensitivity.calculate_shortfall(params, inputs)
+
+    # first sample: project_reversals in area mode, with the project's own frac_merch and no ifm-3
+    loss = 100 * 0.5 * (0.25 * 0.0 + 0.25 * 1.0)
+    net = loss - loss * 0.1 * 0.4 * 0.5
+    fire = net + 300 + 1_000  # second event is capped at its issuance
+    tanoak = 10  # first project capped, second project has no issuance
+    assert shortfall["fire"][0] == pytest.approx(fire - 500)
+    assert shortfall["pest"][0] == pytest.approx(tanoak - 300)
+    assert shortfall["total"][0] == pytest.approx(fire + tanoak - 500 - 300 - 300)
+
+    # second sample: registry frac_merch and ifm-3 included
+    loss = 120 * 0.5 * (0.25 * 0.1 + 0.25 * 1.0)
+    net = loss - loss * 0.1 * 0.6 * 0.5
+    assert shortfall["fire"][1] == pytest.approx(net + 300 + 1_000 - 500)
+    assert shortfall["total"][1] == pytest.approx(net + 1_300 + tanoak - 500 - 300 - 200)
+
+
+def test_evaluate_batches(inputs):
+    bounds = {"mortality_2": (0, 0.1), "mortality_7": (0.9, 1), "salvage_fraction": (0.1, 0.3)}
+    fixed = {
+        "mortality_1": 0,
+        "frac_merch_override": 0.5,
+        "ifm3_fraction": 0.5,
+        "tanoak_mortality": 0.65,
+        "pest_buffer_rate": 0.03,
+        "other_buffer_rate": 0.03,
+    }
+    A, _, _ = sensitivity.get_samples(bounds, n=100)
+    assert A.shape == (128, 3)  # rounded up to a power of two
+
+    def model(params):
+        return sensitivity.calculate_shortfall(params, inputs)
+
+    batched = sensitivity.evaluate(model, list(bounds), A, fixed, batch_size=7)
+    unbatched = sensitivity.evaluate(model, list(bounds), A, fixed)
+    for output in ["fire", "pest", "total"]:
+        np.testing.assert_allclose(batched[output], unbatched[output])
@@ -0,0 +1,54 @@
+import tracemalloc
+
+import numpy as np
+
+from carbonplan_buffer_analysis import solvency
+
+
+def test_no_disturbance_stays_solvent():
+    simulation = solvency.simulate_pool([100, 200], [0, 0], 10, n_years=20, n_trajectories=50)
+    summary = solvency.summarize_simulation(simulation)
+
+    assert summary["insolvency_probability"] == 0
+    assert all(t is None for t in summary["time_to_insolvency"].values())
+    np.testing.assert_allclose(simulation["final_pool"], 10)
+
+
+def test_losses_capped_at_credits():
+    # every project is disturbed every year, but can only ever lose its issued credits
+    simulation = solvency.simulate_pool(
+        [100, 200], [1, 1], 350, n_years=20, n_trajectories=50, severity=(5, 1)
+    )
+    assert np.isnan(simulation["insolvency_year"]).all()
+    np.testing.assert_allclose(simulation["final_pool"], 50, atol=1e-3)
+
+
+def test_batches_cover_all_trajectories():
+    # tiny memory budget forces one trajectory per batch
+    simulation = solvency.simulate_pool(
+        [100] * 5, [0.5] * 5, 100, n_years=10, n_trajectories=7, memory_budget=1
+    )
+    assert len(simulation["insolvency_year"]) == 7
+    assert (simulation["insolvency_year"][~np.isnan(simulation["insolvency_year"])] >= 1).all()
+
+
+def test_bytes_per_cell():
+    shape = (200, 50, 100)  # trajectories, years, projects
+    peaks = []
+    for probability in [0.01, 1.0]:  # rare disturbances, and a severity draw for every cell
+        rng = np.random.default_rng(0)
+        tracemalloc.start()
+        solvency.simulate_batch(
+            rng,
+            np.full(shape[2], 100.0),
+            np.full(shape[2], probability),
+            1e5,
+            shape[1],
+            shape[0],
+            solvency.SEVERITY_BETA,
+        )
+        peaks.append(tracemalloc.get_traced_memory()[1] / np.prod(shape))
+        tracemalloc.stop()
+
+    # batches stay within the memory budget, with headroom, without wasting most of it
+    assert 1.25 * max(peaks) <= solvency.BYTES_PER_CELL <= 2 * max(peaks)
@@ -0,0 +1,25 @@
+from carbonplan_buffer_analysis import storage
+
+
+def test_write_and_read_json(tmp_path):
+    storage.write_json(str(tmp_path / "a" / "record.json"), {"opr_id": "ACR260"}, indent=2)
+    assert storage.read_json(str(tmp_path / "a" / "record.json")) == {"opr_id": "ACR260"}
+
+
+def test_pipe_many(tmp_path):
+    storage.pipe({str(tmp_path / "ravg" / f"{i}.json"): f'{{"i": {i}}}'.encode() for i in range(3)})
+
+    records = storage.read_json_glob(str(tmp_path / "ravg" / "*.json"))
+    assert sorted(record["i"] for record in records.values()) == [0, 1, 2]
+
+
+def test_cat_keys_are_urlpaths():
+    storage.pipe({"memory://bucket/x.json": b"1", "memory://bucket/y.json": b"2"})
+    assert storage.cat(["memory://bucket/x.json", "memory://bucket/y.json"]) == {
+        "memory://bucket/x.json": b"1",
+        "memory://bucket/y.json": b"2",
+    }
+    assert storage.glob("memory://bucket/*.json") == [
+        "memory://bucket/x.json",
+        "memory://bucket/y.json",
+    ]
@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from carbonplan_buffer_analysis import store
+
+
+def test_sync_and_query(tmp_path, monkeypatch):
+    bucket = tmp_path / "bucket"
+    (bucket / "outputs" / "reversals").mkdir(parents=True)
+    for i, severity in enumerate(["low", "high"]):
+        record = {
+            "opr_id": "ACR260",
+            "biomass_loss": 100.0 * (i + 1),
+            "salvage_wp": 1.0,
+            "severity": severity,
+            "salvage": "low",
+            "includes_ifm_3": "true",
+        }
+        (bucket / "outputs" / "reversals" / f"{i}.json").write_text(json.dumps(record))
+    (bucket / "outputs" / "fire-summary.json").write_text(json.dumps({"minimum": 1, "maximum": 2}))
+
+    monkeypatch.setattr(store, "BUCKET", str(bucket))
+    monkeypatch.setattr(store, "STORE_DIR", tmp_path / "store")
+    monkeypatch.setattr(store, "DATABASE", tmp_path / "store" / "test.duckdb")
+
+    # sources that don't exist yet are skipped
+    assert store.sync() == {"reversals": 2, "fire_summary": 1}
+
+    df = store.query(
+        "select severity, biomass_loss from reversals where includes_ifm_3 order by biomass_loss"
+    )
+    assert df["severity"].tolist() == ["low", "high"]
+    assert store.query("select loss_mode from reversals")["loss_mode"].unique().tolist() == ["area"]
+
+
+def test_query_before_sync(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, "DATABASE", tmp_path / "store" / "test.duckdb")
+    with pytest.raises(FileNotFoundError, match="store-sync"):
+        store.query("select 1")
@@ -1,5 +1,7 @@
+import pandas as pd
 import pytest
 
+from carbonplan_buffer_analysis.prefect.flows import summarize_tanoak
 from carbonplan_buffer_analysis.prefect.flows.calculate_tanoak_basal_area import get_fraction_tanoak
 
 
@@ -78,3 +80,21 @@ from carbonplan_buffer_analysis.prefect.flows.calculate_tanoak_basal_area import
 )
 def test_get_tanaok_fraction(project, expected_result):
     assert get_fraction_tanoak(project) == expected_result
+
+
+def test_load_project_tmeans(tmp_path, monkeypatch):
+    climate = tmp_path / "project-climate.csv"
+    pd.DataFrame(
+        {"opr_id": ["A", "B"], "tmean": [10.0, 12.0], "tmean_tanoak": [9.0, float("nan")]}
+    ).to_csv(climate, index=False)
+    monkeypatch.setattr(summarize_tanoak, "PROJECT_CLIMATE", str(climate))
+    biomass = pd.Series({"B": 1.0, "A": 2.0})
+
+    tmeans = summarize_tanoak.load_project_tmeans.run(biomass)
+    assert tmeans.to_dict() == {"B": 12.0, "A": 10.0}
+    # B has no tanoak in LEMMA, so falls back to its area weighted tmean
+    tmeans = summarize_tanoak.load_project_tmeans.run(biomass, "tmean_tanoak")
+    assert tmeans.to_dict() == {"B": 12.0, "A": 9.0}
+
+    with pytest.raises(KeyError, match="'C'"):
+        summarize_tanoak.load_project_tmeans.run(pd.Series({"A": 1.0, "C": 1.0}))
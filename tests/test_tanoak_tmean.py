@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+import rasterio
+import rioxarray
+import xarray
+from rasterio.transform import from_origin
+from rasterio.warp import transform_bounds
+
+from carbonplan_buffer_analysis.prefect.flows import calculate_tanoak_tmean
+
+
+@pytest.fixture
+def lemma(tmp_path):
+    """Small 30 m tanoak basal area raster, tanoak in a diagonal band, nodata in one corner"""
+    height, width = 300, 400
+    rows, cols = np.mgrid[:height, :width]
+    basal_area = np.where(np.abs(rows - 0.75 * cols) < 60, 5.0, 0.0).astype("float32")
+    basal_area[:40, :40] = np.nan
+    path = tmp_path / "lemma.tif"
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        height=height,
+        width=width,
+        count=1,
+        dtype="float32",
+        crs="epsg:5070",
+        transform=from_origin(-2_200_000, 2_300_000, 30, 30),
+        nodata=np.nan,
+    ) as dst:
+        dst.write(basal_area, 1)
+    return str(path)
+
+
+@pytest.fixture
+def prism(lemma):
+    """Coarse lat/lon tmean covering the LEMMA raster, varying in both directions"""
+    with rasterio.open(lemma) as src:
+        minx, miny, maxx, maxy = transform_bounds(src.crs, "epsg:4326", *src.bounds)
+    resolution = 0.01
+    x = np.arange(minx - 0.05, maxx + 0.05, resolution)
+    y = np.arange(maxy + 0.05, miny - 0.05, -resolution)
+    tmean = 10 + np.add.outer(np.arange(len(y)) * 0.1, np.arange(len(x)) * 0.03)
+    da = xarray.DataArray(
+        tmean[np.newaxis], coords={"band": [1], "y": y, "x": x}, dims=("band", "y", "x")
+    )
+    return da.rio.write_crs(calculate_tanoak_tmean.TMEAN_CRS).to_dataset(name="tmean")
+
+
+def test_blocked_sampling_matches_reproject_match(monkeypatch, lemma, prism):
+    monkeypatch.setattr(calculate_tanoak_tmean, "LEMMA_TANOAK", lemma)
+    monkeypatch.setattr(calculate_tanoak_tmean, "TANOAK_BLOCK_ROWS", 64)  # several blocks
+
+    grid = calculate_tanoak_tmean.load_tanoak_grid.run()
+    blocked = calculate_tanoak_tmean.reproject_tmean.run(prism, grid)
+
+    # the original approach: reproject everything to full rasters in memory, then mask
+    tanoak = rioxarray.open_rasterio(lemma).rio.reproject(calculate_tanoak_tmean.TMEAN_CRS)
+    assert (grid.height, grid.width) == tanoak.shape[1:]
+    eager = prism["tmean"].rio.reproject_match(tanoak).where(tanoak > 0).values
+    eager = eager[~np.isnan(eager)]
+
+    # pixels on the edge of the tanoak range can differ by resampling rounding
+    assert len(blocked) == pytest.approx(len(eager), rel=1e-3)
+    breaks = [0.25, 0.5, 0.75]
+    np.testing.assert_allclose(np.quantile(blocked, breaks), np.quantile(eager, breaks), atol=0.01)
@@ -0,0 +1,21 @@
+import os
+
+from carbonplan_buffer_analysis import utils
+
+
+def test_get_local_copy(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "LOCAL_CACHE", tmp_path / "cache")
+    for name in ["a", "b"]:
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "perimeters.json").write_text(name)
+    a, b = (f"file://{tmp_path}/{name}/perimeters.json" for name in ["a", "b"])
+
+    # same file name, different urlpaths
+    assert utils.get_local_copy(a).read_text() == "a"
+    assert utils.get_local_copy(b).read_text() == "b"
+    assert utils.get_local_copy(a).name == "perimeters.json"
+
+    # overwritten remote objects are downloaded again
+    (tmp_path / "a" / "perimeters.json").write_text("a, updated")
+    os.utime(tmp_path / "a" / "perimeters.json", (0, 0))
+    assert utils.get_local_copy(a).read_text() == "a, updated"
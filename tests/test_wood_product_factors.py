@@ -0,0 +1,28 @@
+import pandas as pd
+
+from carbonplan_buffer_analysis.prefect.flows.calculate_wood_product_factors import (
+    calculate_storage_factors,
+)
+
+
+def test_calculate_storage_factors():
+    """Matches BaselineWoodProducts.get_summary from notebooks/salvaged-wood-products.ipynb"""
+    baseline = pd.DataFrame(
+        [
+            ("ACR255", 440_561.25, 114_683, 82_226, 937_332.63, 440_561.25),
+            ("CAR1102", 5_425, 1_513, 964, 1, 0.645),
+        ],
+        columns=["opr_id", "dtm", "in_use", "landfill", "harvested_live", "harvested_merch"],
+    ).set_index("opr_id")
+
+    factors = calculate_storage_factors(baseline)
+    assert factors.loc["ACR255"].to_dict() == {
+        "lf_frac": 0.1866,
+        "inuse_frac": 0.2603,
+        "frac_merch": 0.47,
+    }
+    assert factors.loc["CAR1102"].to_dict() == {
+        "lf_frac": 0.1777,
+        "inuse_frac": 0.2789,
+        "frac_merch": 0.645,
+    }
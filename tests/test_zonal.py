@@ -0,0 +1,87 @@
+import geopandas
+import numpy as np
+from shapely.geometry import box
+
+from carbonplan_buffer_analysis import zonal
+
+
+def test_zonal_sums_by_block():
+    geometries = geopandas.GeoSeries([box(0, 0, 100, 100), box(150, 150, 300, 300)])
+    grid = zonal.Grid.from_bounds((0, 0, 300, 300), 10, "epsg:5070")
+    values = np.arange(grid.height * grid.width, dtype=float).reshape(grid.height, grid.width)
+    values[0, :] = np.nan
+
+    sums, counts = np.zeros(3), np.zeros(3)
+    for window in grid.windows(block_rows=7):  # blocks don't line up with the polygons
+        labels = zonal.rasterize_labels(geometries, grid, window)
+        rows = slice(window.row_off, window.row_off + window.height)
+        block_sums, block_counts = zonal.zonal_sums(labels, values[rows], len(geometries))
+        sums += block_sums
+        counts += block_counts
+
+    # rows count down from the top (y=300), first row is nan
+    assert counts.tolist() == [30 * 29 - 100 - 210, 100, 225 - 15]
+    assert sums[1] == values[20:, :10].sum()
+    assert sums[2] == np.nansum(values[:15, 15:])
+
+
+def test_intersecting_windows():
+    geometries = geopandas.GeoSeries([box(0, 0, 100, 35)])
+    grid = zonal.Grid.from_bounds((0, 0, 100, 100), 10, "epsg:5070")
+
+    windows = list(grid.intersecting_windows(geometries, block_rows=3))
+    # the geometry (y=0-35) only falls in rows 6-9, i.e. the last two (3 row) windows
+    assert [w.row_off for w in windows] == [6, 9]
+
+
+def test_coverage_sums():
+    geometries = geopandas.GeoSeries([box(5, 5, 15, 10), box(0, 0, 1, 1)])
+    grid = zonal.Grid.from_bounds((0, 0, 20, 20), 10, "epsg:5070")
+    values = np.array([[1.0, 2.0], [3.0, 4.0]])
+
+    window = next(grid.windows())
+    sums, weights = zonal.coverage_sums(geometries, grid, window, values)
+
+    # first project covers a quarter of each bottom cell, second 1% of the bottom left cell
+    np.testing.assert_allclose(weights[1:], [0.5, 0.01])
+    np.testing.assert_allclose(sums[1:] / weights[1:], [3.5, 3])
+
+    sums, weights = zonal.coverage_sums(
+        geometries, grid, window, values, weights=np.array([[1, 1], [0, 1]])
+    )
+    np.testing.assert_allclose(sums[1] / weights[1], 4)
+    assert weights[2] == 0
+
+
+def test_zonal_mins():
+    labels = np.array([[0, 1, 1], [2, 2, 0]])
+    values = np.array([[-5.0, 3.0, np.nan], [7.0, 2.0, 1.0]])
+
+    mins = zonal.zonal_mins(labels, values, 3)
+    assert mins.tolist() == [-5.0, 3.0, 2.0, np.inf]
+
+
+def test_overlapping_geometries_keep_their_pixels():
+    # the second project is fully covered by the first, the third only touches the first
+    geometries = geopandas.GeoSeries(
+        [box(0, 0, 100, 100), box(20, 20, 40, 40), box(100, 0, 150, 50)]
+    )
+    assert zonal.get_label_layers(geometries).tolist() == [0, 1, 0]
+
+    grid = zonal.Grid.from_bounds((0, 0, 200, 200), 10, "epsg:5070")
+    values = np.ones((grid.height, grid.width))
+    sums, counts = np.zeros(4), np.zeros(4)
+    for window in grid.windows(block_rows=7):
+        labels = zonal.rasterize_labels(geometries, grid, window)
+        rows = slice(window.row_off, window.row_off + window.height)
+        block_sums, block_counts = zonal.zonal_sums(labels, values[rows], len(geometries))
+        sums += block_sums
+        counts += block_counts
+        assert zonal.zonal_mins(labels, values[rows], len(geometries))[1:].min() >= 1
+
+    assert counts[1:].tolist() == [100, 4, 25]
+    window = next(grid.windows())
+    assert zonal.rasterize_mask(geometries, grid, window).sum() == 125
+
+    sums, weights = zonal.coverage_sums(geometries, grid, window, values)
+    np.testing.assert_allclose(weights[1:], [100, 4, 25])